@@ -8,16 +8,52 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Tuple
+from types import SimpleNamespace
 import asyncio
-import httpx
+import json
+import time
 from datetime import datetime
 
-from config import API_HOST, API_PORT, BACKEND_URL
-from utils.cost_calculator import extract_usage_from_openai_response
+from config import API_HOST, API_PORT, BACKEND_URL, llm as crew_llm
+from utils.cost_calculator import extract_usage_from_openai_response, estimate_tokens, calculate_cost
+from utils.token_counter import token_counter, context_window, fit_to_context
+from utils.model_router import model_router, RouteDecision
+from utils.hedging import request_hedger
+from utils.rate_limiter import rate_limiter
+from utils.llm_replay import llm_replay
+from utils.usage_ledger import usage_ledger
+from utils.executor import crew_executor
+from utils.task_store import task_store, FINISHED_STATUSES, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.cancellation import (
+    CancellationToken,
+    TaskCancelled,
+    cancellation_registry,
+    run_cancellable,
+    install_crew_llm_hook,
+    BudgetExceeded
+)
+from utils.progress import progress_broker, END_EVENT
+from utils.scheduler import task_scheduler, AdmissionRejected
+from utils.backend_notifier import backend_notifier, LOG_KIND
+from utils.dedup import request_deduplicator, content_hash, IdempotencyConflict, MISS
+from utils.batch import batch_metrics, ITEM_FINISHED
+from utils.scenario_stream import IncrementalScenarioParser
+from utils.scenario_extractor import extract_scenarios, response_format_for, parse_metrics
+from utils.llm_client import llm_client
+from utils.llm_cache import llm_cache, cache_key, cache_bypass
+from utils.similarity_index import requirement_cache
+from utils.document_chunker import split_sections, merge_scenarios
+from utils.document_index import section_index, document_key, plan_revision, RevisionPlan
+from utils import prompt_templates
+from utils.prompt_templates import document_messages, text_messages, prompt_cache_metrics
+from config import TASK_PURGE_INTERVAL_SECONDS, LLM_STREAMING, PROGRESS_HEARTBEAT_SECONDS
+from config import BATCH_MAX_ITEMS, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, BATCH_POLL_SECONDS
+from config import DOC_CHUNK_THRESHOLD_CHARS, DOC_CHUNK_MAX_CHARS, DOC_CHUNK_CONCURRENCY, provider_for
 
 # FastAPI App
 app = FastAPI(
@@ -86,6 +122,16 @@ class TextAnalysisRequest(BaseModel):
     options: Optional[Dict[str, Any]] = {}
 
 
+class TextAnalysisBatchRequest(BaseModel):
+    items: List[TextAnalysisRequest]
+    concurrency: Optional[int] = None  # Boşsa BATCH_CONCURRENCY
+
+
+class DocumentAnalysisBatchRequest(BaseModel):
+    items: List[DocumentAnalysisRequest]
+    concurrency: Optional[int] = None
+
+
 class AutomationGenerationRequest(BaseModel):
     scenario: Dict[str, Any]
     test_suite_info: Dict[str, Any]
@@ -112,50 +158,27 @@ class CrewRunRequest(BaseModel):
 # ============================================================
 
 async def notify_backend(event: str, data: dict):
-    """Backend'e webhook gönder"""
-    try:
-        async with httpx.AsyncClient() as client:
-            # Log gönder
-            await client.post(
-                f"{BACKEND_URL}/api/tests/logs",
-                json={
-                    "level": data.get("level", "INFO"),
-                    "message": data.get("message", ""),
-                    "metadata": {
-                        "event": event,
-                        "agent_id": data.get("agent_id"),
-                        "run_id": data.get("run_id"),
-                        "timestamp": datetime.now().isoformat(),
-                        "cost": data.get("cost")
-                    }
-                }
-            )
-
-            # Eğer cost bilgisi varsa, agent'ın maliyetini güncelle
-            if data.get("cost") and data.get("agent_type"):
-                agent_type = data.get("agent_type")
-                cost = data.get("cost")
-
-                # Agent type'a göre agent ID'yi bul ve güncelle
-                try:
-                    # Önce agent'ı type'a göre bul
-                    agents_response = await client.get(f"{BACKEND_URL}/api/agents")
-                    if agents_response.status_code == 200:
-                        agents = agents_response.json().get("agents", [])
-                        agent = next((a for a in agents if a["type"] == agent_type), None)
-
-                        if agent:
-                            # Agent'ın maliyetini güncelle
-                            await client.put(
-                                f"{BACKEND_URL}/api/agents/{agent['id']}",
-                                json={"cost": cost}
-                            )
-                            print(f"💰 Agent {agent['name']} cost updated: +${cost:.6f}")
-                except Exception as agent_error:
-                    print(f"Agent cost update error: {agent_error}")
+    """
+    Backend'e webhook gönder
+
+    Event teslimat kuyruğuna eklenir; ağ isteği, batch'leme ve retry
+    utils/backend_notifier.py içindeki worker'da yapılır.
+    """
+    backend_notifier.notify(LOG_KIND, {
+        "level": data.get("level", "INFO"),
+        "message": data.get("message", ""),
+        "metadata": {
+            "event": event,
+            "agent_id": data.get("agent_id"),
+            "run_id": data.get("run_id"),
+            "timestamp": datetime.now().isoformat(),
+            "cost": data.get("cost")
+        }
+    })
 
-    except Exception as e:
-        print(f"Backend notification error: {e}")
+    # Eğer cost bilgisi varsa, agent'ın maliyetine ekle (periyodik toplu flush)
+    if data.get("cost") and data.get("agent_type"):
+        backend_notifier.add_cost(data.get("agent_type"), data.get("cost"))
 
 
 # ============================================================
@@ -328,10 +351,637 @@ test("{scenario_title}", async ({{ page }}) => {{
 
 
 # ============================================================
-# TASK STORAGE (In-memory for demo)
+# TASK STORAGE
+# ============================================================
+# Kayıtlar utils/task_store.py içindeki katmanlı depoda tutulur
+# (TASK_STORE_BACKEND: memory | sqlite | tiered)
+
+
+# ============================================================
+# HELPER: PROGRESS
+# ============================================================
+
+def update_task(task_id: str, **fields):
+    """
+    Task kaydını güncelle ve durum geçişini ilerleme kanalına yayınla
+
+    Bitmiş durumlarda (completed/error/cancelled) final sonuç ve stream'i
+    kapatan `end` event'i de gönderilir.
+    """
+    task_store.update(task_id, **fields)
+
+    status = fields.get("status")
+    if status is None:
+        return
+
+    progress_broker.publish_threadsafe(task_id, "status", {"status": status})
+    if status in FINISHED_STATUSES:
+        publish_final(task_id, status, fields)
+
+
+def publish_final(task_id: str, status: str, fields: dict):
+    """Final sonuç ve `end` event'lerini yayınla"""
+    final = {"status": status}
+    for key in ("result", "cancellation"):
+        if fields.get(key) is not None:
+            final[key] = fields[key]
+    progress_broker.publish_threadsafe(task_id, "result", final)
+    progress_broker.publish_threadsafe(task_id, END_EVENT, {"status": status})
+
+
+def publish_scenarios(task_id: str, scenarios: list, start: int = 0):
+    """Parse edilen senaryoları final sonuçtan önce tek tek yayınla (stream'de yayınlananlar hariç)"""
+    for index, scenario in enumerate(scenarios[start:], start):
+        progress_broker.publish_threadsafe(task_id, "scenario", {
+            "index": index,
+            "total": len(scenarios),
+            "scenario": scenario
+        })
+
+
+class ScenarioStreamer:
+    """
+    LLM çıktısını stream edip kapanan her senaryoyu anında yayınla
+
+    Tamamlanan senaryolar `scenario` event'i (partial=True) olarak yayınlanır
+    ve task kaydının `partial_scenarios` alanına yazılır. LLM_STREAMING
+    kapalıysa tek seferlik çağrıya düşer.
+
+    Aynı istek LLM cache'inde varsa çağrı yapılmaz; yeni yanıt ancak parse
+    edildikten sonra `cache_result()` ile cache'e yazılır. `publish=False`
+    ile (örn. belge parçaları) senaryolar yayınlanmaz. Destekleyen modellerde
+    yanıt structured output ile istenir; final senaryolar `scenarios()` ile alınır.
+    """
+
+    def __init__(self, task_id: str, publish: bool = True):
+        self.task_id = task_id
+        self.publish = publish
+        self.parser = IncrementalScenarioParser()
+        self.started = time.monotonic()
+        self.first_scenario_ms: Optional[float] = None
+        self.cache_status: Optional[str] = None
+        self.route: Optional[RouteDecision] = None
+        self.model: Optional[str] = None
+        self.pool_name: Optional[str] = None
+        self._cache_key: Optional[str] = None
+        self._completion = None
+
+    @property
+    def streamed(self) -> int:
+        return len(self.parser.scenarios)
+
+    def on_delta(self, chunk: str):
+        """Her içerik parçasıyla çağrılır"""
+        completed = self.parser.feed(chunk)
+        if not completed or not self.publish:
+            return
+        if self.first_scenario_ms is None:
+            self.first_scenario_ms = round((time.monotonic() - self.started) * 1000, 1)
+
+        first_index = self.streamed - len(completed)
+        for offset, scenario in enumerate(completed):
+            progress_broker.publish_threadsafe(self.task_id, "scenario", {
+                "index": first_index + offset,
+                "scenario": scenario,
+                "partial": True
+            })
+        task_store.update(
+            self.task_id,
+            partial_scenarios=list(self.parser.scenarios),
+            first_scenario_ms=self.first_scenario_ms
+        )
+
+    async def complete(self, pool_name: str, openai_client, cancel_token: CancellationToken = None, **kwargs):
+        """
+        Cache'e bak, yoksa LLM'i çağır
+
+        `model` verilmezse model yönlendiriciye sorulur (`pool_name` görev tipidir);
+        cache anahtarı zincirin ilk modeliyle hesaplanır.
+        """
+        self.pool_name = pool_name
+        if "model" not in kwargs:
+            self.route = route_llm_call(pool_name, cancel_token, kwargs)
+            kwargs["model"] = self.route.models[0]
+        # response_format cache anahtarına girmez: çıkarıcı iki biçimi de okur
+        self._cache_key = cache_key(**kwargs)
+        cached = llm_cache.get(self._cache_key, pool_name)
+        if cached is not None:
+            self.cache_status = "hit"
+            if LLM_STREAMING:
+                self.on_delta(cached["content"])
+            # Çağrı yapılmadı: token / maliyet sıfır
+            return SimpleNamespace(
+                model=cached["model"],
+                usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+                choices=[SimpleNamespace(message=SimpleNamespace(content=cached["content"]))]
+            )
+
+        self.cache_status = "bypass" if cache_bypass.get() else "miss"
+        on_delta = self.on_delta if LLM_STREAMING else None
+        if self.route is None:
+            self._completion = await call_chat_completion(
+                pool_name, openai_client, cancel_token, on_delta, **kwargs, **response_format_for(kwargs["model"])
+            )
+        else:
+            self._completion, self.model = await complete_with_fallback(
+                pool_name, cancel_token, on_delta, self.route, structured=True, **kwargs
+            )
+        prompt_cache_metrics.record(pool_name, self._completion.usage)
+        return self._completion
+
+    def scenarios(self, completion) -> List[Dict[str, Any]]:
+        """Yanıttaki doğrulanmış senaryolar (stream'de hatasız okunduysa yeniden parse edilmez)"""
+        return extract_scenarios(
+            completion.choices[0].message.content,
+            self.pool_name or "llm",
+            streamed=self.parser,
+            structured=self.cache_status != "hit" and bool(response_format_for(completion.model))
+        )
+
+    def cache_result(self):
+        """Başarıyla parse edilen yanıtı LLM cache'ine yaz"""
+        if self._completion is None or self._cache_key is None:
+            return
+        usage = self._completion.usage
+        llm_cache.put(
+            self._cache_key,
+            self._completion.model,
+            self._completion.choices[0].message.content,
+            getattr(usage, "prompt_tokens", 0),
+            getattr(usage, "completion_tokens", 0)
+        )
+
+    def routing(self) -> Optional[dict]:
+        """Yönlendirme kararı ve kullanılan model (cache hit'te None)"""
+        return self.route.summary(self.model) if self.route is not None and self.model else None
+
+    def summary(self) -> dict:
+        return {
+            "enabled": LLM_STREAMING,
+            "streamed_scenarios": self.streamed,
+            "time_to_first_scenario_ms": self.first_scenario_ms,
+            "total_ms": round((time.monotonic() - self.started) * 1000, 1)
+        }
+
+
+# ============================================================
+# HELPER: CANCELLATION
 # ============================================================
 
-tasks_storage: Dict[str, Dict] = {}
+def on_cancellation_update(token: CancellationToken):
+    """İptal muhasebesini (boşa giden / tasarruf edilen token) task kaydına yaz"""
+    task_store.update(token.task_id, cancellation=token.report())
+
+
+def start_cancellable_task(task_id: str, crew_type: str, priority: Optional[str], fn, *args) -> dict:
+    """
+    execute_* fonksiyonunu zamanlayıcı kuyruğuna iptal token'ı ile ekle
+
+    Kuyruk doluysa task kaydı silinir ve 429 (Retry-After) döner.
+
+    Returns:
+        Kuyruk bilgisi (queue_position, estimated_start_at)
+    """
+    progress_broker.publish(task_id, "status", {"status": "pending"})
+    try:
+        queue_info = task_scheduler.submit(task_id, crew_type, fn.__name__, list(args), priority)
+    except AdmissionRejected as e:
+        task_store.delete(task_id)
+        progress_broker.publish(task_id, END_EVENT, {"status": "rejected"})
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ValueError as e:
+        task_store.delete(task_id)
+        progress_broker.publish(task_id, END_EVENT, {"status": "rejected"})
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return queue_info
+
+
+async def run_job(task_id: str, job: str, args: list):
+    """Zamanlayıcının sıradaki işi çalıştırdığı giriş noktası (iş adı -> execute_*)"""
+    await run_cancellable(task_id, JOBS[job], *args, on_update=on_cancellation_update)
+
+
+def on_cancel_requested(task_id: str):
+    """Başka bir worker'a gelen iptal isteği: bu süreçteki token'ı iptal et"""
+    cancellation_registry.cancel(task_id)
+
+
+def on_task_lost(task_id: str):
+    """Çalıştıran worker'ı kaybolmuş task'ı hata olarak kapat"""
+    update_task(task_id, status="error", result={"error": "Worker process lost"})
+
+
+# ============================================================
+# HELPER: DEDUPLICATION
+# ============================================================
+
+def task_status(task_id: str) -> Optional[str]:
+    task = task_store.get(task_id)
+    return task["status"] if task else None
+
+
+def acquire_task_id(crew_type: str, payload: dict, idempotency_key: Optional[str], dedup: bool):
+    """
+    Aynı istek için mevcut task'ı bul veya yeni task_id ayır
+
+    Returns:
+        (task_id, sonuç, içerik hash'i) - sonuç MISS ise yeni task başlatılmalı
+    """
+    import uuid
+
+    digest = content_hash(crew_type, payload)
+    try:
+        task_id, outcome = request_deduplicator.acquire(
+            digest, str(uuid.uuid4())[:8], task_status, idempotency_key, use_content=dedup
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return task_id, outcome, digest
+
+
+def deduplicated_response(task_id: str, outcome: str, message: str) -> dict:
+    """Mevcut task'a bağlanan isteğin yanıtı"""
+    task = task_store.get(task_id) or {}
+    return {
+        "success": True,
+        "task_id": task_id,
+        "message": message,
+        "status": task.get("status", "pending"),
+        "deduplicated": outcome,
+        "queue_position": task.get("queue_position"),
+        "estimated_start_at": task.get("estimated_start_at")
+    }
+
+
+def on_queue_change(task_id: str, queue_info: dict):
+    """Zamanlayıcıdaki sıra / tahmini başlama zamanını task kaydına yaz"""
+    task_store.update(task_id, **queue_info)
+    progress_broker.publish(task_id, "queue", queue_info)
+
+
+def get_openai_client():
+    """Uygulama genelinde paylaşılan AsyncOpenAI client'ı (utils/llm_client.py)"""
+    return llm_client.openai
+
+
+def route_llm_call(task_type: str, cancel_token: Optional[CancellationToken], kwargs: dict) -> RouteDecision:
+    """Girdi boyutu, görev tipi, gecikme istatistikleri ve kalan bütçeye göre model zinciri"""
+    prompt_tokens = token_counter.count_messages(kwargs.get("messages", []), model_router.primary)
+    remaining_cost = cancel_token.remaining_cost() if cancel_token else None
+    decision = model_router.route(task_type, prompt_tokens, kwargs.get("max_tokens", 0), remaining_cost)
+    if not decision.models:
+        raise ValueError(f"No model available for {task_type}: {decision.skipped}")
+    return decision
+
+
+async def call_chat_completion(pool_name: str, openai_client, cancel_token: CancellationToken = None,
+                               on_delta: Callable[[str], None] = None, **kwargs):
+    """
+    `on_delta` verilirse stream ederek, verilmezse tek yanıtla çağır
+
+    Çağrı sağlayıcının eş zamanlı istek sınırı içinde yapılır; kota / yetki
+    hatası alan API anahtarı rotasyondan bir süre çıkarılır.
+    """
+    provider = provider_for(kwargs.get("model") or "")
+    async with llm_client.provider_slot(provider):
+        try:
+            if on_delta is None:
+                return await create_chat_completion(pool_name, openai_client, cancel_token, **kwargs)
+            return await stream_chat_completion(pool_name, openai_client, cancel_token, on_delta, **kwargs)
+        except Exception as e:
+            llm_client.key_failed(provider, openai_client, getattr(e, "status_code", None))
+            raise
+
+
+async def hedged_chat_completion(pool_name: str, cancel_token: CancellationToken,
+                                 on_delta: Optional[Callable[[str], None]], primary: str, backup: str,
+                                 structured: bool = False, **kwargs):
+    """
+    Birincil model gecikme eşiğinde cevap vermezse isteği yedek modele de gönder
+
+    Önce cevap veren (stream'de ilk içerik parçası, tek yanıtta tamamlanan
+    çağrı) kazanır ve diğeri iptal edilir; sadece kazananın içeriği `on_delta`'ya
+    iletilir. Birincil, kopya gönderilmeden hata verirse hata yükseltilir
+    (zincirdeki sonraki modele geçilir).
+
+    Returns:
+        (completion, kazanan model)
+    """
+    started = time.monotonic()
+    answered = asyncio.Event()
+    attempts: Dict[str, asyncio.Task] = {}
+    winner: Optional[str] = None
+
+    def _launch(model: str):
+        def _on_delta(chunk: str):
+            nonlocal winner
+            if winner is None:
+                winner = model
+                answered.set()
+            if winner == model:
+                on_delta(chunk)
+
+        call_kwargs = {**kwargs, "model": model, **(response_format_for(model) if structured else {})}
+        attempts[model] = asyncio.create_task(call_chat_completion(
+            pool_name, llm_client.client_for(provider_for(model)), cancel_token,
+            _on_delta if on_delta else None, **call_kwargs
+        ))
+
+    _launch(primary)
+    hedge_at = started + request_hedger.delay_ms(primary) / 1000
+    hedge_pending = True
+    shadow: Optional[asyncio.Task] = None
+    completion = None
+    answered_wait = asyncio.create_task(answered.wait())
+    try:
+        while winner is None:
+            for model, task in attempts.items():
+                if task.done() and task.exception() is None:
+                    winner = model
+                    break
+            if winner is not None:
+                break
+            pending = [task for task in attempts.values() if not task.done()]
+            if not pending:
+                # Hepsi hata verdi: birincilin hatası
+                raise attempts[primary].exception()
+            timeout = max(0.0, hedge_at - time.monotonic()) if hedge_pending else None
+            done, _ = await asyncio.wait(pending + [answered_wait], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if hedge_pending and (not done or attempts[primary].done() and attempts[primary].exception() is not None):
+                if not done and request_hedger.should_hedge(provider_for(backup)):
+                    print(f"[Hedge] {primary} slower than {request_hedger.delay_ms(primary):.0f} ms, hedging with {backup}")
+                    _launch(backup)
+                    hedge_pending = False
+                elif not done:
+                    hedge_pending = False
+                else:
+                    # Birincil kopyadan önce hata verdi: zincir devam eder
+                    raise attempts[primary].exception()
+
+        # Kopya kazandıysa birincil bazen ölçüm için sonuna kadar çalıştırılır (içeriği kullanılmaz)
+        if winner != primary and request_hedger.shadow():
+            shadow = attempts[primary]
+        for model, task in attempts.items():
+            if model != winner and task is not shadow:
+                task.cancel()
+        completion = await attempts[winner]
+    finally:
+        answered_wait.cancel()
+        # Kazanan hata verdiyse ölçüm isteği de kesilir
+        keep = shadow if completion is not None else None
+        for task in attempts.values():
+            if not task.done() and task is not keep:
+                task.cancel()
+    latency_ms = (time.monotonic() - started) * 1000
+
+    def _account(loser: str, outcome, primary_ms: Optional[float] = None):
+        # Kaybeden istek: tamamlandıysa gerçek kullanım, iptal edildiyse faturalanan prompt
+        extra_tokens, extra_cost = 0, 0.0
+        if outcome is not None and not isinstance(outcome, BaseException):
+            usage_info = extract_usage_from_openai_response(outcome)
+            extra_tokens, extra_cost = usage_info["total_tokens"], usage_info["cost"]
+        elif isinstance(outcome, asyncio.CancelledError):
+            extra_tokens = token_counter.count_messages(kwargs.get("messages", []), loser)
+            extra_cost = calculate_cost(loser, extra_tokens, 0)
+        request_hedger.record(
+            primary, latency_ms, hedge_won=winner != primary,
+            extra_tokens=extra_tokens, extra_cost=extra_cost, primary_ms=primary_ms
+        )
+
+    def _shadow_done(task: asyncio.Task):
+        if task.cancelled():
+            _account(primary, asyncio.CancelledError())
+        elif task.exception() is not None:
+            _account(primary, task.exception())
+        else:
+            _account(primary, task.result(), primary_ms=(time.monotonic() - started) * 1000)
+
+    loser = next((model for model in attempts if model != winner), None)
+    if loser is None:
+        _account(primary, None)
+    elif shadow is not None:
+        shadow.add_done_callback(_shadow_done)
+    else:
+        _account(loser, (await asyncio.gather(attempts[loser], return_exceptions=True))[0])
+    return completion, winner
+
+
+async def complete_with_fallback(pool_name: str, cancel_token: CancellationToken,
+                                 on_delta: Optional[Callable[[str], None]], decision: RouteDecision,
+                                 structured: bool = False, **kwargs):
+    """
+    Yönlendiricinin zincirindeki modelleri sırayla dene
+
+    Hata veren modelden sonrakine geçilir; iptal ve bütçe aşımı zinciri durdurur.
+    Stream'de içerik gelmeye başladıktan sonraki hata yedek modele devredilmez
+    (yayınlanmış senaryolar tekrarlanmasın diye). `structured` ise destekleyen
+    modellere senaryo şeması (response_format) gönderilir. Hedging açıksa her
+    deneme, zincirdeki bir sonraki modele kopya istekle yapılır.
+
+    Returns:
+        (completion, kullanılan model)
+    """
+    received = False
+
+    def _on_delta(chunk: str):
+        nonlocal received
+        received = True
+        on_delta(chunk)
+
+    last_error: Optional[Exception] = None
+    for position, model in enumerate(decision.models):
+        if position:
+            model_router.record_fallback(decision.models[position - 1], model)
+            print(f"[ModelRouter] {decision.models[position - 1]} failed ({last_error}), falling back to {model}")
+        backup = decision.models[position + 1] if position + 1 < len(decision.models) else None
+        try:
+            if request_hedger.enabled and backup:
+                return await hedged_chat_completion(
+                    pool_name, cancel_token, _on_delta if on_delta else None, model, backup, structured, **kwargs
+                )
+            client = llm_client.client_for(provider_for(model))
+            completion = await call_chat_completion(
+                pool_name, client, cancel_token, _on_delta if on_delta else None,
+                **{**kwargs, "model": model, **(response_format_for(model) if structured else {})}
+            )
+            return completion, model
+        except (TaskCancelled, BudgetExceeded):
+            raise
+        except Exception as e:
+            if received:
+                raise
+            last_error = e
+    raise last_error
+
+
+def reserve_llm_call(cancel_token: Optional[CancellationToken], kwargs: dict) -> Tuple[int, Optional[int]]:
+    """
+    Çağrı öncesi kontrol: prompt token'ları model tokenizer'ıyla sayılır,
+    `max_tokens` bağlam penceresine sığacak şekilde sınırlanır ve çağrının üst
+    sınırı (prompt + max_tokens) task bütçesinden ayrılır
+
+    Returns:
+        (prompt token sayısı, iptal token'ındaki çağrı id'si)
+    """
+    model = kwargs.get("model")
+    prompt_tokens = token_counter.count_messages(kwargs.get("messages", []), model)
+    window = context_window(model)
+    if prompt_tokens >= window:
+        raise ValueError(f"Prompt ({prompt_tokens} tokens) exceeds the {window}-token context window of {model}")
+    if prompt_tokens + kwargs.get("max_tokens", 0) > window:
+        kwargs["max_tokens"] = window - prompt_tokens
+
+    call_id = None
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+        max_output = kwargs.get("max_tokens", 0)
+        call_id = cancel_token.reserve(prompt_tokens + max_output, calculate_cost(model or "", prompt_tokens, max_output))
+        cancel_token.start(call_id)
+    return prompt_tokens, call_id
+
+
+def record_usage(pool_name: str, cancel_token: Optional[CancellationToken], model: Optional[str],
+                 usage_info: Optional[dict], duration_ms: float, status: str, input_tokens: int = 0,
+                 output_tokens: int = 0):
+    """Endpoint LLM çağrısını kullanım defterine yaz (başarısız / kesilen çağrılarda tahmini token'larla)"""
+    if usage_info is not None:
+        input_tokens, output_tokens = usage_info["input_tokens"], usage_info["output_tokens"]
+    usage_ledger.record(
+        cancel_token.task_id if cancel_token else None,
+        pool_name,
+        model,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=(usage_info or {}).get("cached_tokens", 0),
+        latency_ms=duration_ms,
+        cost=usage_info["cost"] if usage_info is not None else None,
+        status=status
+    )
+
+
+async def create_chat_completion(pool_name: str, openai_client, cancel_token: CancellationToken = None, **kwargs):
+    """
+    OpenAI chat completion çağrısını paylaşılan async client ile, iptal kontrolüyle çalıştır
+
+    İptal edilen task için çağrı hiç gönderilmez; uçuştaki çağrı kesilir ve
+    prompt token'ları iptal raporuna boşa harcanmış olarak yazılır.
+    `pool_name` çağrı kaynağı olarak ölçülür (örn. text_analysis).
+    """
+    prompt_tokens, call_id = reserve_llm_call(cancel_token, kwargs)
+
+    started = time.monotonic()
+    tokens, cost, error, cancelled = 0, 0.0, None, False
+    usage_info = None
+    try:
+        completion = await openai_client.chat.completions.create(**kwargs)
+        usage_info = extract_usage_from_openai_response(completion)
+        tokens, cost = usage_info["total_tokens"], usage_info["cost"]
+        return completion
+    except asyncio.CancelledError:
+        # İstek gönderilmişti: prompt faturalanmış sayılır
+        tokens = prompt_tokens
+        cancelled = True
+        raise
+    except TaskCancelled:
+        # Rate limit sırasında iptal: istek gönderilmedi
+        cancelled = True
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        duration_ms = (time.monotonic() - started) * 1000
+        llm_client.metrics.record_call(pool_name, duration_ms, error is not None)
+        if not cancelled:
+            # Kesilen çağrının süresi model gecikmesi sayılmaz
+            model_router.record(kwargs.get("model"), duration_ms, error)
+        record_usage(pool_name, cancel_token, kwargs.get("model"), usage_info, duration_ms,
+                     "cancelled" if cancelled else "error" if error else "ok", input_tokens=tokens)
+        if cancel_token:
+            cancel_token.finish(call_id, tokens, cost)
+
+
+async def stream_chat_completion(pool_name: str, openai_client, cancel_token: CancellationToken = None,
+                                 on_delta: Callable[[str], None] = None, **kwargs):
+    """
+    OpenAI chat completion'ı stream ederek çalıştır
+
+    Her içerik parçası `on_delta` ile iletilir. Dönen nesne create_chat_completion
+    ile aynı biçimdedir (choices[0].message.content, usage, model); stream
+    kullanım bilgisi vermezse token'lar tahmin edilir. İptal edilirse stream
+    kapatılır ve o ana kadarki token'lar boşa harcanmış sayılır.
+    """
+    prompt_tokens, call_id = reserve_llm_call(cancel_token, kwargs)
+
+    started = time.monotonic()
+    parts: List[str] = []
+    usage = None
+    model = kwargs.get("model")
+    tokens, cost, error, cancelled = 0, 0.0, None, False
+    usage_info = None
+    try:
+        stream = await openai_client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        try:
+            async for chunk in stream:
+                if cancel_token and cancel_token.cancelled:
+                    break
+                model = getattr(chunk, "model", None) or model
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        if on_delta:
+                            on_delta(delta)
+        finally:
+            await stream.close()
+
+        content = "".join(parts)
+        if usage is None:
+            input_tokens, output_tokens = prompt_tokens, estimate_tokens(content, model)
+            usage = SimpleNamespace(
+                prompt_tokens=input_tokens,
+                completion_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens
+            )
+        completion = SimpleNamespace(
+            model=model,
+            usage=usage,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+        usage_info = extract_usage_from_openai_response(completion)
+        tokens, cost = usage_info["total_tokens"], usage_info["cost"]
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        return completion
+    except (asyncio.CancelledError, TaskCancelled):
+        # Stream kesildi (iptal sonrası break dahil): o ana kadarki token'lar harcanmış sayılır
+        tokens = prompt_tokens + estimate_tokens("".join(parts), model)
+        cancelled = True
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        duration_ms = (time.monotonic() - started) * 1000
+        llm_client.metrics.record_call(pool_name, duration_ms, error is not None)
+        if not cancelled:
+            model_router.record(kwargs.get("model"), duration_ms, error)
+        record_usage(pool_name, cancel_token, kwargs.get("model"), usage_info, duration_ms,
+                     "cancelled" if cancelled else "error" if error else "ok",
+                     input_tokens=prompt_tokens if cancelled else 0, output_tokens=tokens - prompt_tokens if cancelled else 0)
+        if cancel_token:
+            cancel_token.finish(call_id, tokens, cost)
 
 
 # ============================================================
@@ -352,6 +1002,7 @@ async def root():
             "run_crew": "POST /api/crew/{crew_type}",
             "get_task": "GET /api/tasks/{task_id}",
             "cancel_task": "POST /api/tasks/{task_id}/cancel",
+            "task_events": "GET /api/tasks/{task_id}/events (SSE) | WS /api/tasks/{task_id}/ws",
             "list_agents": "GET /api/agents"
         }
     }
@@ -362,7 +1013,8 @@ async def health():
     """Sağlık kontrolü"""
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "executor": crew_executor.stats()
     }
 
 
@@ -404,24 +1056,26 @@ async def list_agents():
 
 
 @router.post("/run")
-async def run_agent(request: RunTestRequest, background_tasks: BackgroundTasks):
+async def run_agent(request: RunTestRequest, priority: Optional[str] = Query(None, description="high | normal | low")):
     """Tek bir ajanı çalıştır"""
     import uuid
 
     task_id = str(uuid.uuid4())[:8]
 
-    tasks_storage[task_id] = {
+    task_store.create({
         "id": task_id,
         "agent_type": request.agent_type,
         "status": "pending",
         "created_at": datetime.now().isoformat(),
         "result": None
-    }
+    })
 
     # Background'da çalıştır
-    background_tasks.add_task(
-        execute_agent,
+    queue_info = start_cancellable_task(
         task_id,
+        "agent",
+        priority,
+        execute_agent,
         request.agent_type,
         request.suite_id,
         request.options
@@ -431,13 +1085,15 @@ async def run_agent(request: RunTestRequest, background_tasks: BackgroundTasks):
         "success": True,
         "task_id": task_id,
         "message": f"Agent {request.agent_type} started",
-        "status": "pending"
+        "status": "pending",
+        **queue_info
     }
 
 
-async def execute_agent(task_id: str, agent_type: str, suite_id: int, options: dict):
+async def execute_agent(task_id: str, agent_type: str, suite_id: int, options: dict,
+                        cancel_token: CancellationToken = None):
     """Ajan çalıştırma işlemi"""
-    tasks_storage[task_id]["status"] = "running"
+    update_task(task_id, status="running")
 
     await notify_backend("agent:started", {
         "agent_id": agent_type,
@@ -475,8 +1131,9 @@ async def execute_agent(task_id: str, agent_type: str, suite_id: int, options: d
             await asyncio.sleep(2)
 
         # Başarılı sonuç
-        tasks_storage[task_id]["status"] = "completed"
-        tasks_storage[task_id]["result"] = result
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        update_task(task_id, status="completed", result=result)
 
         await notify_backend("agent:completed", {
             "agent_id": agent_type,
@@ -484,12 +1141,13 @@ async def execute_agent(task_id: str, agent_type: str, suite_id: int, options: d
             "level": "SUCCESS"
         })
 
+    except TaskCancelled:
+        pass
     except Exception as e:
-        tasks_storage[task_id]["status"] = "error"
-        tasks_storage[task_id]["result"] = {
+        update_task(task_id, status="error", result={
             "success": False,
             "error": str(e)
-        }
+        })
 
         await notify_backend("agent:error", {
             "agent_id": agent_type,
@@ -499,23 +1157,25 @@ async def execute_agent(task_id: str, agent_type: str, suite_id: int, options: d
 
 
 @router.post("/crew/test")
-async def run_test_crew(request: CrewRunRequest, background_tasks: BackgroundTasks):
+async def run_test_crew(request: CrewRunRequest, priority: Optional[str] = Query(None, description="high | normal | low")):
     """Test Crew'u çalıştır"""
     import uuid
 
     task_id = str(uuid.uuid4())[:8]
 
-    tasks_storage[task_id] = {
+    task_store.create({
         "id": task_id,
         "crew_type": "test",
         "status": "pending",
         "created_at": datetime.now().isoformat(),
         "result": None
-    }
+    })
 
-    background_tasks.add_task(
-        execute_test_crew,
+    queue_info = start_cancellable_task(
         task_id,
+        "test",
+        priority,
+        execute_test_crew,
         request.project.model_dump(),
         request.test_suite.model_dump() if request.test_suite else None,
         request.api_spec.model_dump() if request.api_spec else None
@@ -525,34 +1185,39 @@ async def run_test_crew(request: CrewRunRequest, background_tasks: BackgroundTas
         "success": True,
         "task_id": task_id,
         "message": "Test crew started",
-        "status": "pending"
+        "status": "pending",
+        **queue_info
     }
 
 
-async def execute_test_crew(task_id: str, project: dict, test_suite: dict, api_spec: dict):
+async def execute_test_crew(task_id: str, project: dict, test_suite: dict, api_spec: dict,
+                            cancel_token: CancellationToken = None):
     """Test Crew çalıştırma"""
-    tasks_storage[task_id]["status"] = "running"
+    update_task(task_id, status="running")
 
     try:
         from crews import TestCrew
 
         crew = TestCrew()
 
+        # crew.kickoff() blocking - event loop'u kilitlememesi için worker havuzunda çalıştır
         if api_spec:
-            result = crew.run_full_test(project, test_suite or {}, api_spec)
+            result = await crew_executor.run("test", crew.run_full_test, project, test_suite or {}, api_spec, cancel_token)
         else:
-            result = crew.run_ui_test(project, test_suite or {})
+            result = await crew_executor.run("test", crew.run_ui_test, project, test_suite or {}, cancel_token)
 
-        tasks_storage[task_id]["status"] = "completed"
-        tasks_storage[task_id]["result"] = result
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        update_task(task_id, status="completed", result=result)
 
+    except TaskCancelled:
+        pass
     except Exception as e:
-        tasks_storage[task_id]["status"] = "error"
-        tasks_storage[task_id]["result"] = {"error": str(e)}
+        update_task(task_id, status="error", result={"error": str(e)})
 
 
 @router.post("/crew/security")
-async def run_security_crew(request: CrewRunRequest, background_tasks: BackgroundTasks):
+async def run_security_crew(request: CrewRunRequest, priority: Optional[str] = Query(None, description="high | normal | low")):
     """Security Crew'u çalıştır"""
     import uuid
 
@@ -561,17 +1226,19 @@ async def run_security_crew(request: CrewRunRequest, background_tasks: Backgroun
 
     task_id = str(uuid.uuid4())[:8]
 
-    tasks_storage[task_id] = {
+    task_store.create({
         "id": task_id,
         "crew_type": "security",
         "status": "pending",
         "created_at": datetime.now().isoformat(),
         "result": None
-    }
+    })
 
-    background_tasks.add_task(
-        execute_security_crew,
+    queue_info = start_cancellable_task(
         task_id,
+        "security",
+        priority,
+        execute_security_crew,
         request.security_target.model_dump()
     )
 
@@ -579,169 +1246,272 @@ async def run_security_crew(request: CrewRunRequest, background_tasks: Backgroun
         "success": True,
         "task_id": task_id,
         "message": "Security crew started",
-        "status": "pending"
+        "status": "pending",
+        **queue_info
     }
 
 
-async def execute_security_crew(task_id: str, target: dict):
+async def execute_security_crew(task_id: str, target: dict, cancel_token: CancellationToken = None):
     """Security Crew çalıştırma"""
-    tasks_storage[task_id]["status"] = "running"
+    update_task(task_id, status="running")
 
     try:
         from crews import SecurityCrew
 
         crew = SecurityCrew()
-        result = crew.run_security_scan(target)
+        result = await crew_executor.run("security", crew.run_security_scan, target, cancel_token)
 
-        tasks_storage[task_id]["status"] = "completed"
-        tasks_storage[task_id]["result"] = result
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        update_task(task_id, status="completed", result=result)
 
+    except TaskCancelled:
+        pass
     except Exception as e:
-        tasks_storage[task_id]["status"] = "error"
-        tasks_storage[task_id]["result"] = {"error": str(e)}
+        update_task(task_id, status="error", result={"error": str(e)})
 
 
 @router.post("/crew/document-analysis")
-async def analyze_document(request: DocumentAnalysisRequest, background_tasks: BackgroundTasks):
+async def analyze_document(
+    request: DocumentAnalysisRequest,
+    priority: Optional[str] = Query(None, description="high | normal | low"),
+    dedup: bool = Query(True, description="Aynı içerikli istekleri mevcut task'a bağla"),
+    cache: bool = Query(True, description="LLM yanıt cache'ini kullan"),
+    idempotency_key: Optional[str] = Header(None)
+):
     """Belgeyi analiz et ve senaryoları çıkar"""
-    import uuid
-
-    task_id = str(uuid.uuid4())[:8]
+    payload = request.model_dump() if cache else {**request.model_dump(), "cache": False}
+    task_id, outcome, digest = acquire_task_id("document_analysis", payload, idempotency_key, dedup)
+    if outcome != MISS:
+        return deduplicated_response(task_id, outcome, "Document analysis already submitted")
 
-    tasks_storage[task_id] = {
+    task_store.create({
         "id": task_id,
         "crew_type": "document_analysis",
         "status": "pending",
         "created_at": datetime.now().isoformat(),
         "result": None
-    }
+    })
 
-    background_tasks.add_task(
-        execute_document_analysis,
-        task_id,
-        request.document_content,
-        request.document_info,
-        request.suite_id,
-        request.template,
-        request.options
-    )
+    try:
+        queue_info = start_cancellable_task(
+            task_id,
+            "document_analysis",
+            priority,
+            execute_document_analysis,
+            request.document_content,
+            request.document_info,
+            request.suite_id,
+            request.template,
+            request.options,
+            cache
+        )
+    except HTTPException:
+        request_deduplicator.release(digest, idempotency_key)
+        raise
 
     return {
         "success": True,
         "task_id": task_id,
         "message": "Document analysis started",
-        "status": "pending"
+        "status": "pending",
+        "deduplicated": outcome,
+        **queue_info
+    }
+
+
+# Belge / gereksinim metni dışındaki prompt (talimatlar, örnekler) ve yanıt (max_tokens) için ayrılan token'lar
+DOCUMENT_PROMPT_RESERVE_TOKENS = 5000
+TEXT_PROMPT_RESERVE_TOKENS = 6000
+
+
+def sum_usage(usages: List[dict]) -> dict:
+    """Birden fazla LLM çağrısının kullanımını topla"""
+    return {
+        "model": usages[0]["model"] if usages else "unknown",
+        "input_tokens": sum(u["input_tokens"] for u in usages),
+        "output_tokens": sum(u["output_tokens"] for u in usages),
+        "total_tokens": sum(u["total_tokens"] for u in usages),
+        "cached_tokens": sum(u.get("cached_tokens", 0) for u in usages),
+        "cost": round(sum(u["cost"] for u in usages), 6),
+        "calls": len(usages)
+    }
+
+
+async def analyze_document_chunks(task_id: str, plan: RevisionPlan, openai_client,
+                                  cancel_token: CancellationToken = None) -> dict:
+    """
+    Büyük belgeyi (veya revizyonun değişen bölümlerini) map-reduce ile analiz et
+
+    Map: bölüm farkında parçaların her biri ayrı LLM çağrısıyla (en fazla
+    DOC_CHUNK_CONCURRENCY eşzamanlı) analiz edilir. Reduce: senaryolar
+    (yeniden kullanılan gruplarla birlikte) belge sırasıyla birleştirilir ve
+    tekrarlar atılır. Çağrı sayısı (ve maliyet) analiz edilen metinle doğrusal artar.
+    """
+    chunks = plan.pending_chunks(DOC_CHUNK_MAX_CHARS)
+    semaphore = asyncio.Semaphore(DOC_CHUNK_CONCURRENCY)
+    started = time.monotonic()
+    done = 0
+
+    async def _map(chunk):
+        nonlocal done
+        async with semaphore:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            sections = ", ".join(chunk.sections) or "-"
+            part_note = (
+                f"- Part: {chunk.index + 1} of {len(chunks)} (sections: {sections})\n"
+                "- This is only one part of a larger document: generate scenarios ONLY for the requirements in this part\n"
+            )
+            streamer = ScenarioStreamer(task_id, publish=False)
+            completion = await streamer.complete(
+                "document_analysis",
+                openai_client,
+                cancel_token,
+                messages=document_messages(chunk.text, part_note),
+                temperature=0.7,
+                max_tokens=4000
+            )
+            scenarios = streamer.scenarios(completion)
+            streamer.cache_result()
+            done += 1
+            progress_broker.publish_threadsafe(task_id, "stage", {
+                "stage": f"chunk {done}/{len(chunks)}",
+                "chunk": chunk.index,
+                "sections": chunk.sections,
+                "scenarios": len(scenarios)
+            })
+            return scenarios, extract_usage_from_openai_response(completion), streamer.cache_status, streamer.model
+
+    outcomes = await asyncio.gather(*(_map(chunk) for chunk in chunks), return_exceptions=True)
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    groups, usages, failed, cache_hits, models_used = [], [], [], 0, {}
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"[DocumentAnalysis] Chunk {chunk.index + 1}/{len(chunks)} failed: {outcome}")
+            failed.append({"chunk": chunk.index, "sections": chunk.sections, "error": str(outcome)})
+            continue
+        scenarios, usage, cache_status, model = outcome
+        if model:
+            models_used[model] = models_used.get(model, 0) + 1
+        # Cache'ten gelen parçanın kullanımı sıfırdır; indekse tahmini maliyeti yazılır
+        tokens = usage["total_tokens"] or estimate_tokens(chunk.text) + estimate_tokens(json.dumps(scenarios, ensure_ascii=False))
+        groups.append(plan.group(chunk.section_indexes, scenarios, tokens))
+        usages.append(usage)
+        cache_hits += cache_status == "hit"
+    if chunks and len(failed) == len(chunks):
+        raise RuntimeError(f"All {len(chunks)} document chunks failed: {failed[0]['error']}")
+
+    ordered = sorted(plan.reused + groups, key=lambda group: group["position"])
+    scenarios, duplicates = merge_scenarios([group["scenarios"] for group in ordered])
+    return {
+        "scenarios": scenarios,
+        "usage": sum_usage(usages),
+        "groups": groups,
+        "chunks": {
+            "total": len(chunks),
+            "failed": failed,
+            "concurrency": DOC_CHUNK_CONCURRENCY,
+            "max_chars": DOC_CHUNK_MAX_CHARS,
+            "scenarios_before_merge": sum(len(group["scenarios"]) for group in ordered),
+            "duplicates_removed": duplicates,
+            "cache_hits": cache_hits,
+            "models": models_used,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+    }
+
+
+def incremental_summary(key: Optional[str], plan: RevisionPlan, revision: Optional[int], usage: dict) -> dict:
+    """Revizyon analizinde yeniden kullanılan bölümler ve önlenen token oranı"""
+    spent = usage["total_tokens"]
+    avoided = plan.tokens_avoided
+    return {
+        "document_key": key,
+        "revision": revision,
+        "previous_revision": plan.previous_revision,
+        "sections_total": len(plan.sections),
+        "sections_reused": plan.reused_sections,
+        "sections_analyzed": len(plan.pending),
+        "scenarios_reused": sum(len(group["scenarios"]) for group in plan.reused),
+        "tokens_avoided": avoided,
+        "tokens_spent": spent,
+        "tokens_avoided_pct": round(100 * avoided / (avoided + spent), 1) if avoided + spent else 0.0
     }
 
 
-async def execute_document_analysis(task_id: str, document_content: str, document_info: dict, suite_id: int, template: str = "text", options: dict = {}):
+async def execute_document_analysis(task_id: str, document_content: str, document_info: dict, suite_id: int, template: str = "text", options: dict = {},
+                                    use_cache: bool = True, cancel_token: CancellationToken = None):
     """Belge analizi çalıştırma - AI kullanarak"""
-    tasks_storage[task_id]["status"] = "running"
+    update_task(task_id, status="running")
+    cache_bypass.set(not use_cache)
 
     try:
-        import json
-        from openai import OpenAI
-
-        # Initialize OpenAI client
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        # AI prompt - doküman analizi ve test senaryoları üretimi
-        # Calculate document size for guidance
-        doc_length = len(document_content)
-        doc_words = len(document_content.split())
-
-        # For very long documents, use a more powerful model
-        model_name = "gpt-4o-mini"
-        if doc_length > 50000:
-            print(f"[DocumentAnalysis] Large document detected ({doc_length} chars), using gpt-4o for better analysis")
-            model_name = "gpt-4o"
-
-        prompt = f"""Analyze the following document and generate test scenarios.
-
-Document Statistics:
-- Length: {doc_length} characters
-- Words: ~{doc_words} words
-
-Document content:
-{document_content}
-
-Instructions:
-- CRITICAL: Read the ENTIRE document from beginning to end before generating scenarios
-- Do NOT skip any sections, chapters, or requirements
-- **LANGUAGE RULE: Generate ALL content (title, description, steps, expectedResult) in the SAME LANGUAGE as the document**
-  * If document is in Turkish → ALL fields must be in Turkish
-  * If document is in English → ALL fields must be in English
-- Generate scenarios based on document complexity and ALL requirements found:
-  * Simple single-sentence requirements → 1-2 scenarios
-  * Medium documents with multiple features → 3-7 scenarios
-  * Complex PRD documents → 8-15+ scenarios
-- IMPORTANT: Extract scenarios from ALL sections of the document, not just the beginning
-- Each scenario should have:
-  * title: Brief descriptive title
-  * description: What the test does
-  * steps: Array of steps with number and action (use clear, specific action verbs)
-  * expectedResult: What should happen
-  * priority: HIGH, MEDIUM, or LOW
-  * automationType: UI, API, or INTEGRATION
-
-Example (Turkish document → Turkish output):
-{{
-  "scenarios": [
-    {{
-      "title": "Film Arama ve Görüntüleme",
-      "description": "Kullanıcı film arar ve detaylarını görüntüler",
-      "steps": [
-        {{"number": 1, "action": "Ana sayfaya git"}},
-        {{"number": 2, "action": "Arama kutusuna 'inception' yaz"}},
-        {{"number": 3, "action": "Ara butonuna tıkla"}},
-        {{"number": 4, "action": "Sonuçlardan Inception filmine tıkla"}}
-      ],
-      "expectedResult": "Film detay sayfası görüntülenir",
-      "priority": "HIGH",
-      "automationType": "UI"
-    }}
-  ]
-}}
-
-Return ONLY a valid JSON object with a "scenarios" array. No markdown, no code blocks."""
-
-        # AI'dan cevap al (use upgraded model for large documents)
-        completion = openai_client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": "You are a test automation expert who generates test scenarios from documents."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000
-        )
+        # Uygulama genelinde paylaşılan async OpenAI client (bağlantı havuzu yeniden kullanılır)
+        openai_client = get_openai_client()
+
+        # Aynı belgenin önceki revizyonu varsa değişmeyen bölümlerin senaryoları yeniden kullanılır
+        # (?cache=false ile belge baştan analiz edilir, indeks yine güncellenir)
+        key = document_key(document_info, suite_id)
+        sections = split_sections(document_content)
+        previous = section_index.get(key)
+        plan = plan_revision(sections, previous)
+        if not use_cache:
+            plan.reused, plan.pending = [], list(range(len(sections)))
+
+        # Bağlam penceresi kontrolü karakter değil token sayısına göre yapılır (Türkçe metinde
+        # karakter başına token İngilizceden belirgin şekilde fazladır); model yönlendiricide seçilir
+        document_tokens = estimate_tokens(document_content, model_router.primary)
+        fits_context = document_tokens + DOCUMENT_PROMPT_RESERVE_TOKENS <= context_window(model_router.primary)
+
+        if plan.reused or len(document_content) > DOC_CHUNK_THRESHOLD_CHARS or not fits_context:
+            # Büyük belge, pencereye sığmayan belge veya revizyon: sadece analiz edilecek bölümler parçalanıp paralel analiz edilir
+            result = await analyze_document_chunks(task_id, plan, openai_client, cancel_token)
+            usage_info = result['usage']
+            groups = result.pop('groups')
+            print(f"[DocumentAnalysis] {result['chunks']['total']} chunks, {plan.reused_sections}/{len(sections)} sections reused, "
+                  f"{len(result['scenarios'])} scenarios ({result['chunks']['duplicates_removed']} duplicates removed)")
+            streamed = 0
+        else:
+
+            # AI'dan cevap al (stream: senaryolar kapandıkça yayınlanır)
+            streamer = ScenarioStreamer(task_id)
+            completion = await streamer.complete(
+                "document_analysis",
+                openai_client,
+                cancel_token,
+                messages=document_messages(document_content),
+                temperature=0.7,
+                max_tokens=4000
+            )
+            usage_info = extract_usage_from_openai_response(completion)
+            result = {'scenarios': streamer.scenarios(completion)}
+            result['streaming'] = streamer.summary()
+            result['cache'] = streamer.cache_status
+            result['routing'] = streamer.routing()
+            streamer.cache_result()
+            streamed = streamer.streamed
+            tokens = usage_info['total_tokens'] or estimate_tokens(document_content)
+            groups = [plan.group(list(range(len(sections))), result['scenarios'], tokens)]
 
         # Maliyet hesapla
-        usage_info = extract_usage_from_openai_response(completion)
         cost = usage_info["cost"]
         print(f"💰 Document Analysis Cost: ${cost:.6f} ({usage_info['model']}, {usage_info['total_tokens']} tokens)")
 
-        # Parse response
-        response_text = completion.choices[0].message.content.strip()
-
-        # Remove markdown code blocks if present
-        if response_text.startswith('```'):
-            lines = response_text.split('\n')
-            response_text = '\n'.join(lines[1:-1])
-
-        result = json.loads(response_text)
-
-        # Ensure result has scenarios
-        if 'scenarios' not in result:
-            result = {'scenarios': []}
-
         # Add success flag and cost
         result['success'] = True
         result['cost'] = cost
         result['usage'] = usage_info
-
-        tasks_storage[task_id]["status"] = "completed"
-        tasks_storage[task_id]["result"] = result
+        if cancel_token:
+            result['budget'] = cancel_token.budget_report()
+            cancel_token.raise_if_cancelled()
+        revision = section_index.save(key, plan, plan.reused + groups, task_id, usage_info['total_tokens'])
+        if key:
+            result['incremental'] = incremental_summary(key, plan, revision, usage_info)
+        publish_scenarios(task_id, result['scenarios'], start=min(streamed, len(result['scenarios'])))
+        update_task(task_id, status="completed", partial_scenarios=None, result=result)
 
         # Backend'e bildir (maliyeti de gönder)
         await notify_backend("document:analyzed", {
@@ -753,9 +1523,10 @@ Return ONLY a valid JSON object with a "scenarios" array. No markdown, no code b
             "agent_type": "TEST_ARCHITECT"  # Document analysis yapan agent
         })
 
+    except TaskCancelled:
+        pass
     except Exception as e:
-        tasks_storage[task_id]["status"] = "error"
-        tasks_storage[task_id]["result"] = {"error": str(e)}
+        update_task(task_id, status="error", result={"error": str(e)})
 
         await notify_backend("document:analysis_error", {
             "document_filename": document_info.get('filename'),
@@ -764,156 +1535,373 @@ Return ONLY a valid JSON object with a "scenarios" array. No markdown, no code b
         })
 
 
-@router.post("/crew/text-analysis")
-async def analyze_text(request: TextAnalysisRequest, background_tasks: BackgroundTasks):
-    """Metin gereksinimlerini analiz et ve senaryoları çıkar"""
+# ============================================================
+# BATCH ANALYSIS
+# ============================================================
+
+def batch_item_args(crew_type: str, item: BaseModel) -> list:
+    """Batch öğesini execute_* argümanlarına çevir"""
+    if crew_type == "text_analysis":
+        return [item.requirement_text, item.template, item.options]
+    return [item.document_content, item.document_info, item.suite_id, item.template, item.options]
+
+
+def start_batch(crew_type: str, items: List[BaseModel], concurrency: Optional[int], priority: Optional[str],
+                dedup: bool) -> dict:
+    """
+    Batch kaydını ve öğe task'larını oluştur, batch'i zamanlayıcıya ekle
+
+    Her öğe normal bir task kaydıdır (durum, SSE, iptal çalışır); aynı içerikli
+    öğeler mevcut task'lara bağlanır ve tekrar çalıştırılmaz.
+    """
     import uuid
 
-    task_id = str(uuid.uuid4())[:8]
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large ({len(items)} > {BATCH_MAX_ITEMS} items)")
+    concurrency = max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+
+    batch_id = str(uuid.uuid4())[:8]
+    created_at = datetime.now().isoformat()
+    entries = []
+    digests = []
+    for index, item in enumerate(items):
+        task_id, outcome, digest = acquire_task_id(crew_type, item.model_dump(), None, dedup)
+        if outcome == MISS:
+            digests.append(digest)
+            task_store.create({
+                "id": task_id,
+                "crew_type": crew_type,
+                "status": "pending",
+                "created_at": created_at,
+                "batch_id": batch_id,
+                "result": None
+            })
+        entries.append({
+            "index": index,
+            "task_id": task_id,
+            "deduplicated": outcome,
+            "args": batch_item_args(crew_type, item) if outcome == MISS else None
+        })
+
+    task_store.create({
+        "id": batch_id,
+        "crew_type": f"{crew_type}_batch",
+        "status": "pending",
+        "created_at": created_at,
+        "items": [{key: entry[key] for key in ("index", "task_id", "deduplicated")} for entry in entries],
+        "total": len(entries),
+        "concurrency": concurrency,
+        "result": None
+    })
+
+    try:
+        queue_info = start_cancellable_task(batch_id, "batch", priority, execute_batch, crew_type, entries, concurrency,
+                                            priority)
+    except HTTPException:
+        # Batch kabul edilmedi: öğe kayıtları ve tekilleştirme anahtarları geri alınır
+        for entry in entries:
+            if entry["args"] is not None:
+                task_store.delete(entry["task_id"])
+        for digest in digests:
+            request_deduplicator.release(digest)
+        raise
+    return {"batch_id": batch_id, "entries": entries, "concurrency": concurrency, **queue_info}
+
+
+async def wait_for_task(task_id: str) -> Optional[str]:
+    """Başka bir task'a bağlanmış öğenin bitmesini bekle"""
+    while True:
+        status = task_status(task_id)
+        if status is None or status in ITEM_FINISHED:
+            return status
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+
+
+async def submit_batch_item(entry: dict, job: str, crew_type: str, priority: Optional[str]):
+    """
+    Batch öğesini crew'da boş slot açılınca kendi crew tipiyle zamanlayıcıya ekle
+
+    Öğe böylece crew limitine (ör. document_analysis=2) tabi olur ama crew'un
+    kabul kuyruğunda yer tutmaz; kuyruk interaktif istekler için boş kalır
+    (batch öğeleri interaktif isteklere 429 aldırmaz).
+    """
+    while True:
+        # Kontrol ve ekleme arasında await yok: bu süreçteki diğer öğeler aynı slotu göremez
+        if task_scheduler.free_slots(crew_type) > 0:
+            try:
+                task_scheduler.submit(entry["task_id"], crew_type, job, entry["args"], priority)
+                return
+            except AdmissionRejected:
+                pass
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+
+
+async def execute_batch(task_id: str, crew_type: str, entries: list, concurrency: int, priority: Optional[str] = None,
+                        cancel_token: CancellationToken = None):
+    """
+    Batch öğelerini en fazla `concurrency` eşzamanlı analizle çalıştır
+
+    Öğeler zamanlayıcıda kendi crew tipiyle çalışır; `concurrency` crew limitinin
+    üstüne eklenen ek bir sınırdır.
+    """
+    update_task(task_id, status="running")
+    job = (execute_text_analysis if crew_type == "text_analysis" else execute_document_analysis).__name__
+    semaphore = asyncio.Semaphore(concurrency)
+    run = batch_metrics.start(task_id, len(entries), concurrency)
+
+    async def _item(entry: dict):
+        if entry["args"] is None:
+            # Tekilleştirilmiş öğe: mevcut task'ın sonucunu bekle
+            run.deduplicated += 1
+            status = await wait_for_task(entry["task_id"]) or "error"
+            batch_metrics.record(run, status)
+        else:
+            async with semaphore:
+                if cancel_token and cancel_token.cancelled:
+                    update_task(entry["task_id"], status="cancelled")
+                    batch_metrics.record(run, "cancelled")
+                    return
+                started = time.monotonic()
+                await submit_batch_item(entry, job, crew_type, priority)
+                status = await wait_for_task(entry["task_id"]) or "error"
+                batch_metrics.record(run, status, (time.monotonic() - started) * 1000)
+
+        progress_broker.publish_threadsafe(task_id, "item", {
+            "index": entry["index"],
+            "task_id": entry["task_id"],
+            "status": status,
+            "done": run.done,
+            "total": run.total
+        })
+
+    try:
+        await asyncio.gather(*[_item(entry) for entry in entries])
+    except asyncio.CancelledError:
+        # Batch iptal edildi: kuyruktaki öğeler çıkarılır, çalışanlar iptal edilir
+        for entry in entries:
+            if entry["args"] is not None and task_status(entry["task_id"]) not in ITEM_FINISHED:
+                task_scheduler.cancel(entry["task_id"])
+                cancellation_registry.cancel(entry["task_id"])
+                update_task(entry["task_id"], status="cancelled")
+        batch_metrics.finish(run)
+        raise
+
+    summary = batch_metrics.finish(run)
+    status = "completed" if run.done == run.counts.get("completed", 0) else "completed_with_errors"
+    update_task(task_id, status="completed", result={"status": status, "metrics": summary})
+
+
+def batch_response(batch: dict, message: str) -> dict:
+    return {
+        "success": True,
+        "batch_id": batch["batch_id"],
+        "message": message,
+        "status": "pending",
+        "total": len(batch["entries"]),
+        "concurrency": batch["concurrency"],
+        "queue_position": batch.get("queue_position"),
+        "estimated_start_at": batch.get("estimated_start_at"),
+        "items": [
+            {"index": entry["index"], "task_id": entry["task_id"], "deduplicated": entry["deduplicated"]}
+            for entry in batch["entries"]
+        ]
+    }
+
+
+@router.post("/crew/text-analysis/batch")
+async def analyze_text_batch(
+    request: TextAnalysisBatchRequest,
+    priority: Optional[str] = Query(None, description="high | normal | low"),
+    dedup: bool = Query(True, description="Aynı içerikli öğeleri mevcut task'a bağla")
+):
+    """Birden çok gereksinim metnini sınırlı eşzamanlılıkla analiz et"""
+    batch = start_batch("text_analysis", request.items, request.concurrency, priority, dedup)
+    return batch_response(batch, "Text analysis batch started")
+
+
+@router.post("/crew/document-analysis/batch")
+async def analyze_document_batch(
+    request: DocumentAnalysisBatchRequest,
+    priority: Optional[str] = Query(None, description="high | normal | low"),
+    dedup: bool = Query(True, description="Aynı içerikli öğeleri mevcut task'a bağla")
+):
+    """Birden çok belgeyi sınırlı eşzamanlılıkla analiz et"""
+    batch = start_batch("document_analysis", request.items, request.concurrency, priority, dedup)
+    return batch_response(batch, "Document analysis batch started")
+
+
+def get_batch_record(batch_id: str) -> dict:
+    batch = task_store.get(batch_id)
+    if batch is None or "items" not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@router.get("/batches/stats")
+async def batches_stats():
+    """Batch throughput (öğe/dk) ve öğe gecikme yüzdelikleri"""
+    return batch_metrics.stats()
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """Batch durumu ve öğe bazında task durumları"""
+    batch = get_batch_record(batch_id)
+    items = []
+    counts: Dict[str, int] = {}
+    for item in batch["items"]:
+        status = task_status(item["task_id"]) or "expired"
+        counts[status] = counts.get(status, 0) + 1
+        items.append({**item, "status": status})
+
+    return {
+        "batch_id": batch_id,
+        "crew_type": batch["crew_type"],
+        "status": batch["status"],
+        "created_at": batch["created_at"],
+        "total": batch["total"],
+        "concurrency": batch["concurrency"],
+        "counts": counts,
+        "metrics": (batch.get("result") or {}).get("metrics"),
+        "items": items
+    }
+
+
+@router.get("/batches/{batch_id}/results")
+async def stream_batch_results(batch_id: str):
+    """Öğe sonuçlarını bittikçe JSONL olarak stream et"""
+    batch = get_batch_record(batch_id)
+
+    async def _jsonl():
+        total = len(batch["items"])
+        emitted = set()
+        while len(emitted) < total:
+            for item in batch["items"]:
+                if item["index"] in emitted:
+                    continue
+                task = task_store.get(item["task_id"])
+                status = task["status"] if task else "expired"
+                if status not in ITEM_FINISHED and status != "expired":
+                    continue
+                emitted.add(item["index"])
+                line = {
+                    "index": item["index"],
+                    "task_id": item["task_id"],
+                    "status": status,
+                    "deduplicated": item["deduplicated"],
+                    "result": task.get("result") if task else None
+                }
+                yield json.dumps(line, default=str, ensure_ascii=False) + "\n"
+            if len(emitted) < total:
+                await asyncio.sleep(BATCH_POLL_SECONDS)
+
+    return StreamingResponse(_jsonl(), media_type="application/x-ndjson")
+
+
+@router.post("/crew/text-analysis")
+async def analyze_text(
+    request: TextAnalysisRequest,
+    priority: Optional[str] = Query(None, description="high | normal | low"),
+    dedup: bool = Query(True, description="Aynı içerikli istekleri mevcut task'a bağla"),
+    cache: bool = Query(True, description="LLM yanıt cache'ini kullan"),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Metin gereksinimlerini analiz et ve senaryoları çıkar"""
+    payload = request.model_dump() if cache else {**request.model_dump(), "cache": False}
+    task_id, outcome, digest = acquire_task_id("text_analysis", payload, idempotency_key, dedup)
+    if outcome != MISS:
+        return deduplicated_response(task_id, outcome, "Text analysis already submitted")
 
-    tasks_storage[task_id] = {
+    task_store.create({
         "id": task_id,
         "crew_type": "text_analysis",
         "status": "pending",
         "created_at": datetime.now().isoformat(),
         "result": None
-    }
+    })
 
-    background_tasks.add_task(
-        execute_text_analysis,
-        task_id,
-        request.requirement_text,
-        request.template,
-        request.options
-    )
+    try:
+        queue_info = start_cancellable_task(
+            task_id,
+            "text_analysis",
+            priority,
+            execute_text_analysis,
+            request.requirement_text,
+            request.template,
+            request.options,
+            cache
+        )
+    except HTTPException:
+        request_deduplicator.release(digest, idempotency_key)
+        raise
 
     return {
         "success": True,
         "task_id": task_id,
         "message": "Text analysis started",
-        "status": "pending"
+        "status": "pending",
+        "deduplicated": outcome,
+        **queue_info
     }
 
 
-async def execute_text_analysis(task_id: str, requirement_text: str, template: str, options: dict):
+def complete_from_similar(task_id: str, similar):
+    """Benzer gereksinimin (uyarlanmış) senaryolarıyla task'ı LLM çağrısı yapmadan tamamla"""
+    publish_scenarios(task_id, similar.scenarios)
+    update_task(task_id, status="completed", result={
+        "success": True,
+        "scenarios": similar.scenarios,
+        "cost": 0.0,
+        "usage": {"model": similar.model, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "cost": 0.0},
+        "cache": "similar",
+        "similar": {
+            "similarity": similar.similarity,
+            "source_task_id": similar.task_id,
+            "replacements": similar.replacements
+        }
+    })
+
+
+async def execute_text_analysis(task_id: str, requirement_text: str, template: str, options: dict,
+                                use_cache: bool = True, cancel_token: CancellationToken = None):
     """Metin analizi çalıştırma - Gerçek AI kullanarak"""
-    tasks_storage[task_id]["status"] = "running"
+    update_task(task_id, status="running")
+    cache_bypass.set(not use_cache)
 
     try:
         import json
-        from openai import OpenAI
-
-        # Initialize OpenAI client
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        # AI prompt - text'ten test senaryoları üret
-        text_length = len(requirement_text)
-        text_words = len(requirement_text.split())
-
-        prompt = f"""Analyze the following test requirement and generate test scenarios.
-
-Text Statistics:
-- Length: {text_length} characters
-- Words: ~{text_words} words
-
-Requirement text:
-{requirement_text}
-
-Instructions:
-- CRITICAL: Read the ENTIRE text carefully before generating scenarios
-- **CAPTURE ALL STEPS**: Each line or action mentioned in the input must become a separate step
-- **NEVER SKIP POST-ACTION STEPS**: If text says "after login, do X", X must be included as steps
-- Adjust scenario count based on requirement complexity:
-  * Single simple action → 1 scenario
-  * Multiple related actions → 2-4 scenarios
-  * Complex multi-feature requirements → 5-10+ scenarios
-- IMPORTANT: Don't create unnecessary scenarios - match the actual requirements
-- **LANGUAGE RULE: Generate ALL content (title, description, steps, expectedResult) in the SAME LANGUAGE as the input text**
-  * If input is in Turkish → ALL fields must be in Turkish
-  * If input is in English → ALL fields must be in English
-- Each scenario should have:
-  * title: Brief descriptive title covering ALL actions (not just the first action)
-  * description: What the test does (include all major steps)
-  * steps: Array of steps with number and action (use clear, specific action verbs)
-  * expectedResult: What should happen at the END of all steps
-  * priority: HIGH, MEDIUM, or LOW
-  * automationType: UI, API, or INTEGRATION
-
-Example 1 (Turkish - Simple):
-Input: "ana sayfada inception filmini ara ve tıkla"
-Output:
-[
-  {{
-    "title": "Inception Filmini Ara ve Görüntüle",
-    "description": "Inception filmini arayıp detaylarını görüntüle",
-    "steps": [
-      {{"number": 1, "action": "Ana sayfaya git"}},
-      {{"number": 2, "action": "Arama kutusuna 'inception' yaz"}},
-      {{"number": 3, "action": "Ara butonuna tıkla veya Enter'a bas"}},
-      {{"number": 4, "action": "Sonuçlardan Inception filmine tıkla"}}
-    ],
-    "expectedResult": "Inception film detay sayfası görüntülenir",
-    "priority": "HIGH",
-    "automationType": "UI"
-  }}
-]
-
-Example 2 (Turkish - Multi-step with login + post-login):
-Input: "login sayfasına git, email olarak test@test.com yaz, şifre olarak 123456 yaz ve login ol, login olduktan sonra Ayarlar sayfasına git ve Profil Düzenle butonuna tıkla"
-Output:
-[
-  {{
-    "title": "Giriş Yap ve Profil Düzenle",
-    "description": "Kullanıcı giriş yapıp profil düzenleme ekranına gider",
-    "steps": [
-      {{"number": 1, "action": "Login sayfasına git"}},
-      {{"number": 2, "action": "Email alanına 'test@test.com' yaz"}},
-      {{"number": 3, "action": "Şifre alanına '123456' yaz"}},
-      {{"number": 4, "action": "Login butonuna tıkla"}},
-      {{"number": 5, "action": "Ayarlar sayfasına git"}},
-      {{"number": 6, "action": "Profil Düzenle butonuna tıkla"}}
-    ],
-    "expectedResult": "Profil düzenleme ekranı açılır",
-    "priority": "HIGH",
-    "automationType": "UI"
-  }}
-]
-
-Example 3 (English - Simple):
-Input: "search for Lord of the Rings and click it"
-Output:
-[
-  {{
-    "title": "Search and View Lord of the Rings",
-    "description": "Search for a movie and view details",
-    "steps": [
-      {{"number": 1, "action": "Navigate to homepage"}},
-      {{"number": 2, "action": "Type 'Lord of the Rings' into search box"}},
-      {{"number": 3, "action": "Click search button"}},
-      {{"number": 4, "action": "Click on the movie from results"}}
-    ],
-    "expectedResult": "Movie details are displayed",
-    "priority": "HIGH",
-    "automationType": "UI"
-  }}
-]
-
-CRITICAL RULES:
-- For simple single-sentence requirements, return only ONE scenario
-- **INCLUDE ALL STEPS FROM INPUT**: If input mentions 5 actions, output must have 5+ steps
-- **NEVER STOP AT LOGIN**: If input has "after login, do X", you MUST include X as steps
-- Break down complex actions into specific steps (navigate → fill fields → click → navigate again)
-- Be very specific about what to type, where to click, which values to use
-- NEVER use vague actions like "Locate" - use "Search for" or "Type into"
-- Return ONLY the JSON array, no markdown, no additional text"""
-
-        # LLM'den yanıt al
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a test automation expert who generates test scenarios from requirements."},
-                {"role": "user", "content": prompt}
-            ],
+
+        # Çok benzer bir gereksinim daha önce analiz edildiyse LLM'e gitme
+        similar = requirement_cache.lookup(requirement_text) if use_cache else None
+        if similar is not None:
+            complete_from_similar(task_id, similar)
+            await notify_backend("text:analyzed", {
+                "scenario_count": len(similar.scenarios),
+                "message": f"Text analysis completed from similar requirement - {len(similar.scenarios)} scenario(s)",
+                "level": "SUCCESS",
+                "cost": 0.0,
+                "agent_type": "TEST_ARCHITECT"
+            })
+            return
+
+        # Uygulama genelinde paylaşılan async OpenAI client (bağlantı havuzu yeniden kullanılır)
+        openai_client = get_openai_client()
+
+        # Bağlam penceresini aşan metin token sınırından kırpılır
+        original_text = requirement_text
+        requirement_text, trimmed_tokens = fit_to_context(requirement_text, model_router.primary, TEXT_PROMPT_RESERVE_TOKENS)
+        if trimmed_tokens:
+            print(f"[TextAnalysis] Requirement text trimmed by {trimmed_tokens} tokens to fit the context window")
+
+        # LLM'den yanıt al (stream: senaryolar kapandıkça yayınlanır)
+        streamer = ScenarioStreamer(task_id)
+        completion = await streamer.complete(
+            "text_analysis",
+            openai_client,
+            cancel_token,
+            messages=text_messages(requirement_text),
             temperature=0.7,
             max_tokens=4000
         )
@@ -923,27 +1911,26 @@ CRITICAL RULES:
         cost = usage_info["cost"]
         print(f"💰 Text Analysis Cost: ${cost:.6f} ({usage_info['model']}, {usage_info['total_tokens']} tokens)")
 
-        # Response'u parse et
-        response_text = completion.choices[0].message.content.strip()
+        # Senaryoları çıkar ve şemaya göre doğrula
+        scenarios = streamer.scenarios(completion)
+        streamer.cache_result()
+        if use_cache and streamer.cache_status != "hit":
+            requirement_cache.add(original_text, scenarios, task_id, usage_info)
 
-        # JSON'u çıkar (markdown code block içinde olabilir)
-        if '```json' in response_text:
-            json_text = response_text.split('```json')[1].split('```')[0].strip()
-        elif '```' in response_text:
-            json_text = response_text.split('```')[1].split('```')[0].strip()
-        else:
-            json_text = response_text.strip()
-
-        # Parse JSON
-        scenarios = json.loads(json_text)
-
-        tasks_storage[task_id]["status"] = "completed"
-        tasks_storage[task_id]["result"] = {
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        publish_scenarios(task_id, scenarios, start=min(streamer.streamed, len(scenarios)))
+        update_task(task_id, status="completed", partial_scenarios=None, result={
             "success": True,
             "scenarios": scenarios,
             "cost": cost,
-            "usage": usage_info
-        }
+            "usage": usage_info,
+            "streaming": streamer.summary(),
+            "cache": streamer.cache_status,
+            "routing": streamer.routing(),
+            "input_trimmed_tokens": trimmed_tokens,
+            "budget": cancel_token.budget_report() if cancel_token else None
+        })
 
         # Backend'e bildir (maliyeti de gönder)
         await notify_backend("text:analyzed", {
@@ -954,10 +1941,11 @@ CRITICAL RULES:
             "agent_type": "TEST_ARCHITECT"  # Text analysis yapan agent
         })
 
+    except TaskCancelled:
+        pass
     except Exception as e:
         print(f"Text analysis error: {e}")
-        tasks_storage[task_id]["status"] = "error"
-        tasks_storage[task_id]["result"] = {"error": str(e)}
+        update_task(task_id, status="error", result={"error": str(e)})
 
         await notify_backend("text:analysis_error", {
             "message": f"Analysis error: {str(e)}",
@@ -966,23 +1954,25 @@ CRITICAL RULES:
 
 
 @router.post("/crew/generate-automation")
-async def generate_automation(request: AutomationGenerationRequest, background_tasks: BackgroundTasks):
+async def generate_automation(request: AutomationGenerationRequest, priority: Optional[str] = Query(None, description="high | normal | low")):
     """Senaryo için otomatikleştirme kodu üret"""
     import uuid
 
     task_id = str(uuid.uuid4())[:8]
 
-    tasks_storage[task_id] = {
+    task_store.create({
         "id": task_id,
         "crew_type": "automation_generation",
         "status": "pending",
         "created_at": datetime.now().isoformat(),
         "result": None
-    }
+    })
 
-    background_tasks.add_task(
-        execute_automation_generation,
+    queue_info = start_cancellable_task(
         task_id,
+        "automation_generation",
+        priority,
+        execute_automation_generation,
         request.scenario,
         request.test_suite_info,
         request.backend_scenario_id
@@ -992,21 +1982,30 @@ async def generate_automation(request: AutomationGenerationRequest, background_t
         "success": True,
         "task_id": task_id,
         "message": "Automation generation started",
-        "status": "pending"
+        "status": "pending",
+        **queue_info
     }
 
 
-async def execute_automation_generation(task_id: str, scenario: dict, test_suite_info: dict, backend_scenario_id: int):
+async def execute_automation_generation(task_id: str, scenario: dict, test_suite_info: dict, backend_scenario_id: int,
+                                        cancel_token: CancellationToken = None):
     """Otomatikleştirme kodu üretme"""
-    tasks_storage[task_id]["status"] = "running"
+    update_task(task_id, status="running")
 
     try:
         from crews.automation_crew import automation_crew
 
-        result = automation_crew.generate_automation(scenario, test_suite_info)
+        result = await crew_executor.run(
+            "automation_generation",
+            automation_crew.generate_automation,
+            scenario,
+            test_suite_info,
+            cancel_token
+        )
 
-        tasks_storage[task_id]["status"] = "completed"
-        tasks_storage[task_id]["result"] = result
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        update_task(task_id, status="completed", result=result)
 
         # Backend'e bildir
         await notify_backend("automation:generated", {
@@ -1016,9 +2015,10 @@ async def execute_automation_generation(task_id: str, scenario: dict, test_suite
             "level": "SUCCESS"
         })
 
+    except TaskCancelled:
+        pass
     except Exception as e:
-        tasks_storage[task_id]["status"] = "error"
-        tasks_storage[task_id]["result"] = {"error": str(e)}
+        update_task(task_id, status="error", result={"error": str(e)})
 
         await notify_backend("automation:generation_error", {
             "scenario_title": scenario.get('title'),
@@ -1030,35 +2030,392 @@ async def execute_automation_generation(task_id: str, scenario: dict, test_suite
 @router.get("/tasks/{task_id}")
 async def get_task(task_id: str):
     """Task durumunu sorgula"""
-    if task_id not in tasks_storage:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return tasks_storage[task_id]
+    return task
 
 
 @router.post("/tasks/{task_id}/cancel")
 async def cancel_task(task_id: str):
-    """Task'ı iptal et"""
-    if task_id not in tasks_storage:
+    """Task'ı iptal et - çalışan iş bir sonraki adım/LLM çağrısı sınırında durur"""
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    tasks_storage[task_id]["status"] = "cancelled"
+    if task["status"] in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Task already {task['status']}")
+
+    # Kuyrukta bekleyen task hiç başlatılmaz
+    dequeued = task_scheduler.cancel(task_id)
+
+    # Token yoksa task bu süreçte çalışmıyor (kuyrukta ya da yeniden başlatma öncesinden kalma)
+    token = cancellation_registry.cancel(task_id)
+    if token:
+        cancellation = token.report()
+    elif dequeued:
+        cancellation = {"reason": "user", "requested_at": datetime.now().isoformat(), "dequeued": True}
+    else:
+        cancellation = None
+    update_task(task_id, status="cancelled", cancellation=cancellation)
+
+    if dequeued:
+        # Hiç başlamamış batch'in öğeleri de başlamayacak
+        for item in task.get("items", []):
+            if item["deduplicated"] == MISS and task_status(item["task_id"]) == "pending":
+                update_task(item["task_id"], status="cancelled")
 
     return {
         "success": True,
-        "message": f"Task {task_id} cancelled"
+        "message": f"Task {task_id} cancelled",
+        "cancellation": cancellation
+    }
+
+
+@router.get("/tasks/{task_id}/result")
+async def get_task_result(task_id: str):
+    """Task'ın sonuç payload'ını getir (listelemede dönmez)"""
+    task = task_store.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    return {
+        "id": task_id,
+        "status": task["status"],
+        "result": task.get("result")
     }
 
 
+def parse_resume_offset(offset: Optional[str], last_event_id: Optional[str]) -> Optional[int]:
+    """`?offset=` veya SSE `Last-Event-ID` header'ından devam offset'i"""
+    value = offset if offset not in (None, "") else last_event_id
+    if value in (None, ""):
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid offset")
+
+
+def open_task_events(task_id: str, offset: Optional[int]):
+    """
+    Task event stream'ini aç
+
+    Kanalı olmayan bitmiş task'lar için (retention / yeniden başlatma)
+    kayıttan final event'ler üretilir.
+    """
+    task = task_store.get(task_id)
+    if task is None:
+        return None
+
+    if task["status"] in FINISHED_STATUSES and not progress_broker.has_channel(task_id):
+        progress_broker.publish(task_id, "status", {"status": task["status"]})
+        publish_final(task_id, task["status"], task)
+
+    return progress_broker.subscribe(task_id, offset, heartbeat=PROGRESS_HEARTBEAT_SECONDS)
+
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    offset: Optional[str] = Query(None, description="Son alınan event offset'i (resume)"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Task ilerlemesini Server-Sent Events olarak push et"""
+    events = open_task_events(task_id, parse_resume_offset(offset, last_event_id))
+    if events is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def _sse():
+        async for event in events:
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.dumps(event.data, default=str, ensure_ascii=False)
+            yield f"id: {event.offset}\nevent: {event.type}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        _sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/tasks/{task_id}/ws")
+async def task_events_websocket(websocket: WebSocket, task_id: str, offset: Optional[str] = None):
+    """Task ilerlemesini WebSocket üzerinden push et (`?offset=` ile devam)"""
+    try:
+        resume = parse_resume_offset(offset, None)
+    except HTTPException:
+        await websocket.close(code=4400)
+        return
+
+    events = open_task_events(task_id, resume)
+    if events is None:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    try:
+        async for event in events:
+            # send_json yavaş istemcide bekler; bu sırada broker kuyruğu dolarsa
+            # abone geçmişten yeniden senkronize olur
+            if event is None:
+                await websocket.send_json({"type": "heartbeat"})
+                continue
+            await websocket.send_json(event.to_dict())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await events.aclose()
+
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    """Crew tipine göre çalışan / bekleyen task'lar ve kabul sayaçları"""
+    return task_scheduler.stats()
+
+
+@router.get("/notifier/stats")
+async def notifier_stats():
+    """Backend webhook teslimat kuyruğu ve outbox sayaçları"""
+    return backend_notifier.stats()
+
+
+@router.get("/progress/stats")
+async def progress_stats():
+    """İlerleme yayını kanal / abone sayaçları"""
+    return progress_broker.stats()
+
+
 @router.get("/tasks")
-async def list_tasks():
-    """Tüm task'ları listele"""
+async def list_tasks(
+    status: Optional[str] = None,
+    crew_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Task'ları sayfalı listele (yeniden eskiye, sadece özet - result yok)
+
+    Sonraki sayfa için yanıttaki `next_cursor` değerini `cursor` olarak gönder.
+    Sonuç için: GET /tasks/{task_id}/result
+    """
+    try:
+        page = task_store.list_page(
+            status=status,
+            crew_type=crew_type,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     return {
-        "tasks": list(tasks_storage.values()),
-        "total": len(tasks_storage)
+        "tasks": page["items"],
+        "count": len(page["items"]),
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"]
     }
 
 
+@router.get("/usage")
+async def usage_report(
+    bucket: str = Query("day", description="hour | day | week | month | total"),
+    group_by: str = Query("model", description="agent, model, task veya virgülle birleşimi"),
+    since: Optional[str] = Query(None, description="ISO tarih / saat veya epoch saniye"),
+    until: Optional[str] = Query(None, description="ISO tarih / saat veya epoch saniye (hariç)"),
+    task_id: Optional[str] = None,
+    agent: Optional[str] = None,
+    model: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000)
+):
+    """
+    LLM kullanımı: zaman kovası ve task / agent / model bazında çağrı, token, maliyet ve ortalama gecikme
+
+    Örnek: GET /usage?bucket=day&group_by=agent,model&since=2025-01-01
+    """
+    if not usage_ledger.enabled:
+        raise HTTPException(status_code=404, detail="Usage ledger is disabled (USAGE_LEDGER_ENABLED=false)")
+    try:
+        return usage_ledger.query(
+            bucket=bucket,
+            group_by=group_by,
+            since=since,
+            until=until,
+            task_id=task_id,
+            agent=agent,
+            model=model,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/usage/stats")
+async def usage_stats():
+    """Kullanım defteri: kayıtlı çağrı sayısı ve özet tablo boyutları"""
+    return usage_ledger.stats()
+
+
+@router.get("/llm/cache/stats")
+async def llm_cache_stats():
+    """LLM yanıt cache'i: hit / miss, tasarruf edilen token ve dolar"""
+    return llm_cache.stats()
+
+
+@router.delete("/llm/cache")
+async def clear_llm_cache():
+    """LLM yanıt cache'ini temizle"""
+    return {"success": True, "deleted": llm_cache.clear()}
+
+
+@router.get("/llm/similar/stats")
+async def similar_requirement_stats():
+    """Benzer gereksinim cache'i: hit oranı, uyarlanan senaryolar, arama süresi"""
+    return requirement_cache.stats()
+
+
+@router.get("/documents/index/stats")
+async def document_index_stats():
+    """Belge revizyon indeksi: yeniden kullanılan bölümler ve önlenen token oranı"""
+    return section_index.stats()
+
+
+@router.get("/llm/router/stats")
+async def model_router_stats():
+    """Model yönlendirici: model başına çağrı / hata oranı / p50-p95 gecikme, kararlar ve yedeğe geçişler"""
+    return model_router.stats()
+
+
+@router.get("/llm/hedge/stats")
+async def hedge_stats():
+    """Hedging: kopya istek oranı, kazanan kopyalar, ek maliyet ve p99 gecikme kazancı; sağlayıcı havuzları"""
+    return {**request_hedger.stats(), "providers": llm_client.provider_stats()}
+
+
+@router.get("/llm/ratelimit/stats")
+async def rate_limit_stats():
+    """Global rate limit: model başına kalan istek / token payı, bekleyen çağrılar, bekleme süreleri ve 429'lar"""
+    return await rate_limiter.stats_async()
+
+
+@router.get("/llm/replay/stats")
+async def replay_stats():
+    """Kayıt / replay sağlayıcısı: mod, gecikme modeli, birebir / şekil eşleşmeleri, kayıtsız çağrılar ve fixture'lar"""
+    return llm_replay.stats()
+
+
+@router.get("/llm/parse/stats")
+async def scenario_parse_stats():
+    """Senaryo çıkarma: kaynak başına parse başarısızlık oranı, onarımlar, structured output ve parse süresi"""
+    return parse_metrics.stats()
+
+
+@router.get("/llm/prompts/stats")
+async def prompt_template_stats():
+    """Prompt şablonları: sabit önek token sayısı, cache'e uygunluk ve cache'ten okunan token oranı"""
+    return prompt_cache_metrics.stats()
+
+
+@router.get("/llm/tokenizer/stats")
+async def tokenizer_stats():
+    """Token sayacı: model başına tokenizer / bağlam penceresi, tam / yaklaşık sayım sayıları"""
+    return token_counter.stats()
+
+
+@router.get("/llm/pool/stats")
+async def llm_pool_stats():
+    """Paylaşılan LLM bağlantı havuzunun kullanımı"""
+    return llm_client.stats()
+
+
+@router.get("/executor/stats")
+async def executor_stats():
+    """Worker havuzlarının kuyruk derinliği ve sayaçları"""
+    return {
+        "pools": crew_executor.stats(),
+        "cancellations": cancellation_registry.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+# Zamanlayıcı işleri isimle kuyruğa alır (paylaşılan modda başka bir worker çalıştırabilir)
+JOBS = {
+    fn.__name__: fn for fn in (
+        execute_agent,
+        execute_test_crew,
+        execute_security_crew,
+        execute_document_analysis,
+        execute_text_analysis,
+        execute_automation_generation,
+        execute_batch
+    )
+}
+
+
+async def purge_tasks_periodically():
+    """Retention politikasına göre eski task'ları düzenli olarak temizle"""
+    while True:
+        await asyncio.sleep(TASK_PURGE_INTERVAL_SECONDS)
+        try:
+            purged = task_store.purge_expired()
+            if purged:
+                print(f"🧹 {purged} eski task temizlendi")
+            progress_broker.purge()
+        except Exception as e:
+            print(f"Task purge error: {e}")
+
+
+@router.get("/dedup/stats")
+async def dedup_stats():
+    """İstek tekilleştirme sayaçları (hit / attach / miss)"""
+    return request_deduplicator.stats()
+
+
+@router.get("/store/stats")
+async def task_store_stats():
+    """Task deposu istatistikleri"""
+    return task_store.stats()
+
+
+@app.on_event("startup")
+async def start_task_purger():
+    """Task temizleyiciyi, crew LLM iptal hook'unu ve ilerleme yayınını başlat"""
+    install_crew_llm_hook()
+    llm_client.install_crew_llm(crew_llm)
+    prompt_templates.precompile(model_router.primary)
+    progress_broker.bind_loop(asyncio.get_running_loop())
+    task_scheduler.runner = run_job
+    task_scheduler.on_queue_change = on_queue_change
+    task_scheduler.on_cancel_requested = on_cancel_requested
+    task_scheduler.on_task_lost = on_task_lost
+    task_scheduler.start()
+    backend_notifier.start()
+    if TASK_PURGE_INTERVAL_SECONDS > 0:
+        app.state.task_purger = asyncio.create_task(purge_tasks_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown_resources():
+    """Uygulama kapanırken kuyrukları, LLM bağlantılarını, worker havuzlarını, task deposunu ve kullanım defterini kapat"""
+    purger = getattr(app.state, "task_purger", None)
+    if purger:
+        purger.cancel()
+    task_scheduler.shutdown()
+    await backend_notifier.stop()
+    await llm_client.aclose()
+    crew_executor.shutdown(wait=False)
+    task_store.close()
+    usage_ledger.close()
+
+
 # Router'ı app'e ekle
 app.include_router(router)
 
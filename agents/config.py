@@ -38,18 +38,169 @@ load_dotenv()
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Anahtar rotasyonu: virgülle ayrılmış ek anahtarlar (boşsa tek anahtar kullanılır)
+OPENAI_API_KEYS = [k.strip() for k in os.getenv("OPENAI_API_KEYS", "").split(",") if k.strip()] or [k for k in [OPENAI_API_KEY] if k]
+GEMINI_API_KEYS = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()] or [k for k in [GEMINI_API_KEY] if k]
 
 # LLM Settings
+# openai | replay (çağrılar LLM_REPLAY_PATH'teki kayıtlı fixture'lardan cevaplanır)
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# Replay sağlayıcısı: record (gerçek çağrıları kaydet) | replay (ağa çıkmadan kayıttan cevapla)
+LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "replay")
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_fixtures.db"))
+# Gecikme modeli: recorded | scaled (LLM_REPLAY_LATENCY_SCALE ile çarpılır) | zero
+LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "recorded")
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+# Birebir kayıt yoksa: shape (aynı model ve system prompt'lu kayıtlardan biri) | exact (404)
+LLM_REPLAY_MATCH = os.getenv("LLM_REPLAY_MATCH", "shape")
+REPLAY_OFFLINE = LLM_PROVIDER == "replay" and LLM_REPLAY_MODE == "replay"
+if REPLAY_OFFLINE:
+    # Kayıttan cevaplanan çağrılar için gerçek anahtar gerekmez
+    OPENAI_API_KEY = OPENAI_API_KEY or "replay"
+    GEMINI_API_KEY = GEMINI_API_KEY or "replay"
+    OPENAI_API_KEYS = OPENAI_API_KEYS or [OPENAI_API_KEY]
+    GEMINI_API_KEYS = GEMINI_API_KEYS or [GEMINI_API_KEY]
+# Tek bir LLM isteği için üst süre (iptal edilen task'ın worker slotunu bırakma süresini sınırlar)
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+# Analiz çağrılarında LLM çıktısını stream et (senaryolar tamamlandıkça yayınlanır)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+# Destekleyen modellerde senaryo çıktısı JSON şemasıyla (structured output) istenir
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Paylaşılan LLM bağlantı havuzu (HTTP/2 için: pip install httpx[http2])
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+# Çevrimdışı token sayımı: tiktoken encoding dosyalarının dizini (TIKTOKEN_CACHE_DIR)
+TOKENIZER_CACHE_DIR = os.getenv("TOKENIZER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tokenizers"))
+# Task başına LLM bütçesi (0 = sınırsız); çağrılar gönderilmeden önce kontrol edilir
+TASK_TOKEN_BUDGET = int(os.getenv("TASK_TOKEN_BUDGET", "2000000"))
+TASK_COST_BUDGET_USD = float(os.getenv("TASK_COST_BUDGET_USD", "2.0"))
+# Model yönlendirici: sıralı yedek zinciri (OpenAI + Gemini); büyük girdide güçlü modeller öne alınır,
+# p95 gecikmesi hedefi aşan model sona itilir, art arda hata veren model bir süre atlanır
+LLM_ROUTER_CHAIN = [m.strip() for m in os.getenv("LLM_ROUTER_CHAIN", "gpt-4o-mini,gpt-4o,gemini-1.5-flash").split(",") if m.strip()]
+LLM_ROUTER_QUALITY_MODELS = [m.strip() for m in os.getenv("LLM_ROUTER_QUALITY_MODELS", "gpt-4o,gemini-1.5-pro").split(",") if m.strip()]
+LLM_ROUTER_LARGE_INPUT_TOKENS = int(os.getenv("LLM_ROUTER_LARGE_INPUT_TOKENS", "12500"))
+LLM_ROUTER_LATENCY_SLO_MS = float(os.getenv("LLM_ROUTER_LATENCY_SLO_MS", "30000"))
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+LLM_ROUTER_ERROR_THRESHOLD = int(os.getenv("LLM_ROUTER_ERROR_THRESHOLD", "3"))
+# Gemini'nin OpenAI uyumlu endpoint'i (yönlendiricinin Gemini çağrıları)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+# Sağlayıcı başına eş zamanlı LLM isteği sınırı ("openai=16,gemini=8")
+LLM_PROVIDER_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (item.partition("=") for item in os.getenv("LLM_PROVIDER_CONCURRENCY", "openai=16,gemini=8").split(","))
+    if limit.strip()
+}
+# Hedging: birincil model gecikmesinin bu yüzdeliği kadar cevap gelmezse zincirdeki sonraki modele kopya istek
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "2000"))
+LLM_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "20000"))
+# Kopya istek gönderilen çağrıların en fazla oranı (ek maliyet sınırı)
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+# Kopya kazandığında birincilin ölçüm için sonuna kadar çalıştırıldığı çağrı oranı (p99 kazancı tahmini)
+LLM_HEDGE_SHADOW_RATIO = float(os.getenv("LLM_HEDGE_SHADOW_RATIO", "0.1"))
+# Global rate limit: model başına dakikalık istek / token kovası ("model=rpm/tpm,...")
+# Paylaşılan durum modunda kova tüm worker'lar için ortaktır (TASK_STORE_PATH)
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+LLM_RATE_LIMITS = os.getenv(
+    "LLM_RATE_LIMITS",
+    "gpt-4o-mini=5000/2000000,gpt-4o=5000/450000,gemini-1.5-flash=2000/4000000,gemini-1.5-pro=1000/4000000"
+)
 
 # API Server
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 
+# Worker süreçleri (main.py --workers N)
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+# Paylaşılan durum: task deposu, iş kuyruğu ve ilerleme event'leri SQLite'ta
+# (birden fazla worker varsa otomatik açılır)
+SHARED_STATE = os.getenv("SHARED_STATE", "true" if API_WORKERS > 1 else "false").lower() == "true"
+SHARED_STATE_POLL_SECONDS = float(os.getenv("SHARED_STATE_POLL_SECONDS", "0.25"))
+SHARED_STATE_LEASE_SECONDS = float(os.getenv("SHARED_STATE_LEASE_SECONDS", "30"))
+
 # Backend
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:3001")
 
+# Executor (crew tipine göre worker havuzları)
+# Örnek: "document_analysis=thread:8,test=thread:2"
+EXECUTOR_POOLS = os.getenv("EXECUTOR_POOLS", "")
+EXECUTOR_DEFAULT_WORKERS = int(os.getenv("EXECUTOR_DEFAULT_WORKERS", "4"))
+
+# Task Store (memory | sqlite | tiered)
+TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "tiered")
+TASK_STORE_PATH = os.getenv("TASK_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tasks.db"))
+TASK_MEMORY_MAX_ENTRIES = int(os.getenv("TASK_MEMORY_MAX_ENTRIES", "500"))
+TASK_MEMORY_TTL_SECONDS = int(os.getenv("TASK_MEMORY_TTL_SECONDS", "900"))
+TASK_RESULT_INLINE_BYTES = int(os.getenv("TASK_RESULT_INLINE_BYTES", "65536"))
+
+# Usage Ledger (her LLM çağrısı; saatlik ve task bazlı özetlerle)
+USAGE_LEDGER_ENABLED = os.getenv("USAGE_LEDGER_ENABLED", "true").lower() == "true"
+USAGE_LEDGER_PATH = os.getenv("USAGE_LEDGER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "usage.db"))
+TASK_RETENTION_HOURS = float(os.getenv("TASK_RETENTION_HOURS", "72"))
+TASK_STORE_MAX_TASKS = int(os.getenv("TASK_STORE_MAX_TASKS", "100000"))
+TASK_PURGE_INTERVAL_SECONDS = int(os.getenv("TASK_PURGE_INTERVAL_SECONDS", "600"))
+
+# Task ilerleme yayını (SSE / WebSocket)
+PROGRESS_HISTORY_SIZE = int(os.getenv("PROGRESS_HISTORY_SIZE", "256"))
+PROGRESS_QUEUE_SIZE = int(os.getenv("PROGRESS_QUEUE_SIZE", "64"))
+PROGRESS_RETENTION_SECONDS = int(os.getenv("PROGRESS_RETENTION_SECONDS", "300"))
+PROGRESS_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+
+# Task zamanlayıcı (crew tipine göre eşzamanlılık ve kuyruk sınırları)
+# Örnek: "document_analysis=2,text_analysis=6"
+SCHEDULER_CONCURRENCY = os.getenv("SCHEDULER_CONCURRENCY", "")
+SCHEDULER_MAX_RUNNING = int(os.getenv("SCHEDULER_MAX_RUNNING", "8"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "20"))
+SCHEDULER_AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "120"))
+
+# İstek tekilleştirme (Idempotency-Key ve aynı içerikli analiz istekleri)
+DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", "600"))
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Toplu analiz (/crew/*/batch)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "0.25"))
+
+# LLM yanıt cache'i (bellek LRU + SQLite disk katmanı)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_cache.db"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+# Benzer gereksinim cache'i (MinHash/LSH, tahmini Jaccard benzerlik eşiği)
+SIMILAR_CACHE_ENABLED = os.getenv("SIMILAR_CACHE_ENABLED", "true").lower() == "true"
+SIMILAR_CACHE_THRESHOLD = float(os.getenv("SIMILAR_CACHE_THRESHOLD", "0.8"))
+SIMILAR_CACHE_MAX_ENTRIES = int(os.getenv("SIMILAR_CACHE_MAX_ENTRIES", "100000"))
+
+# Büyük belgeler: eşiği aşan belge bölüm farkında parçalara bölünüp paralel analiz edilir (map-reduce)
+DOC_CHUNK_THRESHOLD_CHARS = int(os.getenv("DOC_CHUNK_THRESHOLD_CHARS", "12000"))
+DOC_CHUNK_MAX_CHARS = int(os.getenv("DOC_CHUNK_MAX_CHARS", "8000"))
+DOC_CHUNK_CONCURRENCY = int(os.getenv("DOC_CHUNK_CONCURRENCY", "4"))
+# Belge revizyonları: sadece değişen / yeni bölümler yeniden analiz edilir
+DOC_INCREMENTAL_ENABLED = os.getenv("DOC_INCREMENTAL_ENABLED", "true").lower() == "true"
+
+# Backend webhook teslimatı (toplu gönderim, retry, disk outbox)
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "50"))
+NOTIFY_BATCH_WINDOW_MS = int(os.getenv("NOTIFY_BATCH_WINDOW_MS", "250"))
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "1000"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "4"))
+NOTIFY_RETRY_BASE_SECONDS = float(os.getenv("NOTIFY_RETRY_BASE_SECONDS", "0.5"))
+NOTIFY_RETRY_MAX_SECONDS = float(os.getenv("NOTIFY_RETRY_MAX_SECONDS", "30"))
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", "10"))
+NOTIFY_MAX_CONNECTIONS = int(os.getenv("NOTIFY_MAX_CONNECTIONS", "10"))
+NOTIFY_OUTBOX_PATH = os.getenv("NOTIFY_OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "outbox.db"))
+NOTIFY_OUTBOX_MAX_ENTRIES = int(os.getenv("NOTIFY_OUTBOX_MAX_ENTRIES", "10000"))
+NOTIFY_OUTBOX_RETRY_SECONDS = float(os.getenv("NOTIFY_OUTBOX_RETRY_SECONDS", "30"))
+NOTIFY_COST_FLUSH_SECONDS = float(os.getenv("NOTIFY_COST_FLUSH_SECONDS", "10"))
+NOTIFY_AGENT_CACHE_TTL_SECONDS = float(os.getenv("NOTIFY_AGENT_CACHE_TTL_SECONDS", "300"))
+
 # Playwright
 HEADLESS = os.getenv("HEADLESS", "true").lower() == "true"
 BROWSER = os.getenv("BROWSER", "chromium")
@@ -60,27 +211,47 @@ SLOW_MO = int(os.getenv("SLOW_MO", "0"))
 # ============================================================
 from crewai import LLM
 
-def get_llm():
-    """LLM instance oluştur"""
-    if LLM_PROVIDER == "openai":
-        os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+def provider_for(model: str) -> str:
+    """Model adından sağlayıcı (gemini-* → gemini, diğerleri → openai)"""
+    return "gemini" if model.lower().startswith("gemini") else "openai"
+
+
+def provider_api_key(model: str) -> str:
+    """Modelin sağlayıcısına ait API anahtarı (yoksa boş)"""
+    return GEMINI_API_KEY if provider_for(model) == "gemini" else OPENAI_API_KEY
+
+
+def get_llm(model: str = None):
+    """
+    LLM instance oluştur
+
+    Sağlayıcı model adından çıkarılır. Model verilmezse LLM_MODEL; sağlayıcısının
+    API anahtarı yoksa LLM_ROUTER_CHAIN'de anahtarı olan ilk model kullanılır.
+    LLM_PROVIDER=replay ise Gemini modelleri de OpenAI uyumlu client'la kurulur;
+    böylece crew çağrıları kayıt / replay yapan paylaşılan havuzdan geçer.
+    """
+    if model is None:
+        candidates = [LLM_MODEL] + [m for m in LLM_ROUTER_CHAIN if m != LLM_MODEL]
+        model = next((m for m in candidates if provider_api_key(m)), LLM_MODEL)
+
+    if provider_for(model) == "gemini" and LLM_PROVIDER == "replay":
         return LLM(
-            model=LLM_MODEL,
-            api_key=OPENAI_API_KEY
+            model=model,
+            provider="openai",
+            api_key=GEMINI_API_KEY,
+            base_url=GEMINI_BASE_URL
         )
-    elif LLM_PROVIDER == "gemini":
+    if provider_for(model) == "gemini":
         os.environ["GEMINI_API_KEY"] = GEMINI_API_KEY
         return LLM(
-            model=f"gemini/{LLM_MODEL}",
+            model=f"gemini/{model}",
             api_key=GEMINI_API_KEY
         )
-    else:
-        # Default: OpenAI
-        os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-        return LLM(
-            model="gpt-4o-mini",
-            api_key=OPENAI_API_KEY
-        )
+    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+    return LLM(
+        model=model,
+        api_key=OPENAI_API_KEY
+    )
 
 # Global LLM instance
 llm = get_llm()
@@ -13,6 +13,8 @@ from agents.test_architect import test_architect_agent
 from agents.developer_bot import developer_bot_agent
 from agents.orchestrator import orchestrator_agent
 from tasks.document_analysis_tasks import create_code_generation_task
+from utils.cancellation import CancellationToken, TaskCancelled
+from utils.progress import crew_step_callback, report_stage
 
 
 class AutomationCrew:
@@ -30,13 +32,15 @@ class AutomationCrew:
         self.developer = developer_bot_agent
         self.orchestrator = orchestrator_agent
 
-    def generate_automation(self, scenario: dict, test_suite_info: dict) -> dict:
+    def generate_automation(self, scenario: dict, test_suite_info: dict,
+                            cancel_token: CancellationToken = None) -> dict:
         """
         Senaryo için otomatikleştirme kodu üret
 
         Args:
             scenario: Test senaryosu objesi
             test_suite_info: Test suite bilgileri
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Üretilen otomatikleştirme kodu
@@ -60,11 +64,17 @@ class AutomationCrew:
                 agents=[self.test_architect, self.developer, self.orchestrator],
                 tasks=[code_task],
                 verbose=True,
-                process=Process.sequential
+                process=Process.sequential,
+                step_callback=crew_step_callback(cancel_token)
             )
 
             # Çalıştır
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            report_stage(cancel_token, "code_generation", scenario=scenario.get('title'))
             result = crew.kickoff()
+            if cancel_token:
+                cancel_token.record_crew_usage(result)
 
             # Sonucu string'e çevir ve temizle
             code_output = str(result)
@@ -94,6 +104,8 @@ class AutomationCrew:
                 "scenario_id": scenario.get('id')
             }
 
+        except TaskCancelled:
+            raise
         except Exception as e:
             print(f"\n❌ Kod üretimi sırasında hata: {str(e)}")
             return {
@@ -104,13 +116,15 @@ class AutomationCrew:
                 "scenario_title": scenario.get('title')
             }
 
-    def generate_multiple(self, scenarios: list, test_suite_info: dict) -> dict:
+    def generate_multiple(self, scenarios: list, test_suite_info: dict,
+                          cancel_token: CancellationToken = None) -> dict:
         """
         Birden fazla senaryo için kod üret
 
         Args:
             scenarios: Test senaryoları listesi
             test_suite_info: Test suite bilgileri
+            cancel_token: İptal token'ı (opsiyonel) - senaryolar arasında kontrol edilir
 
         Returns:
             Üretilen kodlar (senaryo ID'sine göre)
@@ -120,11 +134,19 @@ class AutomationCrew:
         print("=" * 60)
 
         results = {}
-        for scenario in scenarios:
+        for index, scenario in enumerate(scenarios):
+            if cancel_token and cancel_token.cancelled:
+                # Kalan senaryolar için crew çalıştırma
+                cancel_token.skip_kickoffs(len(scenarios) - index)
+                print(f"\n⛔ İptal edildi, {len(scenarios) - index} senaryo atlandı")
+                cancel_token.raise_if_cancelled()
+
             scenario_id = scenario.get('id')
             print(f"\n⏳ Senaryo {scenario_id} işleniyor: {scenario.get('title')}")
-            result = self.generate_automation(scenario, test_suite_info)
+            result = self.generate_automation(scenario, test_suite_info, cancel_token)
             results[scenario_id] = result
+            report_stage(cancel_token, "scenario_done", scenario_id=scenario_id,
+                         completed=index + 1, total=len(scenarios))
 
         return {
             "success": True,
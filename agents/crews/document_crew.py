@@ -6,6 +6,9 @@ Yüklenen belgelerden test senaryoları çıkarmak için ekip
 
 import sys
 import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from crewai import Crew, Process
@@ -13,6 +16,11 @@ from agents.test_architect import test_architect_agent
 from agents.orchestrator import orchestrator_agent
 from tasks.document_analysis_tasks import create_document_analysis_task
 from tools.nlp_analyzer import nlp_analyzer
+from utils.cancellation import CancellationToken, TaskCancelled
+from utils.progress import crew_step_callback, report_stage
+from utils.document_chunker import chunk_document, merge_scenarios
+from utils.scenario_extractor import extract_scenarios
+from config import DOC_CHUNK_THRESHOLD_CHARS, DOC_CHUNK_MAX_CHARS, DOC_CHUNK_CONCURRENCY
 
 
 class DocumentCrew:
@@ -28,13 +36,19 @@ class DocumentCrew:
         self.test_architect = test_architect_agent
         self.orchestrator = orchestrator_agent
 
-    def analyze_document(self, document_content: str, document_info: dict) -> dict:
+    def analyze_document(self, document_content: str, document_info: dict,
+                         cancel_token: CancellationToken = None) -> dict:
         """
         Belgeyi analiz et ve test senaryolarını çıkar
 
+        DOC_CHUNK_THRESHOLD_CHARS'tan büyük belgeler kesilmez: bölüm farkında
+        parçalara bölünür, parçalar en fazla DOC_CHUNK_CONCURRENCY eşzamanlı
+        crew ile analiz edilir ve senaryolar birleştirilip tekilleştirilir.
+
         Args:
             document_content: Belgenin metinsel içeriği
             document_info: Belge bilgileri (filename, type, etc)
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Çıkarılan test senaryoları (JSON array)
@@ -46,82 +60,66 @@ class DocumentCrew:
         print("=" * 60)
 
         try:
-            # Görev: Belge Analizi
-            analysis_task = create_document_analysis_task(
-                self.test_architect,
-                document_content,
-                document_info
-            )
-
-            # Crew oluştur
-            crew = Crew(
-                agents=[self.test_architect, self.orchestrator],
-                tasks=[analysis_task],
-                verbose=True,
-                process=Process.sequential
-            )
-
-            # Çalıştır
-            try:
-                result = crew.kickoff()
-            except Exception as e:
-                print(f"❌ Crew execution error: {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return {
-                    "success": False,
-                    "error": f"Crew execution error: {str(e)}",
-                    "scenarios": [],
-                    "document_filename": document_info.get('filename')
-                }
+            chunk_info = None
+            if len(document_content) > DOC_CHUNK_THRESHOLD_CHARS:
+                try:
+                    scenarios, chunk_info, raw_output = self._analyze_chunks(document_content, document_info, cancel_token)
+                except TaskCancelled:
+                    raise
+                except Exception as e:
+                    print(f"❌ Crew execution error: {type(e).__name__}: {str(e)}")
+                    return {
+                        "success": False,
+                        "error": f"Crew execution error: {str(e)}",
+                        "scenarios": [],
+                        "document_filename": document_info.get('filename')
+                    }
+            else:
+                # Çalıştır
+                try:
+                    result = self._kickoff_analysis(
+                        self.test_architect, self.orchestrator, document_content, document_info, cancel_token
+                    )
+                except TaskCancelled:
+                    raise
+                except Exception as e:
+                    print(f"❌ Crew execution error: {type(e).__name__}: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
+                    return {
+                        "success": False,
+                        "error": f"Crew execution error: {str(e)}",
+                        "scenarios": [],
+                        "document_filename": document_info.get('filename')
+                    }
+                raw_output = str(result)
+                scenarios = self._extract_scenarios(raw_output)
 
             print("\n" + "=" * 60)
             print("✅ Belge Analizi Tamamlandı!")
             print("=" * 60)
 
-            # Sonucu JSON olarak parse etmeyi dene
-            import json
-            import re
-
-            try:
-                # AI çıktısından JSON çıkarmaya çalış
-                result_str = str(result).strip()
-
-                # Eğer çıktı JSON array ile başlamıyorsa, JSON kısmını bul
-                if not result_str.startswith('['):
-                    # JSON array'ı bul - son '[' ile başlayan ve ']' ile biten bölüm
-                    json_match = re.search(r'\[[\s\S]*\]', result_str)
-                    if json_match:
-                        result_str = json_match.group()
-                    else:
-                        print("⚠️ JSON array bulunamadı")
-                        result_str = '[]'
-
-                # JSON'ı parse et
-                scenarios = json.loads(result_str)
-
-                # Senaryo sayısını logla
-                print(f"✅ {len(scenarios)} senaryo başarıyla çıkarıldı!")
-                for i, scenario in enumerate(scenarios, 1):
+            # Senaryo sayısını logla
+            print(f"✅ {len(scenarios)} senaryo başarıyla çıkarıldı!")
+            for i, scenario in enumerate(scenarios, 1):
+                if isinstance(scenario, dict):
                     print(f"   {i}. {scenario.get('title', 'Başlıksız')}")
 
-            except json.JSONDecodeError as e:
-                print(f"⚠️ JSON parse hatası: {str(e)}")
-                print(f"   Çıktı: {result_str[:500]}")
-                scenarios = []
-            except Exception as e:
-                print(f"⚠️ Senaryo çıkarma hatası: {str(e)}")
-                scenarios = []
-
-            return {
+            result = {
                 "success": True,
                 "scenarios": scenarios if isinstance(scenarios, list) else [],
-                "raw_output": str(result),
+                "raw_output": raw_output,
                 "document_filename": document_info.get('filename'),
                 "document_type": document_info.get('type'),
                 "scenario_count": len(scenarios) if isinstance(scenarios, list) else 0
             }
+            if chunk_info:
+                result["chunks"] = chunk_info
+            return result
 
+        except TaskCancelled:
+            print(f"\n⛔ Belge analizi iptal edildi: {document_info.get('filename', 'N/A')}")
+            raise
         except Exception as e:
             print(f"\n❌ Belge analizi sırasında hata: {str(e)}")
             return {
@@ -131,6 +129,89 @@ class DocumentCrew:
                 "document_filename": document_info.get('filename')
             }
 
+    def _kickoff_analysis(self, test_architect, orchestrator, document_content: str, document_info: dict,
+                          cancel_token: CancellationToken = None, part: str = None):
+        """Tek bir belge (veya belge parçası) için analiz crew'unu çalıştır"""
+        # Görev: Belge Analizi
+        analysis_task = create_document_analysis_task(
+            test_architect,
+            document_content,
+            document_info,
+            part
+        )
+
+        # Crew oluştur
+        crew = Crew(
+            agents=[test_architect, orchestrator],
+            tasks=[analysis_task],
+            verbose=part is None,
+            process=Process.sequential,
+            step_callback=crew_step_callback(cancel_token)
+        )
+
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        report_stage(cancel_token, "document_analysis" if part is None else f"document_analysis {part}")
+        result = crew.kickoff()
+        if cancel_token:
+            cancel_token.record_crew_usage(result)
+            cancel_token.raise_if_cancelled()
+        return result
+
+    def _analyze_chunks(self, document_content: str, document_info: dict,
+                        cancel_token: CancellationToken = None) -> Tuple[list, dict, str]:
+        """
+        Map-reduce: her parça ayrı crew ile (ajan kopyalarıyla) paralel analiz edilir
+
+        Returns:
+            (birleşik senaryolar, parça istatistikleri, ham çıktılar)
+        """
+        chunks = chunk_document(document_content, DOC_CHUNK_MAX_CHARS)
+        print(f"📚 Büyük belge: {len(chunks)} parça, en fazla {DOC_CHUNK_CONCURRENCY} eşzamanlı analiz")
+
+        def _map(chunk):
+            part = f"{chunk.index + 1}/{len(chunks)}"
+            if chunk.sections:
+                part += f" (sections: {', '.join(chunk.sections)})"
+            result = self._kickoff_analysis(
+                self.test_architect.copy(), self.orchestrator.copy(),
+                chunk.text, document_info, cancel_token, part
+            )
+            return str(result)
+
+        # Worker thread'lere iptal token'ı contextvar'ı taşınır
+        with ThreadPoolExecutor(max_workers=max(1, DOC_CHUNK_CONCURRENCY), thread_name_prefix="doc-chunk") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, _map, chunk) for chunk in chunks]
+            outputs, failed = [], []
+            for chunk, future in zip(chunks, futures):
+                try:
+                    outputs.append(future.result())
+                except TaskCancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Parça {chunk.index + 1}/{len(chunks)} analiz edilemedi: {e}")
+                    failed.append({"chunk": chunk.index, "sections": chunk.sections, "error": str(e)})
+                    outputs.append("")
+
+        if len(failed) == len(chunks):
+            raise RuntimeError(f"All {len(chunks)} document chunks failed: {failed[0]['error']}")
+
+        chunk_scenarios = [self._extract_scenarios(output) if output else [] for output in outputs]
+        scenarios, duplicates = merge_scenarios(chunk_scenarios)
+        chunk_info = {
+            "total": len(chunks),
+            "failed": failed,
+            "scenarios_before_merge": sum(len(items) for items in chunk_scenarios),
+            "duplicates_removed": duplicates
+        }
+        return scenarios, chunk_info, "\n\n".join(outputs)
+
+    def _extract_scenarios(self, output: str) -> list:
+        """Crew çıktısından JSON senaryo dizisini çıkar"""
+        return extract_scenarios(str(output), "document_crew", strict=False)
+
     def analyze_text_requirements(self, requirement_text: str, template: str = "text", options: dict = {}) -> list:
         """
         Metin gereksinimlerini analiz et ve senaryoları çıkar (NLP Enhanced - Sembi IQ Tarzı)
@@ -215,21 +296,8 @@ class DocumentCrew:
 
     def _parse_crew_scenarios(self, crew_result: str, template: str) -> list:
         """CrewAI sonuçlarını parse et"""
-        import json
-        import re
-        
         try:
-            result_str = str(crew_result).strip()
-            
-            # JSON array bul
-            if not result_str.startswith('['):
-                json_match = re.search(r'\[[\s\S]*\]', result_str)
-                if json_match:
-                    result_str = json_match.group()
-                else:
-                    return []
-            
-            scenarios = json.loads(result_str)
+            scenarios = extract_scenarios(str(crew_result), "text_crew", strict=False)
             
             # BDD format ekle gerekirse
             if template == "bdd":
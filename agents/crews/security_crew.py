@@ -11,6 +11,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from crewai import Crew, Process
 from agents import orchestrator_agent, security_analyst_agent, developer_bot_agent
 from tasks.security_tasks import create_security_scan_task, create_vulnerability_report_task
+from utils.cancellation import CancellationToken
+from utils.progress import crew_step_callback, report_stage
 
 
 class SecurityCrew:
@@ -28,12 +30,13 @@ class SecurityCrew:
         self.security_analyst = security_analyst_agent
         self.developer = developer_bot_agent
 
-    def run_security_scan(self, target: dict) -> dict:
+    def run_security_scan(self, target: dict, cancel_token: CancellationToken = None) -> dict:
         """
         Güvenlik taraması başlat
 
         Args:
             target: Hedef bilgileri (url, endpoints, forms)
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Güvenlik tarama sonuçları
@@ -54,11 +57,17 @@ class SecurityCrew:
             agents=[self.security_analyst],
             tasks=[scan_task],
             verbose=True,
-            process=Process.sequential
+            process=Process.sequential,
+            step_callback=crew_step_callback(cancel_token)
         )
 
         # Çalıştır
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        report_stage(cancel_token, "security_scan")
         result = crew.kickoff()
+        if cancel_token:
+            cancel_token.record_crew_usage(result)
 
         print("\n" + "=" * 60)
         print("✅ Güvenlik Taraması Tamamlandı!")
@@ -70,13 +79,15 @@ class SecurityCrew:
             "crew_type": "security_scan"
         }
 
-    def run_vulnerability_assessment(self, target: dict, vulnerabilities: list) -> dict:
+    def run_vulnerability_assessment(self, target: dict, vulnerabilities: list,
+                                     cancel_token: CancellationToken = None) -> dict:
         """
         Bulunan açıklar için detaylı değerlendirme
 
         Args:
             target: Hedef bilgileri
             vulnerabilities: Bulunan açıklar listesi
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Detaylı güvenlik raporu
@@ -97,11 +108,17 @@ class SecurityCrew:
             agents=[self.security_analyst, self.developer],
             tasks=[report_task],
             verbose=True,
-            process=Process.sequential
+            process=Process.sequential,
+            step_callback=crew_step_callback(cancel_token)
         )
 
         # Çalıştır
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        report_stage(cancel_token, "vulnerability_assessment")
         result = crew.kickoff()
+        if cancel_token:
+            cancel_token.record_crew_usage(result)
 
         print("\n" + "=" * 60)
         print("✅ Güvenlik Değerlendirmesi Tamamlandı!")
@@ -114,12 +131,13 @@ class SecurityCrew:
             "vulnerability_count": len(vulnerabilities)
         }
 
-    def run_full_security_audit(self, target: dict) -> dict:
+    def run_full_security_audit(self, target: dict, cancel_token: CancellationToken = None) -> dict:
         """
         Tam güvenlik denetimi (Tarama + Değerlendirme)
 
         Args:
             target: Hedef bilgileri
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Tam güvenlik denetim sonuçları
@@ -132,7 +150,7 @@ class SecurityCrew:
 
         # 1. Güvenlik Taraması
         print("\n🔍 ADIM 1: Güvenlik Taraması...")
-        results["scan"] = self.run_security_scan(target)
+        results["scan"] = self.run_security_scan(target, cancel_token)
 
         # 2. Değerlendirme (örnek açıklar ile)
         # Gerçek kullanımda tarama sonucundan açıklar çıkarılır
@@ -149,8 +167,13 @@ class SecurityCrew:
             }
         ]
 
+        if cancel_token and cancel_token.cancelled:
+            # Değerlendirme crew'unu hiç çalıştırma
+            cancel_token.skip_kickoffs(1)
+            cancel_token.raise_if_cancelled()
+
         print("\n📊 ADIM 2: Açık Değerlendirmesi...")
-        results["assessment"] = self.run_vulnerability_assessment(target, sample_vulnerabilities)
+        results["assessment"] = self.run_vulnerability_assessment(target, sample_vulnerabilities, cancel_token)
 
         # Özet
         results["summary"] = {
@@ -12,6 +12,8 @@ from crewai import Crew, Process
 from agents import orchestrator_agent, test_architect_agent, developer_bot_agent
 from tasks.ui_test_tasks import create_test_planning_task, create_ui_test_task
 from tasks.api_test_tasks import create_api_test_task
+from utils.cancellation import CancellationToken
+from utils.progress import crew_step_callback, report_stage
 
 
 class TestCrew:
@@ -29,13 +31,14 @@ class TestCrew:
         self.test_architect = test_architect_agent
         self.developer = developer_bot_agent
 
-    def run_ui_test(self, project_info: dict, test_suite: dict) -> dict:
+    def run_ui_test(self, project_info: dict, test_suite: dict, cancel_token: CancellationToken = None) -> dict:
         """
         UI Test akışını başlat
 
         Args:
             project_info: Proje bilgileri (name, base_url, description)
             test_suite: Test suite bilgileri
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Test sonuçları
@@ -64,11 +67,17 @@ class TestCrew:
             agents=[self.orchestrator, self.test_architect, self.developer],
             tasks=[planning_task, ui_test_task],
             verbose=True,
-            process=Process.sequential  # Sıralı çalışma
+            process=Process.sequential,  # Sıralı çalışma
+            step_callback=crew_step_callback(cancel_token)
         )
 
         # Çalıştır
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        report_stage(cancel_token, "ui_test")
         result = crew.kickoff()
+        if cancel_token:
+            cancel_token.record_crew_usage(result)
 
         print("\n" + "=" * 60)
         print("✅ UI Test Tamamlandı!")
@@ -80,12 +89,13 @@ class TestCrew:
             "crew_type": "ui_test"
         }
 
-    def run_api_test(self, api_spec: dict) -> dict:
+    def run_api_test(self, api_spec: dict, cancel_token: CancellationToken = None) -> dict:
         """
         API Test akışını başlat
 
         Args:
             api_spec: API spesifikasyonu
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Test sonuçları
@@ -107,11 +117,17 @@ class TestCrew:
             agents=[self.test_architect],
             tasks=[api_test_task],
             verbose=True,
-            process=Process.sequential
+            process=Process.sequential,
+            step_callback=crew_step_callback(cancel_token)
         )
 
         # Çalıştır
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        report_stage(cancel_token, "api_test")
         result = crew.kickoff()
+        if cancel_token:
+            cancel_token.record_crew_usage(result)
 
         print("\n" + "=" * 60)
         print("✅ API Test Tamamlandı!")
@@ -123,7 +139,8 @@ class TestCrew:
             "crew_type": "api_test"
         }
 
-    def run_full_test(self, project_info: dict, test_suite: dict, api_spec: dict = None) -> dict:
+    def run_full_test(self, project_info: dict, test_suite: dict, api_spec: dict = None,
+                      cancel_token: CancellationToken = None) -> dict:
         """
         Tam test akışını başlat (UI + API)
 
@@ -131,6 +148,7 @@ class TestCrew:
             project_info: Proje bilgileri
             test_suite: Test suite bilgileri
             api_spec: API spesifikasyonu (opsiyonel)
+            cancel_token: İptal token'ı (opsiyonel)
 
         Returns:
             Tüm test sonuçları
@@ -143,12 +161,16 @@ class TestCrew:
 
         # UI Test
         print("\n📱 UI Testleri başlatılıyor...")
-        results["ui_test"] = self.run_ui_test(project_info, test_suite)
+        results["ui_test"] = self.run_ui_test(project_info, test_suite, cancel_token)
 
         # API Test (varsa)
         if api_spec:
+            if cancel_token and cancel_token.cancelled:
+                # Kalan API crew'u hiç çalıştırma
+                cancel_token.skip_kickoffs(1)
+                cancel_token.raise_if_cancelled()
             print("\n🔌 API Testleri başlatılıyor...")
-            results["api_test"] = self.run_api_test(api_spec)
+            results["api_test"] = self.run_api_test(api_spec, cancel_token)
 
         # Özet
         results["summary"] = {
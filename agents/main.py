@@ -16,7 +16,7 @@ if sys.platform == 'win32':
 
 # Windows sinyal düzeltmesi için config'i ilk yükle
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from config import API_HOST, API_PORT
+from config import API_HOST, API_PORT, API_WORKERS
 
 import argparse
 import uvicorn
@@ -24,18 +24,32 @@ import uvicorn
 
 def run_api_server():
     """FastAPI sunucusunu başlat"""
-    from api import app
-    
     print("=" * 60)
     print("🚀 Nexus QA - CrewAI API Server")
     print("=" * 60)
     print(f"📍 Host: {API_HOST}")
     print(f"🔌 Port: {API_PORT}")
+    print(f"👷 Workers: {API_WORKERS}")
     print(f"📚 Docs: http://localhost:{API_PORT}/docs")
     print("=" * 60)
     print("⏳ Sunucu başlatılıyor...")
     print()
-    
+
+    if API_WORKERS > 1:
+        # Worker süreçleri config'i yeniden yükler: paylaşılan durum (SQLite) açılır
+        os.environ["API_WORKERS"] = str(API_WORKERS)
+        os.environ.setdefault("SHARED_STATE", "true")
+        uvicorn.run(
+            "api:app",
+            host=API_HOST,
+            port=API_PORT,
+            workers=API_WORKERS,
+            log_level="info"
+        )
+        return
+
+    from api import app
+
     # Uvicorn config
     uvicorn.run(
         app, 
@@ -108,7 +122,7 @@ def run_security_demo():
 
 
 def main():
-    global API_HOST, API_PORT
+    global API_HOST, API_PORT, API_WORKERS
 
     parser = argparse.ArgumentParser(
         description="Nexus QA - AI-Powered Test Automation",
@@ -116,6 +130,7 @@ def main():
         epilog="""
 Örnekler:
   python main.py --server         # API sunucusunu başlat
+  python main.py --server --workers 4  # 4 worker süreci (paylaşılan task durumu)
   python main.py --test-demo      # Test demo'su çalıştır
   python main.py --security-demo  # Güvenlik demo'su çalıştır
         """
@@ -148,6 +163,12 @@ def main():
         default=API_PORT,
         help=f"API port (default: {API_PORT})"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=API_WORKERS,
+        help=f"Worker süreç sayısı; 1'den büyükse task durumu SQLite'ta paylaşılır (default: {API_WORKERS})"
+    )
 
     args = parser.parse_args()
 
@@ -155,6 +176,7 @@ def main():
         # Override host/port if provided
         API_HOST = args.host
         API_PORT = args.port
+        API_WORKERS = max(1, args.workers)
         run_api_server()
     elif args.test_demo:
         run_test_demo()
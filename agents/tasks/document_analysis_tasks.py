@@ -11,11 +11,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from crewai import Task
 
 
-def create_document_analysis_task(agent, document_content: str, document_info: dict) -> Task:
+def create_document_analysis_task(agent, document_content: str, document_info: dict, part: str = None) -> Task:
     """
     Belgeden test senaryoları çıkar - ULTRA MINIMAL VERSIYA
+
+    Büyük belgeler kesilmez; DocumentCrew belgeyi parçalara böler ve her parça
+    için ayrı görev oluşturur (`part`: örn. "2/5 (sections: 3. Ödeme)").
     """
-    desc = "Analyze this document and extract test scenarios as JSON array:\n\n" + document_content[:5000] + "\n\nReturn ONLY valid JSON array of test scenarios."
+    scope = ""
+    if part:
+        scope = f"This is part {part} of a larger document. Extract scenarios ONLY for the requirements in this part.\n\n"
+    desc = scope + "Analyze this document and extract test scenarios as JSON array:\n\n" + document_content + "\n\nReturn ONLY valid JSON array of test scenarios."
 
     return Task(
         description=desc,
@@ -0,0 +1,570 @@
+"""
+Backend Notifier - Toplu Webhook Teslimatı
+==========================================
+notify_backend event'lerini task akışını bekletmeden backend'e iletir
+
+- Uzun ömürlü, connection pool'lu tek httpx.AsyncClient
+- Async teslimat kuyruğu: log'lar boyut / zaman penceresine göre
+  `/api/tests/logs/batch` isteklerinde birleştirilir
+- Her log bir `idempotencyKey` taşır: yanıtı kaybolan batch tekrar
+  gönderildiğinde backend aynı log'u ikinci kez yazmaz; tekli gönderimde
+  başarılı log'lar hemen teslim edilmiş sayılır, sadece kalanlar tekrar gider
+- Hata durumunda jitter'lı üstel backoff ile tekrar deneme
+- Teslim edilemeyen veya kuyruğa sığmayan event'ler sınırlı disk
+  outbox'ına (SQLite) yazılır, backend düzelince sırayla gönderilir
+- Agent maliyetleri bellekte agent bazında toplanır, periyodik olarak tek
+  `/api/agents/costs` isteğiyle gönderilir; agent type -> id eşlemesi TTL'li
+  cache'ten okunur
+"""
+
+import sys
+import os
+import asyncio
+import json
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    BACKEND_URL,
+    NOTIFY_BATCH_SIZE,
+    NOTIFY_BATCH_WINDOW_MS,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_MAX_RETRIES,
+    NOTIFY_RETRY_BASE_SECONDS,
+    NOTIFY_RETRY_MAX_SECONDS,
+    NOTIFY_TIMEOUT_SECONDS,
+    NOTIFY_MAX_CONNECTIONS,
+    NOTIFY_OUTBOX_PATH,
+    NOTIFY_OUTBOX_MAX_ENTRIES,
+    NOTIFY_OUTBOX_RETRY_SECONDS,
+    NOTIFY_COST_FLUSH_SECONDS,
+    NOTIFY_AGENT_CACHE_TTL_SECONDS
+)
+
+LOG_KIND = "log"
+AGENT_COST_KIND = "agent_cost"
+
+
+class DeliveryError(Exception):
+    """Backend isteği başarısız (bağlantı hatası veya 5xx / 429)"""
+
+
+class Outbox:
+    """
+    Teslim edilemeyen event'ler için sınırlı, kalıcı kuyruk (SQLite)
+
+    `max_entries` aşılınca en eski kayıtlar silinir. Aynı dosyayı birden çok
+    worker süreci paylaşabilir: kayıtlar gönderilmeden önce süreli olarak
+    sahiplenilir (claim), böylece iki süreç aynı event'i göndermez.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            # Birden çok worker aynı anda açabilir: şema yazma kilidi altında kurulur
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)").fetchall()}
+            if "claimed_at" not in columns:
+                # Eski şemadan geçiş
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_by TEXT")
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+            self._conn.execute("COMMIT")
+
+    def put(self, items: List[Dict[str, Any]]):
+        if not items:
+            return
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO outbox (kind, payload, created_at) VALUES (?, ?, ?)",
+                [(item["kind"], json.dumps(item["payload"], ensure_ascii=False, default=str), now) for item in items]
+            )
+            overflow = self._count() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)", (overflow,)
+                )
+                self.dropped += overflow
+            self._conn.execute("COMMIT")
+
+    def claim(self, limit: int, owner: str, lease_seconds: float = 60.0) -> List[Dict[str, Any]]:
+        """
+        En eski sahipsiz (veya lease'i dolmuş) kayıtları sahiplen
+
+        Kayıtlar silinmez; teslimden sonra `ack`, başarısızlıkta `release` çağrılır.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE outbox SET claimed_by = ?, claimed_at = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?"
+                ") RETURNING id, kind, payload",
+                (owner, now, now - lease_seconds, limit)
+            ).fetchall()
+        rows.sort(key=lambda row: row[0])
+        return [{"id": row[0], "kind": row[1], "payload": json.loads(row[2])} for row in rows]
+
+    def release(self, ids: List[int]):
+        """Gönderilemeyen kayıtların sahipliğini bırak"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE outbox SET claimed_by = NULL, claimed_at = NULL WHERE id IN ({','.join('?' * len(ids))})", ids
+            )
+
+    def ack(self, ids: List[int]):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(ids))})", ids
+            )
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BackendNotifier:
+    """
+    Backend webhook teslimat kuyruğu
+
+    notify() hiçbir zaman ağ beklemez: event bellekteki kuyruğa, kuyruk
+    doluysa outbox'a yazılır. Tek bir worker coroutine teslimatı yapar.
+    """
+
+    def __init__(self, base_url: str, outbox: Outbox, batch_size: int = 50, batch_window_ms: int = 250,
+                 queue_size: int = 1000, max_retries: int = 4, retry_base: float = 0.5, retry_max: float = 30.0,
+                 timeout: float = 10.0, max_connections: int = 10, outbox_retry_seconds: float = 30.0,
+                 cost_flush_seconds: float = 10.0, agent_cache_ttl: float = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.outbox = outbox
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.outbox_retry_seconds = outbox_retry_seconds
+        self.cost_flush_seconds = cost_flush_seconds
+        self.agent_cache_ttl = agent_cache_ttl
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._cost_flusher: Optional[asyncio.Task] = None
+        # agent_type -> toplanmış maliyet (henüz gönderilmedi)
+        self._pending_costs: Dict[str, float] = {}
+        # agent_type -> {"id", "name"}; tüm liste tek GET ile yenilenir
+        self._agent_cache: Dict[str, Dict[str, Any]] = {}
+        self._agent_cache_expires = 0.0
+        self._costs_batch_supported = True
+        # Bayat id nedeniyle bir kez tekrar denenen agent tipleri
+        self._stale_agent_types = set()
+        # Eski backend'lerde batch endpoint'i yoksa tekil log endpoint'ine düş
+        self._batch_supported = True
+        self._last_outbox_attempt = 0.0
+        self.counters = {
+            "enqueued": 0,
+            "delivered": 0,
+            "batches": 0,
+            "retries": 0,
+            "spilled": 0,
+            "replayed": 0
+        }
+        self.cost_counters = {
+            "cost_events": 0,
+            "cost_flushes": 0,
+            "cost_requests": 0,
+            "agent_lookups": 0,
+            "agent_cache_hits": 0,
+            "agent_cache_invalidations": 0
+        }
+
+    # --- Yaşam döngüsü --------------------------------------------------
+
+    def start(self):
+        """Pool'lu client'ı ve teslimat worker'ını başlat (app startup)"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        )
+        self._worker = asyncio.create_task(self._run())
+        if self.cost_flush_seconds > 0:
+            self._cost_flusher = asyncio.create_task(self._flush_costs_periodically())
+
+    async def stop(self, timeout: float = 5.0):
+        """Kuyruktakileri kısa süre içinde göndermeyi dene, kalanları outbox'a yaz"""
+        if self._worker is None:
+            return
+        if self._cost_flusher:
+            self._cost_flusher.cancel()
+            self._cost_flusher = None
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        if not await self.flush_costs():
+            # Gönderilemeyen toplam maliyetler outbox'ta kalır, sonraki açılışta gönderilir
+            self._spill([
+                {"kind": AGENT_COST_KIND, "payload": {"agent_type": agent_type, "cost": cost}}
+                for agent_type, cost in self._pending_costs.items()
+            ])
+            self._pending_costs.clear()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        leftover = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        self._spill(leftover)
+
+        await self._client.aclose()
+        self.outbox.close()
+
+    # --- Üretici taraf ----------------------------------------------------
+
+    def notify(self, kind: str, payload: Dict[str, Any]):
+        """Event'i teslimat kuyruğuna ekle (bloklamaz)"""
+        if kind == LOG_KIND:
+            # Anahtar outbox'a da yazılır: tekrar denemelerde aynı kalır
+            payload = {**payload, "idempotencyKey": payload.get("idempotencyKey") or uuid.uuid4().hex}
+        item = {"kind": kind, "payload": payload}
+        self.counters["enqueued"] += 1
+        if self._queue is None:
+            # Worker başlamadı (örn. CLI demo): doğrudan outbox'a
+            self._spill([item])
+            return
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self._spill([item])
+
+    def add_cost(self, agent_type: str, cost: float):
+        """Agent maliyetini biriktir; periyodik flush'ta toplu gönderilir"""
+        self._pending_costs[agent_type] = self._pending_costs.get(agent_type, 0.0) + float(cost)
+        self.cost_counters["cost_events"] += 1
+
+    def _spill(self, items: List[Dict[str, Any]]):
+        if not items:
+            return
+        try:
+            self.outbox.put(items)
+            self.counters["spilled"] += len(items)
+        except Exception as e:
+            print(f"Notifier outbox error: {e}")
+
+    # --- Worker ---------------------------------------------------------------
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """İlk event'i bekle, sonra pencere süresince / batch dolana kadar topla"""
+        timeout = self.outbox_retry_seconds if self.outbox.count() else None
+        try:
+            first = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            pending = list(batch)
+            try:
+                delivered = await self._deliver_with_retry(pending) if batch else None
+                if delivered is False:
+                    self._spill(pending)
+                elif delivered or time.monotonic() - self._last_outbox_attempt >= self.outbox_retry_seconds:
+                    # Backend erişilebilir (veya deneme zamanı geldi): outbox'ı boşalt
+                    await self._drain_outbox()
+            except asyncio.CancelledError:
+                # Shutdown: teslim edilmemiş event'ler kaybolmasın
+                self._spill(pending)
+                raise
+            except Exception as e:
+                print(f"Notifier worker error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _deliver_with_retry(self, pending: List[Dict[str, Any]]) -> bool:
+        """Teslim edilenler `pending` listesinden çıkarılır; başarısızlıkta kalanlar listede kalır"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._deliver(pending)
+                return True
+            except DeliveryError as e:
+                if attempt == self.max_retries:
+                    print(f"Backend notification error: {e} ({len(pending)} event outbox'a yazıldı)")
+                    return False
+                self.counters["retries"] += 1
+                # Full jitter: [0, min(max, base * 2^attempt)]
+                await asyncio.sleep(random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt)))
+        return False
+
+    async def _drain_outbox(self):
+        """Outbox'taki eski event'leri sırayla gönder; yeni event gelince bırak"""
+        self._last_outbox_attempt = time.monotonic()
+        while not self._queue.qsize():
+            rows = self.outbox.claim(self.batch_size, self.worker_id)
+            if not rows:
+                return
+            pending = list(rows)
+            try:
+                await self._deliver(pending)
+            except DeliveryError:
+                # Backend hâlâ erişilemez; sonraki denemeye bırak
+                return
+            finally:
+                sent = [row["id"] for row in rows if row not in pending]
+                self.outbox.ack(sent)
+                self.outbox.release([row["id"] for row in pending])
+                self.counters["replayed"] += len(sent)
+
+    async def _deliver(self, pending: List[Dict[str, Any]]):
+        """Log'ları tek batch isteğinde, maliyet güncellemelerini sırayla gönder"""
+        logs = [item for item in pending if item["kind"] == LOG_KIND]
+        if logs:
+            await self._send_logs(pending, logs)
+
+        for item in [item for item in pending if item["kind"] == AGENT_COST_KIND]:
+            # Outbox'tan gelen maliyetler toplayıcıya eklenir, sonraki flush'ta gider
+            self.add_cost(item["payload"]["agent_type"], item["payload"]["cost"])
+            self._mark_delivered(pending, [item])
+
+        # Bilinmeyen türler (eski outbox kayıtları) atlanır
+        pending.clear()
+
+    def _mark_delivered(self, pending: List[Dict[str, Any]], items: List[Dict[str, Any]]):
+        delivered = set(map(id, items))
+        pending[:] = [item for item in pending if id(item) not in delivered]
+        self.counters["delivered"] += len(items)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        try:
+            response = await self._client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"{method} {url}: {type(e).__name__}: {e}")
+        if response.status_code >= 500 or response.status_code == 429:
+            raise DeliveryError(f"{method} {url}: HTTP {response.status_code}")
+        return response
+
+    async def _send_logs(self, pending: List[Dict[str, Any]], logs: List[Dict[str, Any]]):
+        """Log'ları gönder; teslim edilenler `pending`'den çıkarılır"""
+        for item in logs:
+            # Anahtarsız eski outbox kayıtları
+            item["payload"].setdefault("idempotencyKey", uuid.uuid4().hex)
+
+        if self._batch_supported:
+            response = await self._request(
+                "POST", "/api/tests/logs/batch", json={"logs": [item["payload"] for item in logs]}
+            )
+            if response.status_code != 404:
+                self.counters["batches"] += 1
+                self._mark_delivered(pending, logs)
+                return
+            self._batch_supported = False
+
+        for item in logs:
+            await self._request("POST", "/api/tests/logs", json=item["payload"])
+            # Hata olursa sadece henüz gönderilmemiş log'lar tekrar denenir
+            self._mark_delivered(pending, [item])
+
+    # --- Agent maliyetleri -------------------------------------------------
+
+    async def _flush_costs_periodically(self):
+        while True:
+            await asyncio.sleep(self.cost_flush_seconds)
+            await self.flush_costs()
+
+    async def flush_costs(self) -> bool:
+        """Biriken maliyetleri tek istekte gönder; başarısızsa bir sonraki flush'a bırak"""
+        if not self._pending_costs:
+            return True
+        costs, self._pending_costs = self._pending_costs, {}
+        try:
+            remaining = await self._send_costs(costs)
+        except DeliveryError as e:
+            print(f"Agent cost update error: {e}")
+            remaining = costs
+        self.cost_counters["cost_flushes"] += 1
+
+        for agent_type, cost in remaining.items():
+            self._pending_costs[agent_type] = self._pending_costs.get(agent_type, 0.0) + cost
+        return not remaining
+
+    def invalidate_agents(self):
+        """agent_type -> id cache'ini boşalt (agent silindi / yeniden oluşturuldu)"""
+        self._agent_cache.clear()
+        self._agent_cache_expires = 0.0
+        self.cost_counters["agent_cache_invalidations"] += 1
+
+    async def _resolve_agents(self, agent_types) -> Dict[str, Dict[str, Any]]:
+        """Cache süresi dolmuşsa veya tip bilinmiyorsa agent listesini tek GET ile yenile"""
+        now = time.monotonic()
+        if now >= self._agent_cache_expires or any(t not in self._agent_cache for t in agent_types):
+            response = await self._request("GET", "/api/agents")
+            self.cost_counters["agent_lookups"] += 1
+            if response.status_code == 200:
+                body = response.json()
+                agents = body.get("data", body.get("agents", []))
+                self._agent_cache = {
+                    agent["type"]: {"id": agent["id"], "name": agent.get("name")}
+                    for agent in agents if agent.get("type")
+                }
+                self._agent_cache_expires = now + self.agent_cache_ttl
+        else:
+            self.cost_counters["agent_cache_hits"] += len(agent_types)
+        return {t: self._agent_cache[t] for t in agent_types if t in self._agent_cache}
+
+    async def _send_costs(self, costs: Dict[str, float]) -> Dict[str, float]:
+        """
+        Maliyetleri backend'e yaz
+
+        Returns:
+            Tekrar denenecek maliyetler (id'si bayatlamış agent'lar)
+        """
+        agents = await self._resolve_agents(list(costs))
+        for agent_type in set(costs) - set(agents):
+            print(f"Agent cost update skipped: unknown agent type {agent_type}")
+
+        by_id = {agents[t]["id"]: t for t in costs if t in agents}
+        if not by_id:
+            return {}
+
+        missing = []
+        if self._costs_batch_supported:
+            response = await self._request("POST", "/api/agents/costs", json={
+                "costs": [{"agentId": agent_id, "cost": round(costs[t], 8)} for agent_id, t in by_id.items()]
+            })
+            self.cost_counters["cost_requests"] += 1
+            if response.status_code == 404:
+                self._costs_batch_supported = False
+            else:
+                missing = response.json().get("missing", [])
+
+        if not self._costs_batch_supported:
+            for agent_id, agent_type in by_id.items():
+                response = await self._request("PUT", f"/api/agents/{agent_id}/status", json={"cost": costs[agent_type]})
+                self.cost_counters["cost_requests"] += 1
+                if response.status_code == 404:
+                    missing.append(agent_id)
+
+        for agent_id, agent_type in by_id.items():
+            if agent_id not in missing:
+                self._stale_agent_types.discard(agent_type)
+                print(f"💰 Agent {agents[agent_type]['name']} cost updated: +${costs[agent_type]:.6f}")
+
+        retry = {}
+        for agent_type in (by_id[agent_id] for agent_id in missing if agent_id in by_id):
+            if agent_type in self._stale_agent_types:
+                # Liste yenilendikten sonra da bulunamadı: agent gerçekten yok
+                self._stale_agent_types.discard(agent_type)
+                print(f"Agent cost update dropped: agent {agent_type} not found")
+            else:
+                self._stale_agent_types.add(agent_type)
+                retry[agent_type] = costs[agent_type]
+
+        if missing:
+            # Cache'teki id bayat: bir sonraki flush'ta liste yeniden okunur
+            self.invalidate_agents()
+        return retry
+
+    def cost_stats(self) -> Dict[str, Any]:
+        counters = self.cost_counters
+        # Eski akış: her maliyetli event için GET /api/agents + PUT
+        legacy_calls = counters["cost_events"] * 2
+        actual_calls = counters["agent_lookups"] + counters["cost_requests"]
+        return {
+            **counters,
+            "pending_agents": len(self._pending_costs),
+            "pending_cost": round(sum(self._pending_costs.values()), 8),
+            "cached_agents": len(self._agent_cache),
+            "backend_calls_saved": max(0, legacy_calls - actual_calls)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "outbox": self.outbox.count(),
+            "outbox_dropped": self.outbox.dropped,
+            "batch_endpoint": self._batch_supported,
+            "costs": self.cost_stats()
+        }
+
+
+# Singleton instance
+backend_notifier = BackendNotifier(
+    BACKEND_URL,
+    Outbox(NOTIFY_OUTBOX_PATH, NOTIFY_OUTBOX_MAX_ENTRIES),
+    batch_size=NOTIFY_BATCH_SIZE,
+    batch_window_ms=NOTIFY_BATCH_WINDOW_MS,
+    queue_size=NOTIFY_QUEUE_SIZE,
+    max_retries=NOTIFY_MAX_RETRIES,
+    retry_base=NOTIFY_RETRY_BASE_SECONDS,
+    retry_max=NOTIFY_RETRY_MAX_SECONDS,
+    timeout=NOTIFY_TIMEOUT_SECONDS,
+    max_connections=NOTIFY_MAX_CONNECTIONS,
+    outbox_retry_seconds=NOTIFY_OUTBOX_RETRY_SECONDS,
+    cost_flush_seconds=NOTIFY_COST_FLUSH_SECONDS,
+    agent_cache_ttl=NOTIFY_AGENT_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,125 @@
+"""
+Batch Metrics - Toplu Analiz Ölçümleri
+======================================
+`/crew/*/batch` endpoint'lerinin throughput ve kuyruk sonu (tail) gecikme
+ölçümleri
+
+- BatchRun: tek bir batch'in öğe sayaçları ve öğe gecikmeleri
+- BatchMetrics: süreç genelinde son batch'ler ve son öğe gecikmeleri
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Sequence
+
+# Öğe sonuç durumları
+ITEM_FINISHED = ("completed", "error", "cancelled")
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank yüzdelik (boş listede 0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies_ms: Sequence[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(latencies_ms, 50), 1),
+        "p95_ms": round(percentile(latencies_ms, 95), 1),
+        "p99_ms": round(percentile(latencies_ms, 99), 1),
+        "max_ms": round(max(latencies_ms), 1) if latencies_ms else 0.0
+    }
+
+
+class BatchRun:
+    """Çalışan tek bir batch'in sayaçları"""
+
+    def __init__(self, batch_id: str, total: int, concurrency: int):
+        self.batch_id = batch_id
+        self.total = total
+        self.concurrency = concurrency
+        self.started = time.monotonic()
+        self.finished_at: float = None
+        self.counts = {"completed": 0, "error": 0, "cancelled": 0}
+        self.deduplicated = 0
+        self.latencies_ms: List[float] = []
+
+    def record(self, status: str, latency_ms: float = None):
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if latency_ms is not None:
+            self.latencies_ms.append(latency_ms)
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.monotonic()) - self.started
+        return {
+            "total": self.total,
+            "done": self.done,
+            **self.counts,
+            "deduplicated": self.deduplicated,
+            "concurrency": self.concurrency,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_items_per_min": round(self.done / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "latency": latency_summary(self.latencies_ms)
+        }
+
+
+class BatchMetrics:
+    """Süreç genelinde batch istatistikleri"""
+
+    def __init__(self, window: int = 2000, recent_batches: int = 50):
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=recent_batches)
+        self._active: Dict[str, BatchRun] = {}
+        self.batches = 0
+        self.items = 0
+
+    def start(self, batch_id: str, total: int, concurrency: int) -> BatchRun:
+        run = BatchRun(batch_id, total, concurrency)
+        with self._lock:
+            self._active[batch_id] = run
+            self.batches += 1
+        return run
+
+    def record(self, run: BatchRun, status: str, latency_ms: float = None):
+        run.record(status, latency_ms)
+        with self._lock:
+            self.items += 1
+            if latency_ms is not None:
+                self._latencies.append(latency_ms)
+
+    def finish(self, run: BatchRun) -> Dict[str, Any]:
+        run.finished_at = time.monotonic()
+        summary = run.summary()
+        with self._lock:
+            self._active.pop(run.batch_id, None)
+            self._recent.append({"batch_id": run.batch_id, **summary})
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            recent = list(self._recent)
+            active = [{"batch_id": run.batch_id, **run.summary()} for run in self._active.values()]
+        throughputs = [batch["throughput_items_per_min"] for batch in recent]
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "active": active,
+            "avg_throughput_items_per_min": round(sum(throughputs) / len(throughputs), 2) if throughputs else 0.0,
+            "item_latency": latency_summary(latencies),
+            "recent": recent[-10:]
+        }
+
+
+# Singleton instance
+batch_metrics = BatchMetrics()
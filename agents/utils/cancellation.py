@@ -0,0 +1,348 @@
+"""
+Cancellation - İşbirlikçi Task İptali
+=====================================
+Task'lar için iptal token'ları, token kayıt defteri ve crew/LLM
+çağrılarına iptal kontrolü ekleyen yardımcılar
+
+Akış:
+- Endpoint task'ı `run_cancellable` ile başlatır (token + asyncio task kaydı)
+- execute_* fonksiyonları ve crew'lar token'ı parametre olarak alır
+- `/tasks/{id}/cancel` token'ı iptal eder ve asyncio task'ını sonlandırır
+- Worker thread'ler bir sonraki adım/LLM çağrısı sınırında durur
+- Token ayrıca task başına token / maliyet bütçesini uygular: bütçeyi aşacak
+  çağrı gönderilmeden BudgetExceeded fırlatılır
+"""
+
+import asyncio
+import contextvars
+import itertools
+import sys
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TASK_TOKEN_BUDGET, TASK_COST_BUDGET_USD
+
+# Tahmini değerler: iptal sayesinde hiç çalıştırılmayan crew kickoff'ları için
+DEFAULT_CREW_TOKEN_ESTIMATE = 4000
+
+# Worker thread'lere taşınan aktif token (executor contextvars bağlamını kopyalar)
+current_cancel_token: contextvars.ContextVar = contextvars.ContextVar("current_cancel_token", default=None)
+# Crew LLM çağrısını yapan agent'ın rolü (LLM hook'u ayarlar, kullanım defterine yazılır)
+current_agent: contextvars.ContextVar = contextvars.ContextVar("current_agent", default=None)
+
+_crew_hook_installed = False
+
+
+class TaskCancelled(Exception):
+    """Task iptal edildiğinde worker tarafında fırlatılır"""
+
+    def __init__(self, task_id: str = None):
+        super().__init__(f"Task {task_id} cancelled" if task_id else "Task cancelled")
+        self.task_id = task_id
+
+
+class BudgetExceeded(Exception):
+    """Çağrı task'ın token / maliyet bütçesini aşacağı için gönderilmedi"""
+
+    def __init__(self, task_id: str, kind: str, needed: float, limit: float):
+        super().__init__(f"Task {task_id} {kind} budget exceeded: {needed:g} > {limit:g}")
+        self.task_id = task_id
+        self.kind = kind
+
+
+class CancellationToken:
+    """
+    Thread-safe iptal token'ı ve token muhasebesi
+
+    - used_tokens: iptalden önce harcanan token'lar
+    - late_tokens: iptalden sonra tamamlanan (uçuştaki) çağrıların token'ları
+    - saved_tokens: iptal sayesinde hiç gönderilmeyen çağrıların tahmini
+    - max_tokens / max_cost: task bütçesi (0 = sınırsız); harcanan + uçuştaki
+      çağrıların üst sınırı + yeni çağrının üst sınırı bütçeyi aşamaz
+    """
+
+    def __init__(self, task_id: str, on_update: Callable[["CancellationToken"], None] = None,
+                 max_tokens: int = TASK_TOKEN_BUDGET, max_cost: float = TASK_COST_BUDGET_USD):
+        self.task_id = task_id
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.spent_cost = 0.0
+        self.rejected_calls = 0
+        self.reason: Optional[str] = None
+        self.requested_at: Optional[str] = None
+        self.used_tokens = 0
+        self.late_tokens = 0
+        self.saved_tokens = 0
+        self.wasted_cost = 0.0
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._calls: Dict[int, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+        self._kickoffs = 0
+        self._kickoff_tokens = 0
+        self._on_update = on_update
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "user") -> bool:
+        """Token'ı iptal et; kuyruktaki çağrıların tahmini tasarruf sayılır"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.requested_at = datetime.now().isoformat()
+            self._event.set()
+            for call in self._calls.values():
+                if call["state"] == "reserved":
+                    call["state"] = "skipped"
+                    self.saved_tokens += call["estimate"]
+        self._notify()
+        return True
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled(self.task_id)
+
+    def step_callback(self, step_output: Any = None):
+        """Crew(step_callback=...) için: her ajan adımından sonra iptal kontrolü"""
+        self.raise_if_cancelled()
+
+    # --- Doğrudan LLM çağrıları -------------------------------------------
+
+    def reserve(self, estimated_tokens: int, estimated_cost: float = 0.0) -> int:
+        """
+        Gönderilecek bir çağrıyı kaydet (event loop tarafında)
+
+        `estimated_*` çağrının üst sınırıdır (prompt + max_tokens); bütçeyi
+        aşacaksa BudgetExceeded fırlatılır.
+        """
+        with self._lock:
+            pending = [c for c in self._calls.values() if c["state"] != "skipped"]
+            if self.max_tokens:
+                needed = self.used_tokens + self.late_tokens + sum(c["estimate"] for c in pending) + int(estimated_tokens)
+                if needed > self.max_tokens:
+                    self.rejected_calls += 1
+                    raise BudgetExceeded(self.task_id, "token", needed, self.max_tokens)
+            if self.max_cost:
+                needed = self.spent_cost + sum(c["cost"] for c in pending) + estimated_cost
+                if needed > self.max_cost:
+                    self.rejected_calls += 1
+                    raise BudgetExceeded(self.task_id, "cost", round(needed, 6), self.max_cost)
+            call_id = next(self._ids)
+            self._calls[call_id] = {"state": "reserved", "estimate": int(estimated_tokens), "cost": estimated_cost}
+            if self._event.is_set():
+                self._calls[call_id]["state"] = "skipped"
+                self.saved_tokens += int(estimated_tokens)
+            return call_id
+
+    def start(self, call_id: int):
+        """Worker thread çağrıyı göndermeden hemen önce; iptal edildiyse fırlatır"""
+        with self._lock:
+            call = self._calls.get(call_id)
+            if call is None or call["state"] == "skipped":
+                raise TaskCancelled(self.task_id)
+            call["state"] = "in_flight"
+
+    def finish(self, call_id: int, tokens: int, cost: float = 0.0):
+        """Çağrı tamamlandı; iptalden sonra geldiyse boşa harcanmış sayılır"""
+        late = False
+        with self._lock:
+            self._calls.pop(call_id, None)
+            self.spent_cost += cost
+            if self._event.is_set():
+                self.late_tokens += tokens
+                self.wasted_cost += cost
+                late = True
+            else:
+                self.used_tokens += tokens
+        if late:
+            self._notify()
+
+    # --- Crew kickoff'ları ----------------------------------------------
+
+    def record_crew_usage(self, crew_output: Any):
+        """CrewOutput.token_usage içinden harcanan token'ları kaydet"""
+        usage = getattr(crew_output, "token_usage", None)
+        tokens = int(getattr(usage, "total_tokens", 0) or 0)
+        with self._lock:
+            self._kickoffs += 1
+            self._kickoff_tokens += tokens
+            if self._event.is_set():
+                self.late_tokens += tokens
+            else:
+                self.used_tokens += tokens
+
+    @property
+    def over_budget(self) -> bool:
+        """Bütçe tükendi mi (crew çağrıları için: sonraki LLM çağrısı engellenir)"""
+        with self._lock:
+            spent = self.used_tokens + self.late_tokens
+            return bool((self.max_tokens and spent >= self.max_tokens) or
+                        (self.max_cost and self.spent_cost >= self.max_cost))
+
+    def remaining_cost(self) -> Optional[float]:
+        """Maliyet bütçesinden kalan (uçuştaki çağrıların üst sınırı düşülür; sınırsızsa None)"""
+        if not self.max_cost:
+            return None
+        with self._lock:
+            pending = sum(c["cost"] for c in self._calls.values() if c["state"] != "skipped")
+            return max(0.0, self.max_cost - self.spent_cost - pending)
+
+    def budget_report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens or None,
+                "max_cost": self.max_cost or None,
+                "spent_tokens": self.used_tokens + self.late_tokens,
+                "spent_cost": round(self.spent_cost, 6),
+                "rejected_calls": self.rejected_calls
+            }
+
+    def skip_kickoffs(self, count: int):
+        """İptal nedeniyle çalıştırılmayan kickoff'ların tahmini tasarrufu"""
+        if count <= 0:
+            return
+        with self._lock:
+            average = self._kickoff_tokens // self._kickoffs if self._kickoffs else DEFAULT_CREW_TOKEN_ESTIMATE
+            self.saved_tokens += average * count
+        self._notify()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "reason": self.reason,
+                "requested_at": self.requested_at,
+                "tokens_before_cancel": self.used_tokens,
+                "tokens_after_cancel": self.late_tokens,
+                "wasted_tokens": self.used_tokens + self.late_tokens,
+                "wasted_cost": round(self.wasted_cost, 6),
+                "saved_tokens_estimate": self.saved_tokens,
+                "in_flight_calls": sum(1 for c in self._calls.values() if c["state"] == "in_flight")
+            }
+
+    def _notify(self):
+        if self._on_update and self._event.is_set():
+            try:
+                self._on_update(self)
+            except Exception as e:
+                print(f"Cancellation update error: {e}")
+
+
+class CancellationRegistry:
+    """task_id -> (token, asyncio task) eşlemesi"""
+
+    def __init__(self):
+        self._tokens: Dict[str, CancellationToken] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.cancelled_total = 0
+
+    def register(self, task_id: str, on_update: Callable = None) -> CancellationToken:
+        with self._lock:
+            token = self._tokens.get(task_id)
+            if token is None:
+                token = CancellationToken(task_id, on_update)
+                self._tokens[task_id] = token
+            return token
+
+    def get(self, task_id: str) -> Optional[CancellationToken]:
+        with self._lock:
+            return self._tokens.get(task_id)
+
+    def attach(self, task_id: str, task: asyncio.Task):
+        with self._lock:
+            self._tasks[task_id] = task
+
+    def cancel(self, task_id: str, reason: str = "user") -> Optional[CancellationToken]:
+        """Token'ı iptal et ve bekleyen await'i kes; bilinmeyen task için None"""
+        with self._lock:
+            token = self._tokens.get(task_id)
+            task = self._tasks.get(task_id)
+        if token is None:
+            return None
+
+        if token.cancel(reason):
+            self.cancelled_total += 1
+        if task is not None and not task.done():
+            # Worker havuzunda henüz başlamamış iş varsa kuyruktan düşer
+            task.cancel()
+        return token
+
+    def release(self, task_id: str):
+        with self._lock:
+            self._tokens.pop(task_id, None)
+            self._tasks.pop(task_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": len(self._tokens),
+                "cancelled_total": self.cancelled_total
+            }
+
+
+async def run_cancellable(task_id: str, fn: Callable, *args, on_update: Callable = None, **kwargs):
+    """
+    execute_* coroutine'ini iptal edilebilir şekilde çalıştır
+
+    fn'e `cancel_token` keyword argümanı geçilir ve token worker thread'lere
+    contextvar ile taşınır. İptal edilen iç task sessizce sonlanır.
+    """
+    token = cancellation_registry.register(task_id, on_update)
+
+    async def _run():
+        current_cancel_token.set(token)
+        return await fn(task_id, *args, cancel_token=token, **kwargs)
+
+    inner = asyncio.create_task(_run())
+    cancellation_registry.attach(task_id, inner)
+    try:
+        await asyncio.wait({inner})
+        if not inner.cancelled() and inner.exception() is not None:
+            exc = inner.exception()
+            if not isinstance(exc, TaskCancelled):
+                print(f"Task {task_id} error: {exc}")
+    except asyncio.CancelledError:
+        inner.cancel()
+        raise
+    finally:
+        cancellation_registry.release(task_id)
+
+
+def install_crew_llm_hook() -> bool:
+    """
+    CrewAI LLM çağrılarından önce iptal / bütçe kontrolü yapan global hook'u kaydet
+
+    Hook çağrıyı yapan agent'ın rolünü de `current_agent`'a yazar.
+
+    crewai.hooks olmayan sürümlerde sadece step_callback kontrolü kullanılır.
+    """
+    global _crew_hook_installed
+    if _crew_hook_installed:
+        return True
+
+    try:
+        from crewai.hooks import register_before_llm_call_hook
+    except ImportError:
+        return False
+
+    def _block_cancelled_llm_call(context) -> Optional[bool]:
+        current_agent.set(getattr(getattr(context, "agent", None), "role", None))
+        token = current_cancel_token.get()
+        if token is not None and (token.cancelled or token.over_budget):
+            # False -> çağrı engellenir, token harcanmaz
+            return False
+        return None
+
+    register_before_llm_call_hook(_block_cancelled_llm_call)
+    _crew_hook_installed = True
+    return True
+
+
+# Singleton instance
+cancellation_registry = CancellationRegistry()
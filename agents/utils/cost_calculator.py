@@ -4,16 +4,24 @@ Cost Calculator - LLM Kullanım Maliyeti Hesaplayıcı
 OpenAI ve Gemini API kullanımlarının maliyetini hesaplar
 """
 
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.token_counter import token_counter, match_model
+
 # Model fiyatları (USD per 1M tokens)
 # Kaynak: https://openai.com/api/pricing/
 MODEL_PRICING = {
     # OpenAI GPT-4 Models
     "gpt-4o": {
         "input": 2.50,   # $2.50 per 1M input tokens
+        "cached_input": 1.25,  # prompt cache'ten okunan girdi token'ları
         "output": 10.00  # $10.00 per 1M output tokens
     },
     "gpt-4o-mini": {
         "input": 0.150,   # $0.15 per 1M input tokens
+        "cached_input": 0.075,
         "output": 0.600   # $0.60 per 1M output tokens
     },
     "gpt-4-turbo": {
@@ -45,7 +53,7 @@ MODEL_PRICING = {
 }
 
 
-def calculate_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+def calculate_cost(model_name: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
     """
     Model ve token sayısına göre maliyet hesapla
 
@@ -53,19 +61,14 @@ def calculate_cost(model_name: str, input_tokens: int, output_tokens: int) -> fl
         model_name: Model adı (örn: "gpt-4o-mini")
         input_tokens: Girdi token sayısı
         output_tokens: Çıktı token sayısı
+        cached_tokens: Girdi token'larından prompt cache'ten okunanlar (indirimli fiyat)
 
     Returns:
         Maliyet (USD)
     """
-    # Model adını normalize et (version numaralarını çıkar)
-    normalized_model = model_name.lower()
-
-    # Model fiyatını bul
-    pricing = None
-    for model_key, model_pricing in MODEL_PRICING.items():
-        if model_key in normalized_model:
-            pricing = model_pricing
-            break
+    # Model fiyatını bul (en uzun eşleşme: "gpt-4o-mini-2024-07-18" gpt-4o değil gpt-4o-mini'dir)
+    model_key = match_model(model_name, MODEL_PRICING)
+    pricing = MODEL_PRICING.get(model_key) if model_key else None
 
     # Eğer model bulunamazsa, gpt-4o-mini varsayılan olarak kullan
     if not pricing:
@@ -73,7 +76,9 @@ def calculate_cost(model_name: str, input_tokens: int, output_tokens: int) -> fl
         pricing = MODEL_PRICING["gpt-4o-mini"]
 
     # Maliyet hesapla (per 1M tokens, bu yüzden 1,000,000'e bölüyoruz)
-    input_cost = (input_tokens / 1_000_000) * pricing["input"]
+    cached_tokens = min(cached_tokens, input_tokens)
+    input_cost = ((input_tokens - cached_tokens) / 1_000_000) * pricing["input"]
+    input_cost += (cached_tokens / 1_000_000) * pricing.get("cached_input", pricing["input"])
     output_cost = (output_tokens / 1_000_000) * pricing["output"]
     total_cost = input_cost + output_cost
 
@@ -93,6 +98,7 @@ def extract_usage_from_openai_response(response) -> dict:
             "input_tokens": 150,
             "output_tokens": 300,
             "total_tokens": 450,
+            "cached_tokens": 0,
             "cost": 0.000225
         }
     """
@@ -103,14 +109,18 @@ def extract_usage_from_openai_response(response) -> dict:
         input_tokens = usage.prompt_tokens
         output_tokens = usage.completion_tokens
         total_tokens = usage.total_tokens
+        # Prompt cache'ten okunan girdi token'ları (destekleyen sağlayıcılarda)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
 
-        cost = calculate_cost(model, input_tokens, output_tokens)
+        cost = calculate_cost(model, input_tokens, output_tokens, cached_tokens)
 
         return {
             "model": model,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
             "total_tokens": total_tokens,
+            "cached_tokens": cached_tokens,
             "cost": cost
         }
     except Exception as e:
@@ -120,15 +130,23 @@ def extract_usage_from_openai_response(response) -> dict:
             "input_tokens": 0,
             "output_tokens": 0,
             "total_tokens": 0,
+            "cached_tokens": 0,
             "cost": 0.0
         }
 
 
-def estimate_cost_from_text(text: str, model_name: str = "gpt-4o-mini", is_output: bool = False) -> float:
+def estimate_tokens(text: str, model_name: str = None) -> int:
     """
-    Text uzunluğundan tahmini maliyet hesapla (token bilgisi yoksa)
+    Metnin model tokenizer'ına göre token sayısı (utils/token_counter.py)
 
-    Kaba tahmin: ~4 karakter = 1 token
+    Tokenizer yüklenemezse kelime parçası sayan yaklaşık sayaç kullanılır.
+    """
+    return token_counter.count(text, model_name)
+
+
+def estimate_cost_from_text(text: str, model_name: str = "gpt-4o-mini", is_output: bool = False) -> float:
+    """
+    Metinden tahmini maliyet hesapla (token bilgisi yoksa)
 
     Args:
         text: Metin
@@ -139,7 +157,7 @@ def estimate_cost_from_text(text: str, model_name: str = "gpt-4o-mini", is_outpu
         Tahmini maliyet (USD)
     """
     # Tahmini token sayısı
-    estimated_tokens = len(text) // 4
+    estimated_tokens = estimate_tokens(text, model_name)
 
     if is_output:
         return calculate_cost(model_name, 0, estimated_tokens)
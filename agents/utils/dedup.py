@@ -0,0 +1,248 @@
+"""
+Request De-duplication - Idempotency Key ve Single-Flight
+=========================================================
+Aynı analiz isteği tekrar gönderildiğinde yeni LLM çağrısı yapmak yerine
+mevcut task'a bağlanır
+
+- `Idempotency-Key` header'ı: aynı anahtar her zaman aynı task'ı döndürür
+  (farklı içerikle tekrar kullanılırsa `IdempotencyConflict`)
+- İçerik hash'i: aynı istek çalışırken (attach) veya pencere içinde
+  tamamlanmışsa (hit) mevcut task_id döner
+- Paylaşılan durum modunda anahtarlar SQLite `request_keys` tablosundadır
+"""
+
+import sys
+import os
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    DEDUP_WINDOW_SECONDS,
+    DEDUP_MAX_ENTRIES,
+    IDEMPOTENCY_TTL_SECONDS,
+    SHARED_STATE,
+    TASK_STORE_PATH
+)
+
+# Sonuçlar
+MISS = "miss"
+ATTACH = "attach"
+HIT = "hit"
+
+ACTIVE_STATUSES = ("pending", "running")
+
+# Anahtar yazıldıktan sonra task kaydı oluşana kadar geçen süre: bu sürede
+# kayıt bulunamazsa task'ın oluşturulmakta olduğu varsayılır
+CLAIM_GRACE_SECONDS = 5.0
+
+
+class IdempotencyConflict(Exception):
+    """Idempotency-Key başka içerikli bir istek için kullanılmış"""
+
+    def __init__(self, key: str, task_id: str):
+        super().__init__(f"Idempotency-Key '{key}' was already used with a different payload (task {task_id})")
+        self.key = key
+        self.task_id = task_id
+
+
+def content_hash(crew_type: str, payload: Dict[str, Any]) -> str:
+    """İsteğin kanonik JSON'unun SHA-256'sı (alan sırası önemsiz)"""
+    canonical = json.dumps({"crew_type": crew_type, **payload}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RequestDeduplicator:
+    """
+    Anahtar -> (task_id, içerik hash'i, oluşturulma zamanı) eşlemesi
+
+    `acquire()` senkron çalışır; event loop'ta arada await olmadığı için
+    aynı anda gelen iki özdeş istekten yalnızca biri task oluşturur.
+    """
+
+    def __init__(self, window_seconds: float = 600, idempotency_ttl: float = 86400, max_entries: int = 10000):
+        self.window_seconds = window_seconds
+        self.idempotency_ttl = idempotency_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "attached": 0, "idempotent_replays": 0, "conflicts": 0}
+
+    # --- Saklama (paylaşılan modda SQLite) ----------------------------------------
+
+    def _get(self, key: str) -> Optional[Tuple[str, str, float]]:
+        return self._entries.get(key)
+
+    def _put(self, keys: List[str], task_id: str, digest: str, now: float):
+        for key in keys:
+            self._entries[key] = (task_id, digest, now)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _atomic(self, fn: Callable):
+        with self._lock:
+            return fn()
+
+    # --- API ----------------------------------------------------------------------
+
+    def acquire(self, digest: str, task_id: str, status_of: Callable[[str], Optional[str]],
+                idempotency_key: str = None, use_content: bool = True) -> Tuple[str, str]:
+        """
+        İsteği mevcut bir task'a bağla veya yeni task_id'yi kaydet
+
+        Args:
+            digest: content_hash() sonucu
+            task_id: Yeni task oluşturulacaksa kullanılacak ID
+            status_of: task_id -> durum (task yoksa None)
+            idempotency_key: İstemcinin gönderdiği anahtar (opsiyonel)
+            use_content: False ise içerik hash'iyle eşleştirme yapılmaz
+
+        Returns:
+            (task_id, sonuç) - sonuç MISS ise çağıran yeni task'ı başlatmalı
+
+        Raises:
+            IdempotencyConflict: Anahtar farklı içerikle kullanılmış
+        """
+        now = time.time()
+
+        def _status(entry) -> Optional[str]:
+            status = status_of(entry[0])
+            if status is None and now - entry[2] < CLAIM_GRACE_SECONDS:
+                return "pending"
+            return status
+
+        def _acquire():
+            if idempotency_key:
+                entry = self._get(f"idem:{idempotency_key}")
+                status = _status(entry) if entry and now - entry[2] < self.idempotency_ttl else None
+                if status is not None:
+                    if entry[1] != digest:
+                        self.counters["conflicts"] += 1
+                        raise IdempotencyConflict(idempotency_key, entry[0])
+                    self.counters["idempotent_replays"] += 1
+                    return entry[0], self._classify(status)
+
+            if use_content:
+                entry = self._get(f"hash:{digest}")
+                if entry and now - entry[2] < self.window_seconds:
+                    status = _status(entry)
+                    if status in ACTIVE_STATUSES or status == "completed":
+                        outcome = self._classify(status)
+                        if idempotency_key:
+                            self._put([f"idem:{idempotency_key}"], entry[0], digest, now)
+                        return entry[0], outcome
+
+            keys = ([f"hash:{digest}"] if use_content else []) + ([f"idem:{idempotency_key}"] if idempotency_key else [])
+            self._put(keys, task_id, digest, now)
+            self.counters["misses"] += 1
+            return task_id, MISS
+
+        return self._atomic(_acquire)
+
+    def _classify(self, status: Optional[str]) -> str:
+        if status in ACTIVE_STATUSES:
+            self.counters["attached"] += 1
+            return ATTACH
+        self.counters["hits"] += 1
+        return HIT
+
+    def release(self, digest: str, idempotency_key: str = None):
+        """Başlatılamayan (reddedilen) task'ın anahtarlarını sil"""
+        keys = [f"hash:{digest}"] + ([f"idem:{idempotency_key}"] if idempotency_key else [])
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.counters["hits"] + self.counters["attached"] + self.counters["misses"]
+        return {
+            "mode": "memory",
+            "entries": len(self._entries),
+            "window_seconds": self.window_seconds,
+            **self.counters,
+            # Her hit / attach bir analiz (LLM çağrısı) tasarrufu
+            "llm_runs_saved": self.counters["hits"] + self.counters["attached"],
+            "dedup_ratio": round((self.counters["hits"] + self.counters["attached"]) / total, 4) if total else 0.0
+        }
+
+
+class SharedRequestDeduplicator(RequestDeduplicator):
+    """Worker süreçleri arasında paylaşılan anahtar tablosu (SQLite)"""
+
+    def __init__(self, path: str, window_seconds: float = 600, idempotency_ttl: float = 86400,
+                 max_entries: int = 10000):
+        super().__init__(window_seconds, idempotency_ttl, max_entries)
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS request_keys (
+                    key TEXT PRIMARY KEY,
+                    task_id TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_request_keys_created ON request_keys(created_at);
+            """)
+
+    def _get(self, key: str) -> Optional[Tuple[str, str, float]]:
+        row = self._conn.execute(
+            "SELECT task_id, digest, created_at FROM request_keys WHERE key = ?", (key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _put(self, keys: List[str], task_id: str, digest: str, now: float):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO request_keys (key, task_id, digest, created_at) VALUES (?, ?, ?, ?)",
+            [(key, task_id, digest, now) for key in keys]
+        )
+        # Eski anahtarlar: idempotency TTL'i içerik penceresinden uzun olduğu için ona göre silinir
+        self._conn.execute(
+            "DELETE FROM request_keys WHERE created_at < ?",
+            (now - max(self.window_seconds, self.idempotency_ttl),)
+        )
+
+    def _atomic(self, fn: Callable):
+        # Aynı isteği aynı anda alan iki worker'dan yalnızca biri MISS görür
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, digest: str, idempotency_key: str = None):
+        keys = [f"hash:{digest}"] + ([f"idem:{idempotency_key}"] if idempotency_key else [])
+        with self._lock:
+            self._conn.executemany("DELETE FROM request_keys WHERE key = ?", [(key,) for key in keys])
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM request_keys").fetchone()[0]
+        stats["mode"] = "shared"
+        return stats
+
+
+def create_request_deduplicator() -> RequestDeduplicator:
+    """Paylaşılan durum modunda SQLite, aksi halde bellek içi"""
+    if SHARED_STATE:
+        return SharedRequestDeduplicator(TASK_STORE_PATH, DEDUP_WINDOW_SECONDS, IDEMPOTENCY_TTL_SECONDS, DEDUP_MAX_ENTRIES)
+    return RequestDeduplicator(DEDUP_WINDOW_SECONDS, IDEMPOTENCY_TTL_SECONDS, DEDUP_MAX_ENTRIES)
+
+
+# Singleton instance
+request_deduplicator = create_request_deduplicator()
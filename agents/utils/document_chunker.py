@@ -0,0 +1,203 @@
+"""
+Document Chunker - Bölüm Farkında Belge Parçalama
+=================================================
+Büyük belgeleri (PRD, şartname) başlık yapısına göre parçalara böler ve
+parçalardan çıkan senaryoları birleştirir (map-reduce)
+
+- split_sections: Markdown (#), numaralı (1.2.3) ve büyük harfli başlıklar
+- chunk_document / chunk_sections: Bölümleri `max_chars` sınırına kadar aynı
+  parçaya koyar; sınırı aşan bölüm paragraf / cümle sınırından bölünür
+- merge_scenarios: Parçalardan gelen senaryoları sırayı koruyarak birleştirir,
+  aynı / çok benzer senaryoları tekilleştirir
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_NUMBERED_HEADING = re.compile(r"^\s{0,3}(\d{1,2}(?:\.\d{1,2}){0,4})[.)]?\s+([^\s].{0,100})$")
+_UPPER_HEADING = re.compile(r"^\s{0,3}([A-ZÇĞİÖŞÜ0-9][A-ZÇĞİÖŞÜ0-9 \-/&:()]{3,80})$")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Senaryo benzerliği (başlık + adım kelimeleri Jaccard) bu eşiği geçerse aynı sayılır
+DUPLICATE_THRESHOLD = 0.8
+
+
+@dataclass
+class Section:
+    title: str
+    level: int
+    start: int
+    end: int
+    text: str
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    start: int
+    end: int
+    sections: List[str] = field(default_factory=list)
+    # Parçadaki bölümlerin split_sections() listesindeki sıraları
+    section_indexes: List[int] = field(default_factory=list)
+
+
+def _heading(line: str) -> Optional[Tuple[str, int]]:
+    """Satır başlıksa (başlık, seviye)"""
+    if len(line) > 120 or not line.strip():
+        return None
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return match.group(2).strip(), len(match.group(1))
+    match = _NUMBERED_HEADING.match(line)
+    if match and not line.rstrip().endswith((".", ",", ";")):
+        return line.strip(), match.group(1).count(".") + 1
+    match = _UPPER_HEADING.match(line)
+    if match and any(char.isalpha() for char in line):
+        return match.group(1).strip(), 1
+    return None
+
+
+def split_sections(text: str) -> List[Section]:
+    """Belgeyi başlık satırlarından bölümlere ayır (ilk başlıktan önceki kısım başlıksız bölümdür)"""
+    sections: List[Section] = []
+    title, level, start = "", 0, 0
+    position = 0
+    for line in text.splitlines(keepends=True):
+        heading = _heading(line.rstrip("\r\n"))
+        if heading is not None and position > start:
+            sections.append(Section(title, level, start, position, text[start:position]))
+            title, level, start = heading[0], heading[1], position
+        elif heading is not None:
+            title, level = heading
+        position += len(line)
+    if position > start or not sections:
+        sections.append(Section(title, level, start, len(text), text[start:]))
+    return sections
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Bölümü paragraf, gerekirse cümle, en son karakter sınırından böl"""
+    pieces: List[str] = []
+    for separator in (_PARAGRAPH_BREAK, _SENTENCE_END):
+        parts = separator.split(text)
+        if len(parts) > 1:
+            break
+    else:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    current = ""
+    for part in parts:
+        if len(part) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(_split_long(part, max_chars))
+            continue
+        candidate = f"{current}\n\n{part}" if current else part
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_sections(sections: List[Section], max_chars: int = 8000,
+                   indexes: Optional[List[int]] = None) -> List[Chunk]:
+    """
+    Ardışık bölümleri en fazla `max_chars` karakterlik parçalara paketle
+
+    Bir bölüm hiçbir zaman iki parçaya bölünmez; tek başına sınırı aşan bölüm
+    kendi içinde bölünür ve her parçaya bölüm başlığı eklenir. `indexes`
+    bölümlerin belgedeki sıralarıdır (varsayılan: 0..n-1).
+    """
+    indexes = list(range(len(sections))) if indexes is None else indexes
+    chunks: List[Chunk] = []
+    buffer: List[Tuple[int, Section]] = []
+    size = 0
+
+    def _flush():
+        nonlocal buffer, size
+        if buffer:
+            chunks.append(Chunk(
+                index=len(chunks),
+                text="".join(section.text for _, section in buffer),
+                start=buffer[0][1].start,
+                end=buffer[-1][1].end,
+                sections=[section.title for _, section in buffer if section.title],
+                section_indexes=[position for position, _ in buffer]
+            ))
+        buffer, size = [], 0
+
+    for position, section in zip(indexes, sections):
+        if len(section.text) > max_chars:
+            _flush()
+            offset = section.start
+            for piece_index, piece in enumerate(_split_long(section.text, max_chars)):
+                label = f"{section.title} ({piece_index + 1})" if section.title else ""
+                body = piece if piece_index == 0 or not section.title else f"{section.title} (devam)\n{piece}"
+                chunks.append(Chunk(len(chunks), body, offset, offset + len(piece), [label] if label else [], [position]))
+                offset += len(piece)
+            continue
+        if size + len(section.text) > max_chars:
+            _flush()
+        buffer.append((position, section))
+        size += len(section.text)
+    _flush()
+    return chunks
+
+
+def chunk_document(text: str, max_chars: int = 8000) -> List[Chunk]:
+    """Belgeyi bölüm sınırlarına oturan, en fazla `max_chars` karakterlik parçalara böl"""
+    return chunk_sections(split_sections(text), max_chars)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.replace("İ", "i").replace("I", "ı").lower())
+
+
+def _scenario_tokens(scenario: Dict[str, Any]) -> set:
+    parts = [str(scenario.get("title", ""))]
+    for step in scenario.get("steps") or []:
+        parts.append(str(step.get("action", "")) if isinstance(step, dict) else str(step))
+    return set(_words(" ".join(parts)))
+
+
+def merge_scenarios(chunk_scenarios: List[List[Dict[str, Any]]],
+                    threshold: float = DUPLICATE_THRESHOLD) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Parça senaryolarını belge sırasıyla birleştir ve tekilleştir
+
+    Returns:
+        (birleşik senaryolar, atılan tekrar sayısı)
+    """
+    merged: List[Dict[str, Any]] = []
+    seen_titles = set()
+    seen_tokens: List[set] = []
+    duplicates = 0
+    for scenarios in chunk_scenarios:
+        for scenario in scenarios:
+            if not isinstance(scenario, dict):
+                continue
+            title = " ".join(_words(str(scenario.get("title", ""))))
+            tokens = _scenario_tokens(scenario)
+            duplicate = title and title in seen_titles
+            if not duplicate and tokens:
+                duplicate = any(
+                    len(tokens & other) / len(tokens | other) >= threshold
+                    for other in seen_tokens
+                )
+            if duplicate:
+                duplicates += 1
+                continue
+            merged.append(scenario)
+            seen_titles.add(title)
+            seen_tokens.append(tokens)
+    return merged, duplicates
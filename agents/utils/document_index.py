@@ -0,0 +1,212 @@
+"""
+Document Index - Belge Revizyonları için Bölüm İndeksi
+======================================================
+Analiz edilmiş belgelerin bölüm yapısını ve senaryoların hangi bölümlerden
+üretildiğini saklar; belgenin yeni revizyonu geldiğinde sadece değişen / yeni
+bölümler LLM'e gönderilir, değişmeyen bölümlerin senaryoları yeniden kullanılır
+
+- Belge anahtarı: suite_id + document_info.document_id (yoksa filename)
+- Bölüm hash'i: başlık + boşlukları sadeleştirilmiş içerik (sha256)
+- Senaryo grubu: aynı LLM çağrısından çıkan senaryolar ve kaynak bölüm
+  hash'leri; grubun bütün bölümleri yeni revizyonda aynen duruyorsa grup
+  yeniden kullanılır, bölümlerinden biri değiştiyse grubun tamamı yeniden
+  analiz edilir
+- Belge başına son revizyon SQLite'ta saklanır
+"""
+
+import sys
+import os
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LLM_CACHE_PATH, DOC_INCREMENTAL_ENABLED
+from utils.document_chunker import Section, Chunk, chunk_sections
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def document_key(document_info: Optional[Dict[str, Any]], suite_id: Optional[int] = None) -> Optional[str]:
+    """Belgenin revizyonlar arasında sabit kalan anahtarı (kimlik yoksa None)"""
+    info = document_info or {}
+    name = info.get("document_id") or info.get("filename")
+    if not name:
+        return None
+    return f"{suite_id if suite_id is not None else '-'}:{name}"
+
+
+def section_hash(section: Section) -> str:
+    """Bölüm içeriğinin hash'i (boşluk ve satır sonu farkları yok sayılır)"""
+    normalized = _WHITESPACE.sub(" ", section.text).strip()
+    return hashlib.sha256(f"{section.title}\x00{normalized}".encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class RevisionPlan:
+    """Yeni revizyonda hangi bölümlerin yeniden kullanılıp hangilerinin analiz edileceği"""
+    sections: List[Section]
+    hashes: List[str]
+    previous_revision: Optional[int] = None
+    # Aynen yeniden kullanılacak senaryo grupları (`position`: belgedeki ilk bölüm sırası)
+    reused: List[Dict[str, Any]] = field(default_factory=list)
+    # LLM'e gidecek bölümlerin sıraları
+    pending: List[int] = field(default_factory=list)
+
+    @property
+    def reused_sections(self) -> int:
+        return len(self.sections) - len(self.pending)
+
+    @property
+    def tokens_avoided(self) -> int:
+        return sum(group.get("tokens", 0) for group in self.reused)
+
+    def pending_chunks(self, max_chars: int) -> List[Chunk]:
+        """Analiz edilecek bölümleri parçala (araya yeniden kullanılan bölüm giren bölümler ayrı parçaya düşer)"""
+        chunks: List[Chunk] = []
+        run: List[int] = []
+        for position in self.pending + [None]:
+            if run and (position is None or position != run[-1] + 1):
+                for chunk in chunk_sections([self.sections[i] for i in run], max_chars, run):
+                    chunk.index = len(chunks)
+                    chunks.append(chunk)
+                run = []
+            if position is not None:
+                run.append(position)
+        return chunks
+
+    def group(self, section_indexes: List[int], scenarios: List[Dict[str, Any]], tokens: int) -> Dict[str, Any]:
+        """Bir LLM çağrısının senaryolarını kaynak bölümleriyle indekse yazılacak gruba çevir"""
+        return {
+            "sections": [self.hashes[i] for i in section_indexes],
+            "titles": [self.sections[i].title for i in section_indexes if self.sections[i].title],
+            "position": min(section_indexes),
+            "scenarios": scenarios,
+            "tokens": tokens
+        }
+
+
+def plan_revision(sections: List[Section], previous: Optional[Dict[str, Any]]) -> RevisionPlan:
+    """Önceki revizyonun gruplarından, bölümlerinin tamamı yeni belgede aynen duranları seç"""
+    hashes = [section_hash(section) for section in sections]
+    plan = RevisionPlan(sections, hashes, previous["revision"] if previous else None)
+    positions: Dict[str, int] = {}
+    for index, digest in enumerate(hashes):
+        positions.setdefault(digest, index)
+
+    covered = set()
+    for group in (previous or {}).get("groups", []):
+        if group["sections"] and all(digest in positions for digest in group["sections"]):
+            plan.reused.append({**group, "position": min(positions[digest] for digest in group["sections"])})
+            covered.update(group["sections"])
+    plan.reused.sort(key=lambda group: group["position"])
+    plan.pending = [index for index, digest in enumerate(hashes) if digest not in covered]
+    return plan
+
+
+class DocumentSectionIndex:
+    """
+    Belge başına son analiz edilen revizyonun bölüm / senaryo grubu kaydı
+
+    Disk açılamazsa bellekte tutulur (süreç yeniden başlayınca kaybolur).
+    """
+
+    def __init__(self, path: Optional[str], enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self.counters = {
+            "analyses": 0, "revisions": 0, "unchanged_documents": 0,
+            "sections_reused": 0, "sections_analyzed": 0,
+            "tokens_avoided": 0, "tokens_spent": 0
+        }
+        if enabled and path:
+            self._open(path)
+
+    def _open(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS document_sections (
+                    document_key TEXT PRIMARY KEY,
+                    revision INTEGER NOT NULL,
+                    task_id TEXT,
+                    groups TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+        except sqlite3.Error as e:
+            print(f"⚠️ Belge bölüm indeksi diski açılamadı ({path}): {e}, sadece bellek kullanılacak")
+            self._conn = None
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Belgenin son revizyon kaydı"""
+        if not self.enabled or not key:
+            return None
+        with self._lock:
+            if self._conn is None:
+                return self._memory.get(key)
+            row = self._conn.execute(
+                "SELECT revision, task_id, groups, updated_at FROM document_sections WHERE document_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"revision": row[0], "task_id": row[1], "groups": json.loads(row[2]), "updated_at": row[3]}
+
+    def save(self, key: Optional[str], plan: RevisionPlan, groups: List[Dict[str, Any]], task_id: str = None,
+             tokens_spent: int = 0) -> Optional[int]:
+        """Yeni revizyonu kaydet; revizyon numarasını döndür"""
+        if not self.enabled or not key:
+            return None
+        groups = sorted(groups, key=lambda group: group["position"])
+        revision = (plan.previous_revision or 0) + 1
+        with self._lock:
+            self.counters["analyses"] += 1
+            if plan.previous_revision is not None:
+                self.counters["revisions"] += 1
+                self.counters["unchanged_documents"] += not plan.pending
+                self.counters["sections_reused"] += plan.reused_sections
+                self.counters["tokens_avoided"] += plan.tokens_avoided
+            self.counters["sections_analyzed"] += len(plan.pending)
+            self.counters["tokens_spent"] += tokens_spent
+            if self._conn is None:
+                self._memory[key] = {"revision": revision, "task_id": task_id, "groups": groups, "updated_at": time.time()}
+                return revision
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO document_sections (document_key, revision, task_id, groups, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, revision, task_id, json.dumps(groups, ensure_ascii=False), time.time())
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️ Belge bölüm indeksi yazılamadı: {e}")
+        return revision
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            if self._conn is None:
+                documents = len(self._memory)
+            else:
+                documents = self._conn.execute("SELECT COUNT(*) FROM document_sections").fetchone()[0]
+        total = counters["tokens_avoided"] + counters["tokens_spent"]
+        return {
+            "enabled": self.enabled,
+            "persistent": self._conn is not None,
+            "documents": documents,
+            **counters,
+            "tokens_avoided_pct": round(100 * counters["tokens_avoided"] / total, 1) if total else 0.0
+        }
+
+
+# Singleton instance
+section_index = DocumentSectionIndex(LLM_CACHE_PATH, enabled=DOC_INCREMENTAL_ENABLED)
@@ -0,0 +1,197 @@
+"""
+Crew Executor - Worker Havuzu Yönetimi
+======================================
+Senkron crew.kickoff() ve LLM çağrılarını FastAPI event loop'u dışında,
+crew tipine göre ayrılmış thread/process havuzlarında çalıştırır
+"""
+
+import sys
+import os
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EXECUTOR_POOLS, EXECUTOR_DEFAULT_WORKERS
+
+# Varsayılan havuzlar: crew tipi -> (tür, max worker)
+# Process havuzları EXECUTOR_POOLS ile tanımlanır; yalnızca pickle edilebilir,
+# CPU ağırlıklı fonksiyonlar için (şu an varsayılan bir process havuzu yok)
+DEFAULT_POOLS: Dict[str, Tuple[str, int]] = {
+    "agent": ("thread", 2),
+    "text_analysis": ("thread", 4),
+    "document_analysis": ("thread", 4),
+    "automation_generation": ("thread", 2),
+    "test": ("thread", 2),
+    "security": ("thread", 2),
+}
+
+POOL_KINDS = ("thread", "process")
+
+
+def parse_pool_config(spec: str, default_workers: int = 4) -> Dict[str, Tuple[str, int]]:
+    """
+    EXECUTOR_POOLS env değerini parse et
+
+    Format: "document_analysis=thread:8,test=4"
+
+    Args:
+        spec: Havuz tanımı
+        default_workers: Tanımsız havuzlar için worker sayısı
+
+    Returns:
+        {havuz_adı: (tür, max_workers)}
+    """
+    pools = dict(DEFAULT_POOLS)
+    pools.setdefault("default", ("thread", default_workers))
+
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+
+        name, value = item.split("=", 1)
+        kind, _, workers = value.partition(":")
+        if not workers:
+            # "test=4" -> thread havuzu
+            kind, workers = "thread", kind
+
+        kind = kind.strip().lower()
+        if kind not in POOL_KINDS:
+            print(f"⚠️ Geçersiz havuz türü: {item}, atlanıyor")
+            continue
+
+        try:
+            pools[name.strip()] = (kind, max(1, int(workers)))
+        except ValueError:
+            print(f"⚠️ Geçersiz worker sayısı: {item}, atlanıyor")
+
+    return pools
+
+
+class CrewExecutor:
+    """
+    Crew tipine göre ayrılmış worker havuzları
+
+    Her havuz ilk kullanımda oluşturulur. Thread havuzlarında çağıranın
+    contextvars bağlamı worker thread'e taşınır.
+    """
+
+    def __init__(self, pool_config: Dict[str, Tuple[str, int]]):
+        self._config = pool_config
+        self._pools: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _resolve(self, pool_name: str) -> str:
+        return pool_name if pool_name in self._config else "default"
+
+    def _get_pool(self, pool_name: str):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Executor kapatıldı")
+
+            pool = self._pools.get(pool_name)
+            if pool is None:
+                kind, workers = self._config[pool_name]
+                if kind == "process":
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"crew-{pool_name}")
+                self._pools[pool_name] = pool
+                self._stats[pool_name] = {
+                    "submitted": 0,
+                    "in_flight": 0,
+                    "completed": 0,
+                    "failed": 0,
+                    "cancelled": 0,
+                    "total_duration": 0.0
+                }
+            return pool
+
+    def _on_done(self, pool_name: str, started_at: float, future):
+        with self._lock:
+            stats = self._stats[pool_name]
+            stats["in_flight"] -= 1
+            if future.cancelled():
+                # Başlamadan iptal edildi (örn. task iptali), süreye dahil etme
+                stats["cancelled"] += 1
+                return
+            stats["failed" if future.exception() is not None else "completed"] += 1
+            stats["total_duration"] += time.monotonic() - started_at
+
+    async def run(self, pool_name: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Senkron fonksiyonu ilgili havuzda çalıştır ve sonucunu bekle
+
+        Args:
+            pool_name: Havuz adı (crew tipi), tanımsızsa "default"
+            fn: Çalıştırılacak blocking fonksiyon
+            *args, **kwargs: Fonksiyon argümanları
+
+        Returns:
+            Fonksiyonun dönüş değeri
+        """
+        pool_name = self._resolve(pool_name)
+        pool = self._get_pool(pool_name)
+        kind, _ = self._config[pool_name]
+
+        call = functools.partial(fn, *args, **kwargs)
+        if kind == "thread":
+            call = functools.partial(contextvars.copy_context().run, call)
+
+        started_at = time.monotonic()
+        with self._lock:
+            self._stats[pool_name]["submitted"] += 1
+            self._stats[pool_name]["in_flight"] += 1
+
+        # Sayaçlar worker tarafındaki future'a bağlı: await iptal edilse bile
+        # iş gerçekten bitene kadar slot dolu sayılır
+        future = pool.submit(call)
+        future.add_done_callback(lambda f: self._on_done(pool_name, started_at, f))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Havuz başına kuyruk derinliği ve sayaçlar"""
+        with self._lock:
+            result = {}
+            for name, (kind, workers) in self._config.items():
+                stats = self._stats.get(name)
+                if stats is None:
+                    result[name] = {"kind": kind, "max_workers": workers, "started": False}
+                    continue
+
+                in_flight = stats["in_flight"]
+                finished = stats["completed"] + stats["failed"]
+                result[name] = {
+                    "kind": kind,
+                    "max_workers": workers,
+                    "started": True,
+                    "active": min(in_flight, workers),
+                    "queued": max(0, in_flight - workers),
+                    "submitted": stats["submitted"],
+                    "completed": stats["completed"],
+                    "failed": stats["failed"],
+                    "cancelled": stats["cancelled"],
+                    "avg_duration_ms": round(stats["total_duration"] / finished * 1000, 1) if finished else 0.0
+                }
+            return result
+
+    def shutdown(self, wait: bool = False):
+        """Tüm havuzları kapat, bekleyen işleri iptal et"""
+        with self._lock:
+            self._closed = True
+            pools = list(self._pools.values())
+            self._pools.clear()
+
+        for pool in pools:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# Singleton instance
+crew_executor = CrewExecutor(parse_pool_config(EXECUTOR_POOLS, EXECUTOR_DEFAULT_WORKERS))
@@ -0,0 +1,161 @@
+"""
+Request Hedging - Kuyruk Gecikmesi için Kopya İstek
+===================================================
+Birincil model, kendi gecikme dağılımının LLM_HEDGE_PERCENTILE yüzdeliği
+kadar sürede cevap vermezse aynı istek zincirdeki sonraki modele / sağlayıcıya
+da gönderilir; önce cevap veren (stream'de ilk içerik parçası) kazanır, diğeri
+iptal edilir
+
+- Gecikme eşiği: model yönlendiricinin tuttuğu gecikmelerden; yeterli örnek
+  yoksa LLM_HEDGE_DEFAULT_DELAY_MS, en az LLM_HEDGE_MIN_DELAY_MS
+- Kopya istek sadece çağrıların LLM_HEDGE_MAX_RATIO oranına kadar ve yedek
+  sağlayıcının eş zamanlı istek sınırında yer varsa gönderilir
+- Muhasebe: kaybeden isteğin ek maliyeti ile p99 gecikmedeki kazanç.
+  Kopyanın kazandığı çağrılarda birincil iptal edildiği için gecikmesi
+  bilinmez; LLM_HEDGE_SHADOW_RATIO oranındaki çağrılarda birincil ölçüm için
+  sonuna kadar çalıştırılır (sonucu kullanılmaz), diğerlerinde birincilin o
+  süreden uzun gecikme örneklerinin medyanıyla tahmin edilir (örnek yoksa alt
+  sınır olarak gözlenen süre)
+"""
+
+import sys
+import os
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_DELAY_MS,
+    LLM_HEDGE_DEFAULT_DELAY_MS,
+    LLM_HEDGE_MAX_RATIO,
+    LLM_HEDGE_SHADOW_RATIO
+)
+from utils.llm_client import llm_client
+from utils.model_router import model_router
+
+LATENCY_WINDOW = 1000
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class RequestHedger:
+    """Kopya istek kararı ve maliyet / gecikme muhasebesi (thread-safe)"""
+
+    def __init__(self, enabled: bool = False, percentile: float = 0.95, min_delay_ms: float = 2000.0,
+                 default_delay_ms: float = 20000.0, max_ratio: float = 0.1, shadow_ratio: float = 0.1):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.max_ratio = max_ratio
+        self.shadow_ratio = shadow_ratio
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.shadow_measured = 0
+        self.skipped: Dict[str, int] = {}
+        self.extra_cost = 0.0
+        self.extra_tokens = 0
+        # Gözlenen gecikme ve hedging olmasaydı tahmini gecikme (ms)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.unhedged_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def delay_ms(self, model: str) -> float:
+        """Kopya isteğin gönderileceği gecikme eşiği"""
+        observed = model_router.latency_percentile(model, self.percentile)
+        return max(self.min_delay_ms, observed if observed is not None else self.default_delay_ms)
+
+    def should_hedge(self, backup_provider: str) -> bool:
+        """Eşik aşıldığında kopya istek gönderilebilir mi (oran sınırı ve sağlayıcı kapasitesi)"""
+        with self._lock:
+            if self.hedged >= max(1, self.calls) * self.max_ratio:
+                reason = "max_ratio"
+            elif not llm_client.has_capacity(backup_provider):
+                reason = "provider_busy"
+            else:
+                self.hedged += 1
+                return True
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+            return False
+
+    def shadow(self) -> bool:
+        """Kopya kazandığında birincil ölçüm için sonuna kadar çalıştırılsın mı"""
+        return random.random() < self.shadow_ratio
+
+    def _unhedged_estimate(self, primary: str, elapsed_ms: float) -> float:
+        """Kopya kazandığında birincilin tahmini gecikmesi: elapsed'den uzun örneklerin medyanı"""
+        slower = [sample for sample in model_router.latency_samples(primary) if sample > elapsed_ms]
+        return _percentile(slower, 0.5) if slower else elapsed_ms
+
+    def record(self, primary: str, latency_ms: float, hedge_won: bool = False, extra_tokens: int = 0,
+               extra_cost: float = 0.0, primary_ms: Optional[float] = None):
+        """
+        Hedging'e uygun bir çağrının sonucu
+
+        `primary_ms`: kopya kazandığında sonuna kadar çalıştırılan birincilin ölçülen gecikmesi
+        """
+        if primary_ms is not None:
+            unhedged = primary_ms
+        else:
+            unhedged = self._unhedged_estimate(primary, latency_ms) if hedge_won else latency_ms
+        with self._lock:
+            self.calls += 1
+            self.hedge_wins += hedge_won
+            self.shadow_measured += primary_ms is not None
+            self.extra_tokens += extra_tokens
+            self.extra_cost += extra_cost
+            self.latencies.append(latency_ms)
+            self.unhedged_latencies.append(unhedged)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies, unhedged = list(self.latencies), list(self.unhedged_latencies)
+            counters = {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "shadow_measured": self.shadow_measured,
+                "hedge_ratio": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+                "skipped": dict(self.skipped),
+                "extra_tokens": self.extra_tokens,
+                "extra_cost": round(self.extra_cost, 6)
+            }
+        p99, p99_unhedged = _percentile(latencies, 0.99), _percentile(unhedged, 0.99)
+        saved_ms = max(0.0, p99_unhedged - p99) if p99 is not None else 0.0
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "min_delay_ms": self.min_delay_ms,
+            "default_delay_ms": self.default_delay_ms,
+            "max_ratio": self.max_ratio,
+            "shadow_ratio": self.shadow_ratio,
+            **counters,
+            "p50_ms": round(_percentile(latencies, 0.5), 1) if latencies else None,
+            "p99_ms": round(p99, 1) if p99 is not None else None,
+            "p99_unhedged_ms_estimate": round(p99_unhedged, 1) if p99_unhedged is not None else None,
+            "p99_saved_ms": round(saved_ms, 1),
+            # p99'da kazanılan her saniye için ödenen ek maliyet
+            "extra_cost_per_p99_second_saved": round(counters["extra_cost"] / (saved_ms / 1000), 6) if saved_ms else None,
+            "delays_ms": {model: round(self.delay_ms(model), 1) for model in model_router.chain}
+        }
+
+
+# Singleton instance
+request_hedger = RequestHedger(
+    LLM_HEDGE_ENABLED,
+    percentile=LLM_HEDGE_PERCENTILE,
+    min_delay_ms=LLM_HEDGE_MIN_DELAY_MS,
+    default_delay_ms=LLM_HEDGE_DEFAULT_DELAY_MS,
+    max_ratio=LLM_HEDGE_MAX_RATIO,
+    shadow_ratio=LLM_HEDGE_SHADOW_RATIO
+)
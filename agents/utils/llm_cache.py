@@ -0,0 +1,381 @@
+"""
+LLM Cache - İçerik Adresli LLM Yanıt Cache'i
+=============================================
+Aynı prompt'lar için LLM'e tekrar gitmeden kayıtlı yanıtı döndürür
+
+- Anahtar: (model, temperature, normalize edilmiş mesajlar) SHA-256'sı
+- Bellek katmanı: LRU (`LLM_CACHE_MEMORY_ENTRIES`)
+- Disk katmanı: SQLite (`LLM_CACHE_PATH`), süreçler arasında paylaşılır
+- TTL (`LLM_CACHE_TTL_SECONDS`) ve boyut (`LLM_CACHE_MAX_MB`) ile temizlenir
+- İstek bazında atlama: `cache_bypass` contextvar'ı (endpoint'lerde `?cache=false`)
+- Hit / miss sayaçları ve `calculate_cost` ile tasarruf edilen dolar
+"""
+
+import sys
+import os
+import contextvars
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MEMORY_ENTRIES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_MB
+)
+from utils.cost_calculator import calculate_cost
+
+# Task bazında cache'i atlama bayrağı (executor thread'lerine contextvars ile taşınır)
+cache_bypass: contextvars.ContextVar = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+# Yanıtı etkileyen ve anahtara giren diğer istek alanları
+KEY_PARAMS = ("max_tokens", "max_completion_tokens", "top_p", "response_format", "tools", "tool_choice", "stop", "seed")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Boşluk farklarını yok say (satır sonu, girinti, çift boşluk)"""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return normalize_prompt(content)
+    if isinstance(content, list):
+        return [
+            {**part, "text": normalize_prompt(part["text"])} if isinstance(part, dict) and "text" in part else part
+            for part in content
+        ]
+    return content
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], temperature: Optional[float] = None,
+              scope: str = "content", **params) -> str:
+    """
+    (model, temperature, normalize prompt) içerik adresi
+
+    `scope` aynı istek için farklı biçimde saklanan kayıtları ayırır
+    (`content`: sadece yanıt metni, `http`: ham chat completion gövdesi).
+    """
+    normalized = [
+        {key: (_normalize_content(value) if key == "content" else value) for key, value in message.items()}
+        for message in messages
+    ]
+    extra = {name: params[name] for name in KEY_PARAMS if params.get(name) is not None}
+    canonical = json.dumps(
+        {"scope": scope, "model": model, "temperature": temperature, "messages": normalized, **extra},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    İki katmanlı yanıt cache'i
+
+    Kayıt: {"model", "content", "input_tokens", "output_tokens", ...}. Disk
+    katmanındaki hit bellek katmanına alınır. Disk boyutu aşılınca en uzun
+    süredir kullanılmayan kayıtlar silinir.
+    """
+
+    def __init__(self, path: Optional[str], memory_entries: int = 256, ttl_seconds: float = 604800,
+                 max_bytes: int = 256 * 1024 * 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "expired": 0,
+            "evicted": 0,
+            "tokens_saved": 0,
+            "dollars_saved": 0.0
+        }
+        self.by_source: Dict[str, Dict[str, Any]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if enabled and path:
+            self._open(path)
+
+    def _open(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_used ON llm_cache(last_used_at);
+            """)
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache diski açılamadı ({path}): {e}, sadece bellek katmanı kullanılacak")
+            self._conn = None
+
+    # --- Okuma / yazma ----------------------------------------------------------
+
+    def get(self, key: str, source: str = "default") -> Optional[Dict[str, Any]]:
+        """Kayıtlı yanıtı döndür; bulunamazsa (veya bypass edilmişse) None"""
+        if not self.enabled:
+            return None
+        if cache_bypass.get():
+            with self._lock:
+                self.counters["bypassed"] += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry["created_at"] > self.ttl_seconds:
+                self._memory.pop(key, None)
+                self.counters["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._hit("memory_hits", entry, source)
+                return entry
+
+            entry = self._disk_get(key, now)
+            if entry is None:
+                self.counters["misses"] += 1
+                self._source(source)["misses"] += 1
+                return None
+            self._remember(key, entry)
+            self._hit("disk_hits", entry, source)
+            return entry
+
+    def put(self, key: str, model: str, content: str, input_tokens: int, output_tokens: int, **extra):
+        """Başarılı yanıtı iki katmana yaz"""
+        if not self.enabled or cache_bypass.get() or not content:
+            return
+        entry = {
+            "model": model,
+            "content": content,
+            "input_tokens": int(input_tokens or 0),
+            "output_tokens": int(output_tokens or 0),
+            "created_at": time.time(),
+            **extra
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self.counters["stores"] += 1
+            self._disk_put(key, entry)
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _source(self, source: str) -> Dict[str, Any]:
+        return self.by_source.setdefault(source, {"hits": 0, "misses": 0, "dollars_saved": 0.0})
+
+    def _hit(self, counter: str, entry: Dict[str, Any], source: str):
+        saved = calculate_cost(entry["model"] or "", entry["input_tokens"], entry["output_tokens"])
+        self.counters[counter] += 1
+        self.counters["tokens_saved"] += entry["input_tokens"] + entry["output_tokens"]
+        self.counters["dollars_saved"] += saved
+        stats = self._source(source)
+        stats["hits"] += 1
+        stats["dollars_saved"] += saved
+
+    # --- Disk katmanı -----------------------------------------------------------
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.counters["expired"] += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️ LLM cache okunamadı: {e}")
+            return None
+
+    def _disk_put(self, key: str, entry: Dict[str, Any]):
+        if self._conn is None:
+            return
+        payload = json.dumps(entry, ensure_ascii=False, default=str)
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, payload, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry["model"], payload, len(payload.encode("utf-8")), entry["created_at"], entry["created_at"])
+            )
+            self._evict_disk(entry["created_at"])
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache yazılamadı: {e}")
+
+    def _evict_disk(self, now: float):
+        """Süresi dolan kayıtları, sonra boyut sınırını aşan en eski kullanılanları sil"""
+        expired = self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.counters["expired"] += max(expired, 0)
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        self.counters["evicted"] += len(victims)
+
+    # --- Yönetim ----------------------------------------------------------------
+
+    def clear(self) -> int:
+        """Tüm kayıtları sil; silinen disk kaydı sayısını döndür"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is None:
+                return 0
+            return self._conn.execute("DELETE FROM llm_cache").rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            disk_entries, disk_bytes = 0, 0
+            if self._conn is not None:
+                disk_entries, disk_bytes = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                ).fetchone()
+            by_source = {
+                source: {**entry, "dollars_saved": round(entry["dollars_saved"], 6)}
+                for source, entry in self.by_source.items()
+            }
+            memory_entries = len(self._memory)
+
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "memory_entries": memory_entries,
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+            "max_bytes": self.max_bytes,
+            **counters,
+            "hits": hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "dollars_saved": round(counters["dollars_saved"], 6),
+            "by_source": by_source
+        }
+
+
+class CachingTransport(httpx.BaseTransport):
+    """
+    Senkron OpenAI client'ı (crew'lar) için cache katmanı
+
+    Stream edilmeyen `/chat/completions` isteklerinin ham yanıt gövdesi `http`
+    kapsamında saklanır. Cache'ten dönen gövdede usage sıfırlanır: çağrı
+    yapılmadığı için crew token / maliyet sayaçlarına eklenmez.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, cache: "LLMResponseCache", source: str = "crew"):
+        self._transport = transport
+        self._cache = cache
+        self.source = source
+
+    def _key(self, request: httpx.Request) -> Optional[str]:
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return None
+        try:
+            body = json.loads(request.read())
+        except ValueError:
+            return None
+        if body.get("stream") or not body.get("messages") or body.get("n", 1) != 1:
+            return None
+        return cache_key(scope="http", **{key: value for key, value in body.items() if key != "stream_options"})
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._key(request) if self._cache.enabled else None
+        if key is None:
+            return self._transport.handle_request(request)
+
+        cached = self._cache.get(key, self.source)
+        if cached is not None:
+            return httpx.Response(
+                200,
+                headers={"content-type": "application/json", "x-llm-cache": "hit"},
+                content=cached["content"].encode("utf-8"),
+                request=request
+            )
+
+        response = self._transport.handle_request(request)
+        if response.status_code != 200 or cache_bypass.get():
+            return response
+        try:
+            raw = b"".join(response.stream)
+        finally:
+            response.stream.close()
+        # Sıkıştırılmış gövde açılır (content-encoding header'ı sonra atılır)
+        body = httpx.Response(200, headers=response.headers, content=raw).read()
+
+        try:
+            data = json.loads(body)
+            usage = data.get("usage") or {}
+            self._cache.put(
+                key,
+                data.get("model"),
+                json.dumps({**data, "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}},
+                           ensure_ascii=False),
+                usage.get("prompt_tokens", 0),
+                usage.get("completion_tokens", 0)
+            )
+        except (ValueError, AttributeError):
+            pass
+
+        headers = [
+            (name, value) for name, value in response.headers.raw
+            if name.lower() not in (b"content-encoding", b"content-length", b"transfer-encoding")
+        ]
+        return httpx.Response(200, headers=headers, content=body, request=request, extensions=response.extensions)
+
+    def close(self):
+        self._transport.close()
+
+
+# Singleton instance
+llm_cache = LLMResponseCache(
+    LLM_CACHE_PATH,
+    memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+    enabled=LLM_CACHE_ENABLED
+)
@@ -0,0 +1,494 @@
+"""
+LLM Client - Paylaşılan OpenAI Bağlantı Havuzu
+==============================================
+Uygulama genelinde tek bir AsyncOpenAI client'ı ve httpx bağlantı havuzu
+
+- Gemini çağrıları (model yönlendiricinin yedek zinciri) Gemini'nin OpenAI
+  uyumlu endpoint'ine aynı havuz üzerinden gider
+- Sağlayıcı başına eş zamanlı istek sınırı (LLM_PROVIDER_CONCURRENCY) ve
+  birden fazla API anahtarı arasında sıralı rotasyon; 401 / 403 / 429 alan
+  anahtar KEY_COOLDOWN_SECONDS boyunca atlanır
+
+- Endpoint'lerdeki analiz çağrıları `AsyncOpenAI` ile event loop'ta çalışır
+  (worker thread'i bloklamaz, iptal edilince istek kesilir)
+- Crew'lar (worker thread'lerinde senkron çalışır) aynı ayarlı senkron havuzu
+  kullanır
+- Her iki havuzdaki chat completion istekleri global rate limiter'dan
+  (utils/rate_limiter.py) pay alarak gönderilir; SDK'nın kendi yeniden
+  denemeleri de aynı kovadan geçer
+- LLM_PROVIDER=replay ise her iki havuz da çağrıları kaydeder veya kayıtlı
+  fixture'lardan cevaplar (utils/llm_replay.py); replay edilen çağrılar ağa
+  ve rate limiter'a uğramaz
+- Keep-alive ve HTTP/2 (h2 paketi kuruluysa); havuz kullanım ölçümü
+- Uygulama kapanırken bağlantılar kapatılır
+"""
+
+import asyncio
+import sys
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    OPENAI_API_KEYS,
+    GEMINI_API_KEYS,
+    GEMINI_BASE_URL,
+    LLM_PROVIDER_CONCURRENCY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE,
+    LLM_KEEPALIVE_SECONDS,
+    LLM_HTTP2
+)
+from utils.llm_cache import CachingTransport, llm_cache
+from utils.rate_limiter import rate_limiter, request_cost
+from utils.llm_replay import AsyncReplayTransport, ReplayTransport, llm_replay
+from utils.usage_ledger import UsageTransport, usage_ledger
+
+try:
+    import h2  # noqa: F401 - httpx HTTP/2 desteği için gerekli
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class PoolMetrics:
+    """Havuz üzerinden geçen HTTP isteklerinin sayaçları (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.total_ms = 0.0
+        self.calls: Dict[str, Dict[str, Any]] = {}
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, started: float, error: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            self.total_ms += (time.monotonic() - started) * 1000
+            if error:
+                self.errors += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_call(self, label: str, duration_ms: float, error: bool = False):
+        """Çağrı kaynağına (örn. text_analysis) göre sayaç"""
+        with self._lock:
+            entry = self.calls.setdefault(label, {"calls": 0, "errors": 0, "total_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] += duration_ms
+            if error:
+                entry["errors"] += 1
+
+
+# Kota / yetki hatası alan anahtarın rotasyondan çıkarıldığı süre
+KEY_COOLDOWN_SECONDS = 60.0
+KEY_COOLDOWN_STATUSES = (401, 403, 429)
+DEFAULT_PROVIDER_CONCURRENCY = 16
+
+
+class ProviderState:
+    """Bir sağlayıcının anahtarları, client'ları ve eş zamanlı istek sınırı"""
+
+    def __init__(self, name: str, keys: List[str], limit: int):
+        self.name = name
+        # Anahtar yoksa tek boş anahtarlı client (istek sağlayıcıda reddedilir)
+        self.keys = keys or [""]
+        self.limit = max(1, limit)
+        self.clients: Dict[int, Any] = {}
+        self.next_key = 0
+        self.cooldown_until = [0.0] * len(self.keys)
+        self.key_calls = [0] * len(self.keys)
+        self.key_errors = [0] * len(self.keys)
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waits = 0
+        self.wait_ms = 0.0
+
+
+# SSE yanıtı `[DONE]` ile bitince OpenAI SDK gövdenin sonunu okumadan stream'i
+# kapatır; okunmamış gövdeyle kapanan bağlantı havuza dönmez. Kapanışta kalan
+# kısa gövde (chunked sonlandırıcı) bu sınırlar içinde okunur.
+DRAIN_MAX_BYTES = 64 * 1024
+DRAIN_TIMEOUT_SECONDS = 0.1
+
+
+class _TrackedAsyncStream(httpx.AsyncByteStream):
+    """Yanıt gövdesi okunup kapanınca isteği bitmiş say"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, metrics: PoolMetrics, started: float):
+        self._stream = stream
+        self._metrics = metrics
+        self._started = started
+        self._closed = False
+        self._iterator = None
+        self._exhausted = False
+
+    async def __aiter__(self):
+        self._iterator = self._stream.__aiter__()
+        async for chunk in self._iterator:
+            yield chunk
+        self._exhausted = True
+
+    async def _drain(self):
+        drained = 0
+        try:
+            async for chunk in self._iterator:
+                drained += len(chunk)
+                if drained > DRAIN_MAX_BYTES:
+                    return
+        except Exception:
+            return
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            self._metrics.finished(self._started)
+            if self._iterator is not None and not self._exhausted:
+                try:
+                    await asyncio.wait_for(self._drain(), DRAIN_TIMEOUT_SECONDS)
+                except (asyncio.TimeoutError, Exception):
+                    pass
+        await self._stream.aclose()
+
+
+class _TrackedSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, metrics: PoolMetrics, started: float):
+        self._stream = stream
+        self._metrics = metrics
+        self._started = started
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._metrics.finished(self._started)
+        self._stream.close()
+
+
+def _request_body(request: httpx.Request) -> bytes:
+    """OpenAI SDK gövdeyi bellekte gönderir; stream gövdeler rate limit hesabına girmez"""
+    try:
+        return request.content
+    except httpx.RequestNotRead:
+        return b""
+
+
+class _TrackedAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def _trace(name: str, info: dict):
+            if name == "connection.connect_tcp.complete":
+                self.metrics.connection_opened()
+
+        request.extensions = {**request.extensions, "trace": _trace}
+        model, tokens = request_cost(request.method, request.url.path, _request_body(request))
+        await rate_limiter.acquire_async(model, tokens)
+        started = time.monotonic()
+        self.metrics.started()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.metrics.finished(started, error=True)
+            raise
+        response.stream = _TrackedAsyncStream(response.stream, self.metrics, started)
+        try:
+            await rate_limiter.observe_async(model, response.status_code, response.headers)
+        except BaseException:
+            # İptal edilirse bağlantı havuza geri verilsin
+            await response.aclose()
+            raise
+        return response
+
+
+class _TrackedSyncTransport(httpx.HTTPTransport):
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        def _trace(name: str, info: dict):
+            if name == "connection.connect_tcp.complete":
+                self.metrics.connection_opened()
+
+        request.extensions = {**request.extensions, "trace": _trace}
+        model, tokens = request_cost(request.method, request.url.path, _request_body(request))
+        rate_limiter.acquire(model, tokens)
+        started = time.monotonic()
+        self.metrics.started()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self.metrics.finished(started, error=True)
+            raise
+        rate_limiter.observe(model, response.status_code, response.headers)
+        response.stream = _TrackedSyncStream(response.stream, self.metrics, started)
+        return response
+
+
+def _pool_snapshot(transport: Optional[httpx.BaseTransport]) -> Dict[str, int]:
+    """httpcore havuzundaki bağlantıların anlık durumu"""
+    connections = getattr(getattr(transport, "_pool", None), "connections", None) or []
+    return {
+        "open": len(connections),
+        "idle": sum(1 for conn in connections if conn.is_idle()),
+        "http2": sum(1 for conn in connections if "HTTP/2" in conn.info())
+    }
+
+
+class LLMClientPool:
+    """
+    Paylaşılan OpenAI client'ları
+
+    `openai` (AsyncOpenAI) ve `sync_http_client` ilk kullanımda oluşturulur,
+    `aclose()` ile kapatılır.
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive: int = 10, keepalive_expiry: float = 30.0,
+                 http2: bool = True, timeout: float = 120.0, api_keys: Optional[Dict[str, List[str]]] = None,
+                 provider_concurrency: Optional[Dict[str, int]] = None):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.timeout = timeout
+        self.metrics = PoolMetrics()
+        self.sync_metrics = PoolMetrics()
+        self._lock = threading.Lock()
+        self._async_transport: Optional[_TrackedAsyncTransport] = None
+        self._sync_transport: Optional[_TrackedSyncTransport] = None
+        self.providers = {
+            name: ProviderState(name, keys, (provider_concurrency or {}).get(name, DEFAULT_PROVIDER_CONCURRENCY))
+            for name, keys in (api_keys or {"openai": [os.getenv("OPENAI_API_KEY", "")]}).items()
+        }
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._sync_http: Optional[httpx.Client] = None
+        if http2 and not HTTP2_AVAILABLE:
+            print("ℹ️ 'h2' paketi kurulu değil, LLM bağlantıları HTTP/1.1 kullanacak (pip install httpx[http2])")
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._async_http is None:
+            self._async_transport = _TrackedAsyncTransport(self.metrics, limits=self.limits, http2=self.http2)
+            transport = self._async_transport
+            if llm_replay.enabled:
+                transport = AsyncReplayTransport(transport, llm_replay)
+            self._async_http = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+        return self._async_http
+
+    def _provider(self, provider: str) -> ProviderState:
+        state = self.providers.get(provider)
+        if state is None:
+            state = self.providers[provider] = ProviderState(provider, [], DEFAULT_PROVIDER_CONCURRENCY)
+        return state
+
+    def _client(self, state: ProviderState, index: int):
+        """Sağlayıcının `index`. anahtarı için AsyncOpenAI client'ı (hepsi aynı httpx havuzunu paylaşır)"""
+        client = state.clients.get(index)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = state.clients[index] = AsyncOpenAI(
+                api_key=state.keys[index],
+                base_url=GEMINI_BASE_URL if state.name == "gemini" else None,
+                timeout=self.timeout,
+                http_client=self._http_client()
+            )
+        return client
+
+    @property
+    def openai(self):
+        """Paylaşılan AsyncOpenAI client'ı (ilk anahtar)"""
+        return self._client(self._provider("openai"), 0)
+
+    @property
+    def gemini(self):
+        """Gemini'nin OpenAI uyumlu endpoint'i için AsyncOpenAI client'ı (aynı havuz)"""
+        return self._client(self._provider("gemini"), 0)
+
+    def client_for(self, provider: str):
+        """Sağlayıcıya göre async client (openai | gemini); anahtarlar sırayla, soğumadakiler atlanarak kullanılır"""
+        state = self._provider(provider)
+        now = time.monotonic()
+        with self._lock:
+            index = state.next_key
+            for offset in range(len(state.keys)):
+                candidate = (state.next_key + offset) % len(state.keys)
+                if state.cooldown_until[candidate] <= now:
+                    index = candidate
+                    break
+            state.next_key = (index + 1) % len(state.keys)
+            state.key_calls[index] += 1
+        return self._client(state, index)
+
+    def key_failed(self, provider: str, client, status_code: Optional[int]):
+        """Kota / yetki hatası alan anahtarı rotasyondan bir süre çıkar"""
+        state = self._provider(provider)
+        api_key = getattr(client, "api_key", None)
+        with self._lock:
+            for index, key in enumerate(state.keys):
+                if key == api_key:
+                    state.key_errors[index] += 1
+                    if status_code in KEY_COOLDOWN_STATUSES and len(state.keys) > 1:
+                        state.cooldown_until[index] = time.monotonic() + KEY_COOLDOWN_SECONDS
+                    break
+
+    def has_capacity(self, provider: str) -> bool:
+        """Sağlayıcının eş zamanlı istek sınırında boş yer var mı"""
+        state = self._provider(provider)
+        return state.in_flight < state.limit
+
+    @asynccontextmanager
+    async def provider_slot(self, provider: str):
+        """Sağlayıcı başına eş zamanlı istek sınırı (sınır doluysa sıra beklenir)"""
+        state = self._provider(provider)
+        if state.semaphore is None:
+            state.semaphore = asyncio.Semaphore(state.limit)
+        started = time.monotonic()
+        if state.semaphore.locked():
+            state.waits += 1
+        async with state.semaphore:
+            state.wait_ms += (time.monotonic() - started) * 1000
+            state.in_flight += 1
+            state.peak_in_flight = max(state.peak_in_flight, state.in_flight)
+            try:
+                yield
+            finally:
+                state.in_flight -= 1
+
+    @property
+    def sync_http_client(self) -> httpx.Client:
+        """Crew'ların (senkron OpenAI client) kullandığı paylaşılan httpx havuzu (yanıt cache'i ile)"""
+        with self._lock:
+            if self._sync_http is None:
+                self._sync_transport = _TrackedSyncTransport(self.sync_metrics, limits=self.limits, http2=self.http2)
+                transport = self._sync_transport
+                if llm_replay.enabled:
+                    transport = ReplayTransport(transport, llm_replay)
+                if usage_ledger.enabled:
+                    transport = UsageTransport(transport, usage_ledger)
+                self._sync_http = httpx.Client(
+                    transport=CachingTransport(transport, llm_cache),
+                    timeout=self.timeout
+                )
+            return self._sync_http
+
+    def install_crew_llm(self, llm) -> bool:
+        """
+        CrewAI LLM instance'ının OpenAI client'ını paylaşılan havuza bağla
+
+        Native OpenAI provider'ı olmayan LLM'lerde (örn. Gemini / LiteLLM) False döner.
+        """
+        build = getattr(llm, "_build_sync_client", None)
+        if build is None or not hasattr(llm, "client_params"):
+            return False
+        try:
+            llm.client_params = {**(llm.client_params or {}), "http_client": self.sync_http_client}
+            llm._client = build()
+            return True
+        except Exception as e:
+            print(f"⚠️ Crew LLM paylaşılan havuza bağlanamadı: {e}")
+            return False
+
+    async def aclose(self):
+        """Bağlantıları kapat (app shutdown)"""
+        if self._async_http is not None:
+            # OpenAI / Gemini client'ları aynı httpx client'ını paylaşır
+            await self._async_http.aclose()
+            self._async_http = None
+            for state in self.providers.values():
+                state.clients.clear()
+                state.semaphore = None
+            self._async_transport = None
+        with self._lock:
+            if self._sync_http is not None:
+                self._sync_http.close()
+                self._sync_http = None
+                self._sync_transport = None
+
+    def _metrics_stats(self, metrics: PoolMetrics, transport) -> Dict[str, Any]:
+        max_connections = self.limits.max_connections
+        finished = metrics.requests - metrics.in_flight
+        return {
+            "requests": metrics.requests,
+            "errors": metrics.errors,
+            "in_flight": metrics.in_flight,
+            "peak_in_flight": metrics.peak_in_flight,
+            "utilization": round(metrics.in_flight / max_connections, 3) if max_connections else 0.0,
+            "peak_utilization": round(metrics.peak_in_flight / max_connections, 3) if max_connections else 0.0,
+            "connections_opened": metrics.connections_opened,
+            # Yeni bağlantı açmadan karşılanan istek oranı
+            "connection_reuse_ratio": round(1 - metrics.connections_opened / metrics.requests, 3) if metrics.requests else 0.0,
+            "avg_request_ms": round(metrics.total_ms / finished, 1) if finished else 0.0,
+            "pool": _pool_snapshot(transport)
+        }
+
+    def provider_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "limit": state.limit,
+                    "in_flight": state.in_flight,
+                    "peak_in_flight": state.peak_in_flight,
+                    "waits": state.waits,
+                    "wait_ms_total": round(state.wait_ms, 1),
+                    "keys": [
+                        {
+                            # Anahtarın sadece son 4 karakteri gösterilir
+                            "key": f"...{key[-4:]}" if key else None,
+                            "calls": state.key_calls[index],
+                            "errors": state.key_errors[index],
+                            "cooldown_s": round(max(0.0, state.cooldown_until[index] - now), 1)
+                        }
+                        for index, key in enumerate(state.keys)
+                    ]
+                }
+                for name, state in self.providers.items()
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry_s": self.limits.keepalive_expiry,
+            "async": self._metrics_stats(self.metrics, self._async_transport),
+            "crew": self._metrics_stats(self.sync_metrics, self._sync_transport),
+            "providers": self.provider_stats(),
+            "calls": {
+                label: {**entry, "avg_ms": round(entry["total_ms"] / entry["calls"], 1), "total_ms": round(entry["total_ms"], 1)}
+                for label, entry in self.metrics.calls.items()
+            }
+        }
+
+
+# Singleton instance
+llm_client = LLMClientPool(
+    LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_KEEPALIVE_SECONDS, LLM_HTTP2, LLM_REQUEST_TIMEOUT,
+    api_keys={"openai": OPENAI_API_KEYS, "gemini": GEMINI_API_KEYS},
+    provider_concurrency=LLM_PROVIDER_CONCURRENCY
+)
@@ -0,0 +1,460 @@
+"""
+LLM Replay - Kayıt ve Tekrar Oynatma Sağlayıcısı
+================================================
+LLM_PROVIDER=replay ile endpoint'lerin ve crew'ların chat completion
+çağrıları paylaşılan httpx havuzunda kaydedilir ya da ağa çıkmadan kayıtlı
+fixture'lardan cevaplanır (maliyetsiz, tekrarlanabilir yük testi / benchmark)
+
+- record: istekler gerçek sağlayıcıya gider; 200 yanıtlar (stream dahil)
+  ilk byte süresi, toplam süre ve token kullanımıyla LLM_REPLAY_PATH'e yazılır
+- replay: önce birebir aynı istek aranır; yoksa LLM_REPLAY_MATCH=shape ise
+  aynı model, aynı system prompt ve aynı yanıt biçimindeki kayıtlar sırayla
+  kullanılır; o da yoksa 404 döner
+- Gecikme modeli (LLM_REPLAY_LATENCY): recorded, scaled (× LLM_REPLAY_LATENCY_SCALE)
+  veya zero. Stream yanıtlarında ilk event ilk byte süresinde gönderilir,
+  kalanlar toplam süreye eşit aralıklarla yayılır
+- Kayıttan dönen yanıt kayıttaki usage'ı taşır: token / maliyet muhasebesi
+  canlı çağrılardaki gibi çalışır
+"""
+
+import sys
+import os
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_PROVIDER,
+    LLM_REPLAY_MODE,
+    LLM_REPLAY_PATH,
+    LLM_REPLAY_LATENCY,
+    LLM_REPLAY_LATENCY_SCALE,
+    LLM_REPLAY_MATCH
+)
+from utils.llm_cache import cache_key
+
+LATENCY_MODELS = ("recorded", "scaled", "zero")
+
+
+def _request_fields(request: httpx.Request) -> Optional[Dict[str, Any]]:
+    """Chat completion isteğinin gövdesi (başka bir istekse None)"""
+    if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+        return None
+    try:
+        body = json.loads(request.read())
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) and body.get("messages") else None
+
+
+def fixture_keys(body: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    (birebir anahtar, şekil anahtarı)
+
+    Şekil: model, stream, system mesajları ve response_format; aynı şablonla
+    yapılan ama farklı belge / gereksinim içeren çağrılar aynı şekli paylaşır.
+    """
+    stream = bool(body.get("stream"))
+    key = cache_key(
+        scope=f"replay:{'stream' if stream else 'json'}",
+        **{name: value for name, value in body.items() if name not in ("stream", "stream_options")}
+    )
+    shape = json.dumps({
+        "model": body.get("model"),
+        "stream": stream,
+        "system": [m.get("content") for m in body["messages"] if m.get("role") == "system"],
+        "response_format": body.get("response_format")
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return key, hashlib.sha256(shape.encode("utf-8")).hexdigest()
+
+
+def _usage(body: bytes, stream: bool) -> Dict[str, int]:
+    """Kaydedilen yanıttaki token kullanımı (stream'de usage taşıyan son event)"""
+    try:
+        if not stream:
+            return json.loads(body).get("usage") or {}
+        for event in reversed(_sse_events(body)):
+            data = event.strip()[len(b"data:"):].strip()
+            if data and data != b"[DONE]":
+                usage = json.loads(data).get("usage")
+                if usage:
+                    return usage
+    except (ValueError, AttributeError):
+        pass
+    return {}
+
+
+def _sse_events(body: bytes) -> List[bytes]:
+    return [event + b"\n\n" for event in body.split(b"\n\n") if event.strip()]
+
+
+class FixtureStore:
+    """SQLite fixture deposu; kayıtlar ilk kullanımda belleğe alınır"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        self._by_shape: Dict[str, List[Dict[str, Any]]] = {}
+        self._shape_cursor: Dict[str, int] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_fixtures (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL,
+                    shape TEXT NOT NULL,
+                    model TEXT,
+                    stream INTEGER NOT NULL,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    first_byte_ms REAL NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    prompt_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            rows = self._conn.execute(
+                "SELECT key, shape, model, stream, content_type, body, first_byte_ms, latency_ms FROM llm_fixtures ORDER BY id"
+            ).fetchall()
+            for row in rows:
+                self._index(dict(zip(
+                    ("key", "shape", "model", "stream", "content_type", "body", "first_byte_ms", "latency_ms"), row
+                )))
+        return self._conn
+
+    def _index(self, fixture: Dict[str, Any]):
+        # Aynı istek birden fazla kaydedildiyse en sonuncusu kullanılır
+        self._by_key[fixture["key"]] = fixture
+        self._by_shape.setdefault(fixture["shape"], []).append(fixture)
+
+    def add(self, key: str, shape: str, model: Optional[str], stream: bool, content_type: str, body: bytes,
+            first_byte_ms: float, latency_ms: float):
+        usage = _usage(body, stream)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO llm_fixtures (key, shape, model, stream, content_type, body, first_byte_ms, latency_ms, "
+                "prompt_tokens, completion_tokens, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, shape, model, int(stream), content_type, body, first_byte_ms, latency_ms,
+                 usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), time.time())
+            )
+            self._index({
+                "key": key, "shape": shape, "model": model, "stream": int(stream), "content_type": content_type,
+                "body": body, "first_byte_ms": first_byte_ms, "latency_ms": latency_ms
+            })
+
+    def find(self, key: str, shape: str, match_shape: bool) -> Tuple[Optional[Dict[str, Any]], str]:
+        """(fixture, eşleşme türü: exact | shape | miss)"""
+        with self._lock:
+            self._connect()
+            fixture = self._by_key.get(key)
+            if fixture is not None:
+                return fixture, "exact"
+            candidates = self._by_shape.get(shape) if match_shape else None
+            if not candidates:
+                return None, "miss"
+            cursor = self._shape_cursor.get(shape, 0)
+            self._shape_cursor[shape] = cursor + 1
+            return candidates[cursor % len(candidates)], "shape"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT model, COUNT(*), AVG(latency_ms), SUM(prompt_tokens), SUM(completion_tokens) "
+                "FROM llm_fixtures GROUP BY model"
+            ).fetchall()
+        return {
+            model or "-": {
+                "fixtures": count,
+                "avg_latency_ms": round(avg_latency or 0.0, 1),
+                "prompt_tokens": prompt_tokens or 0,
+                "completion_tokens": completion_tokens or 0
+            }
+            for model, count, avg_latency, prompt_tokens, completion_tokens in rows
+        }
+
+
+class LLMReplay:
+    """Kayıt / replay ayarları, gecikme modeli ve sayaçlar"""
+
+    def __init__(self, store: FixtureStore, enabled: bool = False, mode: str = "replay",
+                 latency: str = "recorded", scale: float = 1.0, match: str = "shape"):
+        if latency not in LATENCY_MODELS:
+            print(f"⚠️ Bilinmeyen LLM_REPLAY_LATENCY '{latency}', 'recorded' kullanılacak")
+            latency = "recorded"
+        self.store = store
+        self.enabled = enabled
+        self.mode = mode
+        self.latency = latency
+        self.scale = {"recorded": 1.0, "scaled": scale, "zero": 0.0}[latency]
+        self.match = match
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "exact": 0, "shape": 0, "miss": 0}
+
+    @property
+    def recording(self) -> bool:
+        return self.enabled and self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.enabled and self.mode == "replay"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def lookup(self, request: httpx.Request) -> Tuple[Optional[Dict[str, Any]], Optional[httpx.Response]]:
+        """
+        Replay modunda isteğin fixture'ı
+
+        Chat completion olmayan istekler için (None, None); kayıt yoksa
+        (None, 404 yanıtı) döner.
+        """
+        body = _request_fields(request)
+        if body is None:
+            return None, None
+        fixture, kind = self.store.find(*fixture_keys(body), match_shape=self.match == "shape")
+        self._count(kind)
+        if fixture is None:
+            return None, httpx.Response(
+                404,
+                json={"error": {
+                    "message": f"No recorded fixture for this {body.get('model')} request (LLM_REPLAY_PATH)",
+                    "type": "replay_miss"
+                }},
+                request=request
+            )
+        return fixture, None
+
+    def delays(self, fixture: Dict[str, Any]) -> Tuple[float, float]:
+        """(ilk byte'a kadar, sonraki event'lere yayılacak) süre, saniye"""
+        first_byte = fixture["first_byte_ms"] * self.scale / 1000
+        return first_byte, max(0.0, fixture["latency_ms"] * self.scale / 1000 - first_byte)
+
+    def response(self, request: httpx.Request, fixture: Dict[str, Any], stream=None) -> httpx.Response:
+        headers = {"content-type": fixture["content_type"] or "application/json", "x-llm-replay": "hit"}
+        if stream is not None:
+            return httpx.Response(200, headers=headers, stream=stream, request=request)
+        return httpx.Response(200, headers=headers, content=fixture["body"], request=request)
+
+    def record(self, request: httpx.Request, response: httpx.Response, body: bytes,
+               first_byte_ms: float, latency_ms: float):
+        fields = _request_fields(request)
+        if fields is None or response.status_code != 200:
+            return
+        key, shape = fixture_keys(fields)
+        # Sıkıştırılmış gövde açılarak saklanır
+        decoded = httpx.Response(200, headers=response.headers, content=body).read()
+        try:
+            self.store.add(
+                key, shape, fields.get("model"), bool(fields.get("stream")),
+                response.headers.get("content-type", "application/json"), decoded, first_byte_ms, latency_ms
+            )
+            self._count("recorded")
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM fixture kaydedilemedi: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        served = counters["exact"] + counters["shape"]
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "latency": self.latency,
+            "latency_scale": self.scale,
+            "match": self.match,
+            "path": self.store.path,
+            **counters,
+            "hit_rate": round(served / (served + counters["miss"]), 3) if served + counters["miss"] else 0.0,
+            "fixtures": self.store.stats() if self.enabled else {}
+        }
+
+
+class _ReplayAsyncStream(httpx.AsyncByteStream):
+    """Kayıtlı gövdeyi gecikme modeline göre event event gönder"""
+
+    def __init__(self, chunks: List[bytes], first_byte: float, spread: float):
+        self._chunks = chunks
+        self._first_byte = first_byte
+        self._spread = spread
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._first_byte)
+        gap = self._spread / max(1, len(self._chunks) - 1)
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                await asyncio.sleep(gap)
+            yield chunk
+
+
+class _ReplaySyncStream(httpx.SyncByteStream):
+    def __init__(self, chunks: List[bytes], first_byte: float, spread: float):
+        self._chunks = chunks
+        self._first_byte = first_byte
+        self._spread = spread
+
+    def __iter__(self):
+        time.sleep(self._first_byte)
+        gap = self._spread / max(1, len(self._chunks) - 1)
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                time.sleep(gap)
+            yield chunk
+
+
+class _Recorder:
+    """
+    Okunan gövdeyi biriktirir; gövde tamamlandığında bir kez fixture yazar
+
+    OpenAI SDK stream'i `[DONE]` event'inde gövdenin sonunu beklemeden
+    kapatır; bu yüzden `[DONE]` içeren SSE gövdesi kapanışta da tamam sayılır.
+    """
+
+    def __init__(self, on_complete, started: float):
+        self._on_complete = on_complete
+        self._started = started
+        self._chunks: List[bytes] = []
+        self._first_byte: Optional[float] = None
+        self._done = False
+
+    def add(self, chunk: bytes):
+        if self._first_byte is None:
+            self._first_byte = time.monotonic()
+        self._chunks.append(chunk)
+
+    def finish(self, exhausted: bool):
+        if self._done:
+            return
+        self._done = True
+        body = b"".join(self._chunks)
+        if exhausted or b"data: [DONE]" in body:
+            ended = time.monotonic()
+            self._on_complete(body, ((self._first_byte or ended) - self._started) * 1000, (ended - self._started) * 1000)
+
+
+class _RecordingAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, recorder: _Recorder):
+        self._stream = stream
+        self._recorder = recorder
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._recorder.add(chunk)
+            yield chunk
+        self._recorder.finish(exhausted=True)
+
+    async def aclose(self):
+        self._recorder.finish(exhausted=False)
+        await self._stream.aclose()
+
+
+class _RecordingSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, recorder: _Recorder):
+        self._stream = stream
+        self._recorder = recorder
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._recorder.add(chunk)
+            yield chunk
+        self._recorder.finish(exhausted=True)
+
+    def close(self):
+        self._recorder.finish(exhausted=False)
+        self._stream.close()
+
+
+def _chunks(fixture: Dict[str, Any]) -> List[bytes]:
+    return _sse_events(fixture["body"]) if fixture["stream"] else [fixture["body"]]
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    """AsyncOpenAI client'ları (endpoint'ler) için kayıt / replay katmanı"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, replay: LLMReplay):
+        self._transport = transport
+        self._replay = replay
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._replay.replaying:
+            fixture, miss = self._replay.lookup(request)
+            if miss is not None:
+                return miss
+            if fixture is not None:
+                first_byte, spread = self._replay.delays(fixture)
+                if not fixture["stream"]:
+                    await asyncio.sleep(first_byte + spread)
+                    return self._replay.response(request, fixture)
+                return self._replay.response(request, fixture, _ReplayAsyncStream(_chunks(fixture), first_byte, spread))
+
+        started = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+        if self._replay.recording and response.status_code == 200:
+            response.stream = _RecordingAsyncStream(response.stream, _Recorder(
+                lambda body, first_byte_ms, latency_ms: self._replay.record(request, response, body, first_byte_ms, latency_ms),
+                started
+            ))
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Senkron OpenAI client'ı (crew'lar) için kayıt / replay katmanı"""
+
+    def __init__(self, transport: httpx.BaseTransport, replay: LLMReplay):
+        self._transport = transport
+        self._replay = replay
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self._replay.replaying:
+            fixture, miss = self._replay.lookup(request)
+            if miss is not None:
+                return miss
+            if fixture is not None:
+                first_byte, spread = self._replay.delays(fixture)
+                if not fixture["stream"]:
+                    time.sleep(first_byte + spread)
+                    return self._replay.response(request, fixture)
+                return self._replay.response(request, fixture, _ReplaySyncStream(_chunks(fixture), first_byte, spread))
+
+        started = time.monotonic()
+        response = self._transport.handle_request(request)
+        if self._replay.recording and response.status_code == 200:
+            response.stream = _RecordingSyncStream(response.stream, _Recorder(
+                lambda body, first_byte_ms, latency_ms: self._replay.record(request, response, body, first_byte_ms, latency_ms),
+                started
+            ))
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+# Singleton instance
+llm_replay = LLMReplay(
+    FixtureStore(LLM_REPLAY_PATH),
+    enabled=LLM_PROVIDER == "replay",
+    mode=LLM_REPLAY_MODE,
+    latency=LLM_REPLAY_LATENCY,
+    scale=LLM_REPLAY_LATENCY_SCALE,
+    match=LLM_REPLAY_MATCH
+)
@@ -0,0 +1,232 @@
+"""
+Model Router - Maliyet ve Gecikme Farkında Model Seçimi
+=======================================================
+Her LLM isteği için modeli girdi boyutu, görev tipi, gözlenen p95 gecikme ve
+task'ın kalan bütçesine göre seçer; hata olursa sıralı yedek zincirindeki
+(OpenAI + Gemini) bir sonraki modele geçilir
+
+- Zincir: LLM_ROUTER_CHAIN (ucuz / hızlı model önce)
+- Büyük girdi (LLM_ROUTER_LARGE_INPUT_TOKENS) veya "quality" görev tipi:
+  LLM_ROUTER_QUALITY_MODELS öne alınır
+- Elenen modeller: API anahtarı olmayan sağlayıcı, bağlam penceresine
+  sığmayan istek, kalan bütçeyi aşan tahmini maliyet, art arda hata veren
+  (LLM_ROUTER_COOLDOWN_SECONDS soğuma) model
+- p95 gecikmesi LLM_ROUTER_LATENCY_SLO_MS'i aşan model sona itilir
+- Model başına gecikme / hata istatistikleri süreç içinde tutulur
+"""
+
+import sys
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_ROUTER_CHAIN,
+    LLM_ROUTER_QUALITY_MODELS,
+    LLM_ROUTER_LARGE_INPUT_TOKENS,
+    LLM_ROUTER_LATENCY_SLO_MS,
+    LLM_ROUTER_COOLDOWN_SECONDS,
+    LLM_ROUTER_ERROR_THRESHOLD,
+    provider_for,
+    provider_api_key
+)
+from utils.cost_calculator import calculate_cost
+from utils.token_counter import context_window
+
+# p95 hesabı için model başına tutulan son gecikmeler
+LATENCY_WINDOW = 200
+# Bu kadar örnekten önce p95 yönlendirmede kullanılmaz
+MIN_LATENCY_SAMPLES = 5
+
+# Görev tipine göre tercih: "fast" zincir sırasını, "quality" güçlü modelleri öne alır
+TASK_TIERS = {
+    "text_analysis": "fast",
+    "document_analysis": "fast",
+}
+
+
+class ModelStats:
+    """Bir modelin son çağrı gecikmeleri ve hata sayaçları"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.percentile(0.95) if len(self.latencies) >= MIN_LATENCY_SAMPLES else None
+
+
+@dataclass
+class RouteDecision:
+    task_type: str
+    models: List[str]
+    prompt_tokens: int
+    tier: str
+    # Elenen model -> neden
+    skipped: Dict[str, str] = field(default_factory=dict)
+
+    def summary(self, used: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "task_type": self.task_type,
+            "tier": self.tier,
+            "chain": self.models,
+            "model": used or (self.models[0] if self.models else None),
+            "fallbacks": self.models.index(used) if used in self.models else 0,
+            "skipped": self.skipped
+        }
+
+
+class ModelRouter:
+    """İstek başına model seçimi ve model istatistikleri (thread-safe)"""
+
+    def __init__(self, chain: List[str], quality_models: List[str], large_input_tokens: int = 12500,
+                 latency_slo_ms: float = 30000.0, cooldown_seconds: float = 30.0, error_threshold: int = 3):
+        self.chain = chain
+        self.quality_models = quality_models
+        self.large_input_tokens = large_input_tokens
+        self.latency_slo_ms = latency_slo_ms
+        self.cooldown_seconds = cooldown_seconds
+        self.error_threshold = error_threshold
+        self._lock = threading.Lock()
+        self._stats: Dict[str, ModelStats] = {}
+        self.decisions: Dict[str, int] = {}
+        self.fallbacks: Dict[str, int] = {}
+
+    @property
+    def primary(self) -> str:
+        """API anahtarı olan ilk zincir modeli (token sayımı / kırpma bu modele göre yapılır)"""
+        return next((model for model in self.chain if provider_api_key(model)), self.chain[0])
+
+    def _model_stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    def route(self, task_type: str, prompt_tokens: int, max_output_tokens: int = 0,
+              remaining_cost: Optional[float] = None) -> RouteDecision:
+        """Denenecek modelleri sırayla döndür"""
+        tier = "quality" if prompt_tokens > self.large_input_tokens else TASK_TIERS.get(task_type, "fast")
+        candidates = list(self.chain)
+        if tier == "quality":
+            candidates.sort(key=lambda model: model not in self.quality_models)
+
+        decision = RouteDecision(task_type, [], prompt_tokens, tier)
+        fitting, slow = [], set()
+        now = time.monotonic()
+        with self._lock:
+            for model in candidates:
+                if not provider_api_key(model):
+                    decision.skipped[model] = "no_api_key"
+                    continue
+                if prompt_tokens + max_output_tokens > context_window(model):
+                    decision.skipped[model] = "context_window"
+                    continue
+                fitting.append(model)
+                if remaining_cost is not None and calculate_cost(model, prompt_tokens, max_output_tokens) > remaining_cost:
+                    decision.skipped[model] = "budget"
+                    continue
+                stats = self._stats.get(model)
+                if stats is not None and stats.cooldown_until > now:
+                    decision.skipped[model] = "cooldown"
+                    continue
+                if stats is not None and stats.p95 is not None and stats.p95 > self.latency_slo_ms:
+                    slow.add(model)
+                decision.models.append(model)
+            # Yavaş modeller sona (kendi aralarında zincir sırası korunur)
+            decision.models.sort(key=lambda model: model in slow)
+            if not decision.models:
+                # Bütçe / soğuma nedeniyle hepsi elendiyse pencereye sığanlar denenir
+                # (bütçe aşımı çağrı öncesi kontrolde raporlanır)
+                decision.models = fitting
+            key = f"{task_type}:{decision.models[0] if decision.models else '-'}"
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+        return decision
+
+    def record(self, model: str, duration_ms: float, error: Optional[BaseException] = None):
+        """Çağrı sonucu: gecikme ve hata; art arda hata eşiği aşılırsa model soğumaya alınır"""
+        with self._lock:
+            stats = self._model_stats(model)
+            stats.calls += 1
+            if error is None:
+                stats.latencies.append(duration_ms)
+                stats.consecutive_errors = 0
+                return
+            stats.errors += 1
+            stats.consecutive_errors += 1
+            stats.last_error = f"{type(error).__name__}: {error}"[:200]
+            if stats.consecutive_errors >= self.error_threshold:
+                stats.cooldown_until = time.monotonic() + self.cooldown_seconds
+
+    def latency_samples(self, model: str) -> List[float]:
+        """Modelin son başarılı çağrı gecikmeleri (ms)"""
+        with self._lock:
+            stats = self._stats.get(model)
+            return list(stats.latencies) if stats is not None else []
+
+    def latency_percentile(self, model: str, q: float) -> Optional[float]:
+        """Gecikme yüzdeliği (MIN_LATENCY_SAMPLES'tan az örnek varsa None)"""
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None or len(stats.latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            return stats.percentile(q)
+
+    def record_fallback(self, from_model: str, to_model: str):
+        with self._lock:
+            key = f"{from_model}->{to_model}"
+            self.fallbacks[key] = self.fallbacks.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for model in dict.fromkeys(self.chain + list(self._stats)):
+                stats = self._stats.get(model) or ModelStats()
+                p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+                models[model] = {
+                    "provider": provider_for(model),
+                    "available": bool(provider_api_key(model)),
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.errors / stats.calls, 3) if stats.calls else 0.0,
+                    "p50_ms": round(p50, 1) if p50 is not None else None,
+                    "p95_ms": round(p95, 1) if p95 is not None else None,
+                    "cooldown_s": round(max(0.0, stats.cooldown_until - now), 1),
+                    "last_error": stats.last_error
+                }
+            return {
+                "chain": self.chain,
+                "quality_models": self.quality_models,
+                "large_input_tokens": self.large_input_tokens,
+                "latency_slo_ms": self.latency_slo_ms,
+                "models": models,
+                "decisions": dict(self.decisions),
+                "fallbacks": dict(self.fallbacks)
+            }
+
+
+# Singleton instance
+model_router = ModelRouter(
+    LLM_ROUTER_CHAIN,
+    LLM_ROUTER_QUALITY_MODELS,
+    large_input_tokens=LLM_ROUTER_LARGE_INPUT_TOKENS,
+    latency_slo_ms=LLM_ROUTER_LATENCY_SLO_MS,
+    cooldown_seconds=LLM_ROUTER_COOLDOWN_SECONDS,
+    error_threshold=LLM_ROUTER_ERROR_THRESHOLD
+)
@@ -0,0 +1,424 @@
+"""
+Progress Broker - Task İlerleme Yayını
+======================================
+Task durum geçişlerini, crew adımlarını, kısmi senaryoları ve final
+sonuçları SSE / WebSocket abonelerine push eder
+
+- Her task için sınırlı event geçmişi (offset'li ring buffer)
+- Abone başına sınırlı kuyruk: yavaş abone yayıncıyı bloklamaz, geride
+  kalınca (lagged) geçmişten kaldığı offset'ten yeniden senkronize olur
+- Yeniden bağlanan istemci `offset` ile kaldığı yerden devam eder
+- Paylaşılan durum modunda (--workers N) event'ler SQLite `task_events`
+  tablosuna yazılır; hangi worker'a bağlanılırsa bağlanılsın stream alınır
+"""
+
+import sys
+import os
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    PROGRESS_HISTORY_SIZE,
+    PROGRESS_QUEUE_SIZE,
+    PROGRESS_RETENTION_SECONDS,
+    SHARED_STATE,
+    SHARED_STATE_POLL_SECONDS,
+    TASK_STORE_PATH
+)
+
+# Final event: bu event'ten sonra stream kapanır
+END_EVENT = "end"
+
+
+class ProgressEvent:
+    """Tek bir ilerleme event'i"""
+
+    __slots__ = ("offset", "type", "data", "timestamp")
+
+    def __init__(self, offset: int, event_type: str, data: Dict[str, Any], timestamp: str = None):
+        self.offset = offset
+        self.type = event_type
+        self.data = data
+        self.timestamp = timestamp or datetime.now().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "type": self.type,
+            "data": self.data,
+            "timestamp": self.timestamp
+        }
+
+
+class _Subscriber:
+    __slots__ = ("queue", "lagged")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+
+class _Channel:
+    """Tek task'ın event geçmişi ve aboneleri"""
+
+    def __init__(self, history_size: int):
+        self.history: Deque[ProgressEvent] = deque(maxlen=history_size)
+        self.next_offset = 1
+        self.subscribers: Set[_Subscriber] = set()
+        self.finished = False
+        self.finished_at: Optional[float] = None
+
+    def replay(self, after: int):
+        """`after` offset'inden sonraki geçmiş event'ler ve ring buffer'dan düşmüş aralık olup olmadığı"""
+        oldest = self.history[0].offset if self.history else self.next_offset
+        gap = oldest > after + 1 and after >= 0
+        events = [event for event in self.history if event.offset > after]
+        return gap, oldest, events
+
+
+class ProgressBroker:
+    """
+    Task başına event kanalı
+
+    publish() event loop thread'inde, publish_threadsafe() worker
+    thread'lerinden (crew step_callback) çağrılır.
+    """
+
+    def __init__(self, history_size: int = 256, queue_size: int = 64, retention_seconds: int = 300):
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self.retention_seconds = retention_seconds
+        self._channels: Dict[str, _Channel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self.published = 0
+        self.lag_events = 0
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Uygulama event loop'unu kaydet (startup'ta)"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def _channel(self, task_id: str) -> _Channel:
+        channel = self._channels.get(task_id)
+        if channel is None:
+            channel = _Channel(self.history_size)
+            self._channels[task_id] = channel
+        return channel
+
+    def publish(self, task_id: str, event_type: str, data: Dict[str, Any] = None) -> int:
+        """Event yayınla (event loop thread'i), offset döndür"""
+        channel = self._channel(task_id)
+        event = ProgressEvent(channel.next_offset, event_type, data or {})
+        channel.next_offset += 1
+        channel.history.append(event)
+        self.published += 1
+
+        for subscriber in channel.subscribers:
+            if subscriber.lagged:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Yavaş abone: kuyruğu boşalınca geçmişten yeniden senkronize olur
+                subscriber.lagged = True
+                self.lag_events += 1
+
+        if event_type == END_EVENT:
+            channel.finished = True
+            channel.finished_at = time.monotonic()
+            self._prune()
+
+        return event.offset
+
+    def publish_threadsafe(self, task_id: str, event_type: str, data: Dict[str, Any] = None):
+        """Herhangi bir thread'den event yayınla"""
+        if self._loop is None or threading.get_ident() == self._loop_thread:
+            self.publish(task_id, event_type, data)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self.publish, task_id, event_type, data)
+        except RuntimeError:
+            # Loop kapandı (shutdown)
+            pass
+
+    def _prune(self):
+        """Retention süresi dolmuş, aboneliği kalmamış bitmiş kanalları sil"""
+        now = time.monotonic()
+        expired = [
+            task_id for task_id, channel in self._channels.items()
+            if channel.finished and not channel.subscribers
+            and now - channel.finished_at > self.retention_seconds
+        ]
+        for task_id in expired:
+            del self._channels[task_id]
+
+    def has_channel(self, task_id: str) -> bool:
+        return task_id in self._channels
+
+    def purge(self) -> int:
+        """Periyodik temizlik (bellek modunda kanallar kendiliğinden budanır)"""
+        return 0
+
+    async def subscribe(self, task_id: str, offset: int = None, heartbeat: float = None) -> AsyncIterator[Optional[ProgressEvent]]:
+        """
+        Task event'lerini dinle
+
+        Args:
+            task_id: Task ID
+            offset: Son görülen offset; bundan sonraki event'ler (geçmiş dahil) gelir.
+                    None ise saklanan geçmişin başından başlanır.
+            heartbeat: Saniye; bu süre event gelmezse None yield edilir (keep-alive)
+
+        Yields:
+            ProgressEvent (veya heartbeat için None). END_EVENT sonrası biter.
+        """
+        channel = self._channel(task_id)
+        subscriber = _Subscriber(self.queue_size)
+        channel.subscribers.add(subscriber)
+        last = offset if offset is not None else 0
+        if last >= channel.next_offset:
+            # Kanal yeniden oluşturulmuş (retention / restart): offset eski nesle ait
+            last = 0
+
+        try:
+            while True:
+                # Geçmişten yakala (ilk bağlantı, resume veya lag sonrası).
+                # Bayrak önce sıfırlanır: replay sırasında gelen event'ler kuyruğa düşer,
+                # tekrar edenler offset ile elenir
+                subscriber.lagged = False
+                gap, oldest, events = channel.replay(last)
+                if gap:
+                    yield ProgressEvent(oldest - 1, "gap", {"missed_from": last + 1, "missed_to": oldest - 1})
+                for event in events:
+                    last = event.offset
+                    yield event
+                    if event.type == END_EVENT:
+                        return
+
+                while True:
+                    try:
+                        if heartbeat:
+                            event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                        else:
+                            event = await subscriber.queue.get()
+                    except asyncio.TimeoutError:
+                        yield None
+                        continue
+
+                    if event.offset > last:
+                        last = event.offset
+                        yield event
+                        if event.type == END_EVENT:
+                            return
+
+                    if subscriber.lagged and subscriber.queue.empty():
+                        # Kuyruk taşmıştı: kalanları geçmişten oku
+                        break
+        finally:
+            channel.subscribers.discard(subscriber)
+            self._prune()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "memory",
+            "channels": len(self._channels),
+            "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+            "published": self.published,
+            "lag_events": self.lag_events
+        }
+
+
+class SharedProgressBroker(ProgressBroker):
+    """
+    Worker süreçleri arasında paylaşılan event kanalı (SQLite)
+
+    Offset'ler task başına artan sayılardır (bellek modundaki gibi); aboneler
+    tabloyu `poll_interval` aralıklarla okur. Task başına son `history_size`
+    event saklanır, bitmiş task'ların event'leri retention sonunda silinir.
+    """
+
+    def __init__(self, path: str, history_size: int = 256, retention_seconds: int = 300,
+                 poll_interval: float = 0.25):
+        super().__init__(history_size, 0, retention_seconds)
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._subscribers = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS task_events (
+                    task_id TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    finished_at REAL,
+                    PRIMARY KEY (task_id, offset)
+                );
+                CREATE INDEX IF NOT EXISTS idx_task_events_finished ON task_events(finished_at);
+            """)
+
+    def publish(self, task_id: str, event_type: str, data: Dict[str, Any] = None) -> int:
+        """Event'i tabloya yaz (herhangi bir thread / süreç), offset döndür"""
+        event = ProgressEvent(0, event_type, data or {})
+        payload = json.dumps(event.data, default=str, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                event.offset = self._conn.execute(
+                    "SELECT COALESCE(MAX(offset), 0) + 1 FROM task_events WHERE task_id = ?", (task_id,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO task_events (task_id, offset, type, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (task_id, event.offset, event_type, payload, event.timestamp)
+                )
+                self._conn.execute(
+                    "DELETE FROM task_events WHERE task_id = ? AND offset <= ?",
+                    (task_id, event.offset - self.history_size)
+                )
+                if event_type == END_EVENT:
+                    self._conn.execute(
+                        "UPDATE task_events SET finished_at = ? WHERE task_id = ?", (time.time(), task_id)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.published += 1
+        return event.offset
+
+    def publish_threadsafe(self, task_id: str, event_type: str, data: Dict[str, Any] = None):
+        try:
+            self.publish(task_id, event_type, data)
+        except sqlite3.Error as e:
+            print(f"Progress publish error: {e}")
+
+    def purge(self) -> int:
+        """Retention süresi dolmuş bitmiş task'ların event'lerini sil"""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM task_events WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            ).rowcount
+
+    def has_channel(self, task_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM task_events WHERE task_id = ? LIMIT 1", (task_id,)
+            ).fetchone() is not None
+
+    def _read(self, task_id: str, after: int):
+        with self._lock:
+            last = self._conn.execute(
+                "SELECT COALESCE(MAX(offset), 0) FROM task_events WHERE task_id = ?", (task_id,)
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT offset, type, data, created_at FROM task_events "
+                "WHERE task_id = ? AND offset > ? ORDER BY offset LIMIT ?",
+                (task_id, after, self.history_size)
+            ).fetchall()
+        return last, [ProgressEvent(row[0], row[1], json.loads(row[2]), row[3]) for row in rows]
+
+    async def subscribe(self, task_id: str, offset: int = None, heartbeat: float = None) -> AsyncIterator[Optional[ProgressEvent]]:
+        last = offset if offset is not None else 0
+        self._subscribers += 1
+        try:
+            newest, events = self._read(task_id, last)
+            if last > newest:
+                # Kanal yeniden oluşturulmuş: offset eski nesle ait
+                last = 0
+                newest, events = self._read(task_id, last)
+            idle = 0.0
+
+            while True:
+                if events and events[0].offset > last + 1:
+                    yield ProgressEvent(events[0].offset - 1, "gap", {
+                        "missed_from": last + 1, "missed_to": events[0].offset - 1
+                    })
+                for event in events:
+                    last = event.offset
+                    yield event
+                    if event.type == END_EVENT:
+                        return
+
+                if events:
+                    idle = 0.0
+                elif heartbeat and idle >= heartbeat:
+                    idle = 0.0
+                    yield None
+
+                await asyncio.sleep(self.poll_interval)
+                idle += self.poll_interval
+                _, events = self._read(task_id, last)
+        finally:
+            self._subscribers -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            channels = self._conn.execute("SELECT COUNT(DISTINCT task_id) FROM task_events").fetchone()[0]
+        return {
+            "mode": "shared",
+            "channels": channels,
+            "subscribers": self._subscribers,
+            "published": self.published,
+            "lag_events": self.lag_events
+        }
+
+
+def create_progress_broker() -> ProgressBroker:
+    """Paylaşılan durum modunda SQLite, aksi halde bellek içi broker"""
+    if SHARED_STATE:
+        return SharedProgressBroker(TASK_STORE_PATH, PROGRESS_HISTORY_SIZE, PROGRESS_RETENTION_SECONDS,
+                                    SHARED_STATE_POLL_SECONDS)
+    return ProgressBroker(PROGRESS_HISTORY_SIZE, PROGRESS_QUEUE_SIZE, PROGRESS_RETENTION_SECONDS)
+
+
+def summarize_step(step_output: Any, limit: int = 500) -> Dict[str, Any]:
+    """CrewAI AgentAction / AgentFinish çıktısını JSON'a uygun özet haline getir"""
+    summary = {"kind": type(step_output).__name__}
+    for field in ("thought", "tool", "tool_input", "result", "output"):
+        value = getattr(step_output, field, None)
+        if value:
+            summary[field] = str(value)[:limit]
+    if len(summary) == 1 and step_output is not None:
+        summary["output"] = str(step_output)[:limit]
+    return summary
+
+
+def crew_step_callback(cancel_token=None):
+    """
+    Crew(step_callback=...) için callback üret
+
+    Her ajan adımından sonra iptal kontrolü yapar ve adımı task'ın
+    ilerleme kanalına yayınlar.
+    """
+    def _callback(step_output: Any = None):
+        if cancel_token is None:
+            return
+        cancel_token.raise_if_cancelled()
+        progress_broker.publish_threadsafe(cancel_token.task_id, "step", summarize_step(step_output))
+
+    return _callback
+
+
+def report_stage(cancel_token, stage: str, **data):
+    """Crew içinden aşama event'i yayınla (örn. 'ui_test', 'scenario 2/5')"""
+    if cancel_token is not None:
+        progress_broker.publish_threadsafe(cancel_token.task_id, "stage", {"stage": stage, **data})
+
+
+# Singleton instance
+progress_broker = create_progress_broker()
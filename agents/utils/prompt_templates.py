@@ -0,0 +1,351 @@
+"""
+Prompt Templates - Önek Cache'ine Uygun Prompt Düzeni
+=====================================================
+Analiz prompt'larının sabit kısmı (talimatlar, few-shot örnekler) her çağrıda
+birebir aynı önek olarak en başa, değişken kısım (istatistikler, belge /
+gereksinim metni) en sona konur; sağlayıcının prompt cache'i (OpenAI: 1024+
+token'lık ortak önek) böylece tekrar eden çağrılarda devreye girer
+
+- Şablonlar modül yüklenirken derlenir; `precompile()` açılışta önek token
+  sayılarını hesaplar ve cache'e uygunluğu raporlar
+- Sabit önek system mesajında, değişken içerik user mesajındadır
+- Kullanımdaki `prompt_tokens_details.cached_tokens` şablon bazında toplanır
+"""
+
+import sys
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.token_counter import token_counter
+
+# OpenAI prompt cache'i bu uzunluktaki ortak öneklerde devreye girer
+MIN_CACHEABLE_PREFIX_TOKENS = 1024
+
+
+@dataclass
+class PromptTemplate:
+    """Sabit önek (system) + değişken son ek (user) şablonu"""
+    name: str
+    prefix: str
+    # str.format_map ile doldurulur; değerlerdeki süslü parantezler yorumlanmaz
+    suffix: str
+    prefix_tokens: int = 0
+
+    def messages(self, **values: Any) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": self.suffix.format_map(values)}
+        ]
+
+
+def text_stats(text: str) -> Dict[str, int]:
+    """Son ekteki istatistik alanları"""
+    return {"length": len(text), "words": len(text.split())}
+
+
+DOCUMENT_ANALYSIS = PromptTemplate(
+    name="document_analysis",
+    prefix="""You are a test automation expert who generates test scenarios from documents.
+Analyze the document given in the user message and generate test scenarios.
+
+Instructions:
+- CRITICAL: Read the ENTIRE document from beginning to end before generating scenarios
+- Do NOT skip any sections, chapters, or requirements
+- **LANGUAGE RULE: Generate ALL content (title, description, steps, expectedResult) in the SAME LANGUAGE as the document**
+  * If document is in Turkish → ALL fields must be in Turkish
+  * If document is in English → ALL fields must be in English
+- Generate scenarios based on document complexity and ALL requirements found:
+  * Simple single-sentence requirements → 1-2 scenarios
+  * Medium documents with multiple features → 3-7 scenarios
+  * Complex PRD documents → 8-15+ scenarios
+- IMPORTANT: Extract scenarios from ALL sections of the document, not just the beginning
+- Each scenario should have:
+  * title: Brief descriptive title
+  * description: What the test does
+  * steps: Array of steps with number and action (use clear, specific action verbs)
+  * expectedResult: What should happen
+  * priority: HIGH, MEDIUM, or LOW
+  * automationType: UI, API, or INTEGRATION
+
+Example 1 (Turkish document → Turkish output):
+{
+  "scenarios": [
+    {
+      "title": "Film Arama ve Görüntüleme",
+      "description": "Kullanıcı film arar ve detaylarını görüntüler",
+      "steps": [
+        {"number": 1, "action": "Ana sayfaya git"},
+        {"number": 2, "action": "Arama kutusuna 'inception' yaz"},
+        {"number": 3, "action": "Ara butonuna tıkla"},
+        {"number": 4, "action": "Sonuçlardan Inception filmine tıkla"}
+      ],
+      "expectedResult": "Film detay sayfası görüntülenir",
+      "priority": "HIGH",
+      "automationType": "UI"
+    }
+  ]
+}
+
+Example 2 (English PRD with multiple sections → one scenario per requirement, including negative cases):
+Document excerpt:
+"3.1 Registration: Users register with email and password. Password must be at least 8 characters.
+3.2 Order API: POST /api/orders creates an order and returns 201 with the order id. Requests without a token return 401."
+Output:
+{
+  "scenarios": [
+    {
+      "title": "Successful Registration With Valid Credentials",
+      "description": "User registers with a valid email and an 8+ character password",
+      "steps": [
+        {"number": 1, "action": "Navigate to the registration page"},
+        {"number": 2, "action": "Type 'new.user@example.com' into the email field"},
+        {"number": 3, "action": "Type 'Passw0rd!' into the password field"},
+        {"number": 4, "action": "Click the Register button"}
+      ],
+      "expectedResult": "Account is created and the user is redirected to the welcome page",
+      "priority": "HIGH",
+      "automationType": "UI"
+    },
+    {
+      "title": "Registration Rejects Short Password",
+      "description": "Registration fails when the password is shorter than 8 characters",
+      "steps": [
+        {"number": 1, "action": "Navigate to the registration page"},
+        {"number": 2, "action": "Type 'short.pw@example.com' into the email field"},
+        {"number": 3, "action": "Type 'abc123' into the password field"},
+        {"number": 4, "action": "Click the Register button"}
+      ],
+      "expectedResult": "A validation error about minimum password length is shown and no account is created",
+      "priority": "MEDIUM",
+      "automationType": "UI"
+    },
+    {
+      "title": "Create Order Via API",
+      "description": "An authenticated POST /api/orders request creates an order",
+      "steps": [
+        {"number": 1, "action": "Obtain an access token for a test user"},
+        {"number": 2, "action": "Send POST /api/orders with the token and a valid order body"},
+        {"number": 3, "action": "Read the response status and body"}
+      ],
+      "expectedResult": "Response status is 201 and the body contains the new order id",
+      "priority": "HIGH",
+      "automationType": "API"
+    },
+    {
+      "title": "Create Order Without Token Is Rejected",
+      "description": "POST /api/orders without an access token is refused",
+      "steps": [
+        {"number": 1, "action": "Send POST /api/orders with a valid order body and no Authorization header"},
+        {"number": 2, "action": "Read the response status"}
+      ],
+      "expectedResult": "Response status is 401 and no order is created",
+      "priority": "MEDIUM",
+      "automationType": "API"
+    }
+  ]
+}
+
+Example 3 (Turkish requirement with an integration flow):
+Document excerpt:
+"Ödeme tamamlandığında sipariş durumu 'Onaylandı' olur ve müşteriye onay e-postası gönderilir."
+Output:
+{
+  "scenarios": [
+    {
+      "title": "Ödeme Sonrası Sipariş Onayı ve E-posta Bildirimi",
+      "description": "Başarılı ödemeden sonra sipariş onaylanır ve müşteriye e-posta gider",
+      "steps": [
+        {"number": 1, "action": "Sepete bir ürün ekle ve ödeme sayfasına git"},
+        {"number": 2, "action": "Test kartı bilgileriyle ödemeyi tamamla"},
+        {"number": 3, "action": "Siparişlerim sayfasında sipariş durumunu kontrol et"},
+        {"number": 4, "action": "Müşterinin e-posta kutusunda onay e-postasını kontrol et"}
+      ],
+      "expectedResult": "Sipariş durumu 'Onaylandı' olur ve onay e-postası müşteriye ulaşır",
+      "priority": "HIGH",
+      "automationType": "INTEGRATION"
+    }
+  ]
+}
+
+CRITICAL RULES:
+- Every numbered section, table row and bullet that states a requirement must be covered by at least one scenario
+- Add a negative scenario for each explicit validation rule, limit or error response in the document
+- Use the concrete values from the document (field names, limits, endpoints, status codes, messages)
+- Use API for endpoint-level checks, UI for screen flows and INTEGRATION for flows spanning several systems
+- Do NOT invent features, screens or endpoints that the document does not mention
+- Do NOT merge unrelated requirements into one scenario; do NOT duplicate the same scenario with different wording
+- Number steps from 1 in every scenario and keep one action per step
+- Return ONLY a valid JSON object with a "scenarios" array. No markdown, no code blocks.""",
+    suffix="""Document Statistics:
+- Length: {length} characters
+- Words: ~{words} words
+{part_note}
+Document content:
+{document}"""
+)
+
+TEXT_ANALYSIS = PromptTemplate(
+    name="text_analysis",
+    prefix="""You are a test automation expert who generates test scenarios from requirements.
+Analyze the test requirement given in the user message and generate test scenarios.
+
+Instructions:
+- CRITICAL: Read the ENTIRE text carefully before generating scenarios
+- **CAPTURE ALL STEPS**: Each line or action mentioned in the input must become a separate step
+- **NEVER SKIP POST-ACTION STEPS**: If text says "after login, do X", X must be included as steps
+- Adjust scenario count based on requirement complexity:
+  * Single simple action → 1 scenario
+  * Multiple related actions → 2-4 scenarios
+  * Complex multi-feature requirements → 5-10+ scenarios
+- IMPORTANT: Don't create unnecessary scenarios - match the actual requirements
+- **LANGUAGE RULE: Generate ALL content (title, description, steps, expectedResult) in the SAME LANGUAGE as the input text**
+  * If input is in Turkish → ALL fields must be in Turkish
+  * If input is in English → ALL fields must be in English
+- Each scenario should have:
+  * title: Brief descriptive title covering ALL actions (not just the first action)
+  * description: What the test does (include all major steps)
+  * steps: Array of steps with number and action (use clear, specific action verbs)
+  * expectedResult: What should happen at the END of all steps
+  * priority: HIGH, MEDIUM, or LOW
+  * automationType: UI, API, or INTEGRATION
+
+Example 1 (Turkish - Simple):
+Input: "ana sayfada inception filmini ara ve tıkla"
+Output:
+{
+  "scenarios": [
+    {
+      "title": "Inception Filmini Ara ve Görüntüle",
+      "description": "Inception filmini arayıp detaylarını görüntüle",
+      "steps": [
+        {"number": 1, "action": "Ana sayfaya git"},
+        {"number": 2, "action": "Arama kutusuna 'inception' yaz"},
+        {"number": 3, "action": "Ara butonuna tıkla veya Enter'a bas"},
+        {"number": 4, "action": "Sonuçlardan Inception filmine tıkla"}
+      ],
+      "expectedResult": "Inception film detay sayfası görüntülenir",
+      "priority": "HIGH",
+      "automationType": "UI"
+    }
+  ]
+}
+
+Example 2 (Turkish - Multi-step with login + post-login):
+Input: "login sayfasına git, email olarak test@test.com yaz, şifre olarak 123456 yaz ve login ol, login olduktan sonra Ayarlar sayfasına git ve Profil Düzenle butonuna tıkla"
+Output:
+{
+  "scenarios": [
+    {
+      "title": "Giriş Yap ve Profil Düzenle",
+      "description": "Kullanıcı giriş yapıp profil düzenleme ekranına gider",
+      "steps": [
+        {"number": 1, "action": "Login sayfasına git"},
+        {"number": 2, "action": "Email alanına 'test@test.com' yaz"},
+        {"number": 3, "action": "Şifre alanına '123456' yaz"},
+        {"number": 4, "action": "Login butonuna tıkla"},
+        {"number": 5, "action": "Ayarlar sayfasına git"},
+        {"number": 6, "action": "Profil Düzenle butonuna tıkla"}
+      ],
+      "expectedResult": "Profil düzenleme ekranı açılır",
+      "priority": "HIGH",
+      "automationType": "UI"
+    }
+  ]
+}
+
+Example 3 (English - Simple):
+Input: "search for Lord of the Rings and click it"
+Output:
+{
+  "scenarios": [
+    {
+      "title": "Search and View Lord of the Rings",
+      "description": "Search for a movie and view details",
+      "steps": [
+        {"number": 1, "action": "Navigate to homepage"},
+        {"number": 2, "action": "Type 'Lord of the Rings' into search box"},
+        {"number": 3, "action": "Click search button"},
+        {"number": 4, "action": "Click on the movie from results"}
+      ],
+      "expectedResult": "Movie details are displayed",
+      "priority": "HIGH",
+      "automationType": "UI"
+    }
+  ]
+}
+
+CRITICAL RULES:
+- For simple single-sentence requirements, return only ONE scenario
+- **INCLUDE ALL STEPS FROM INPUT**: If input mentions 5 actions, output must have 5+ steps
+- **NEVER STOP AT LOGIN**: If input has "after login, do X", you MUST include X as steps
+- Break down complex actions into specific steps (navigate → fill fields → click → navigate again)
+- Be very specific about what to type, where to click, which values to use
+- NEVER use vague actions like "Locate" - use "Search for" or "Type into"
+- Return ONLY a valid JSON object with a "scenarios" array, no markdown, no additional text""",
+    suffix="""Text Statistics:
+- Length: {length} characters
+- Words: ~{words} words
+
+Requirement text:
+{requirement_text}"""
+)
+
+TEMPLATES = {template.name: template for template in (DOCUMENT_ANALYSIS, TEXT_ANALYSIS)}
+
+
+def document_messages(document_content: str, part_note: str = "") -> List[Dict[str, str]]:
+    """Belge analizi mesajları (`part_note`: büyük belgenin hangi parçası olduğu bilgisi)"""
+    return DOCUMENT_ANALYSIS.messages(document=document_content, part_note=part_note, **text_stats(document_content))
+
+
+def text_messages(requirement_text: str) -> List[Dict[str, str]]:
+    """Metin analizi mesajları"""
+    return TEXT_ANALYSIS.messages(requirement_text=requirement_text, **text_stats(requirement_text))
+
+
+class PromptCacheMetrics:
+    """Şablon bazında prompt / cache'ten okunan token sayaçları (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def record(self, template: str, usage: Any):
+        """Çağrının usage bilgisinden prompt ve cache'lenmiş token'ları topla"""
+        prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = int(getattr(details, "cached_tokens", 0) or 0)
+        with self._lock:
+            counters = self._counters.setdefault(template, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_hits": 0})
+            counters["calls"] += 1
+            counters["prompt_tokens"] += prompt_tokens
+            counters["cached_tokens"] += cached_tokens
+            counters["cache_hits"] += cached_tokens > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        result = {}
+        for name, template in TEMPLATES.items():
+            entry = counters.get(name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_hits": 0})
+            result[name] = {
+                "prefix_tokens": template.prefix_tokens,
+                "cacheable": template.prefix_tokens >= MIN_CACHEABLE_PREFIX_TOKENS,
+                **entry,
+                "cached_ratio": round(entry["cached_tokens"] / entry["prompt_tokens"], 3) if entry["prompt_tokens"] else 0.0
+            }
+        return result
+
+
+def precompile(model_name: Optional[str] = None) -> Dict[str, int]:
+    """Şablon öneklerinin token sayılarını hesapla (açılışta bir kez)"""
+    for template in TEMPLATES.values():
+        template.prefix_tokens = token_counter.count(template.prefix, model_name)
+    return {name: template.prefix_tokens for name, template in TEMPLATES.items()}
+
+
+# Singleton instance
+prompt_cache_metrics = PromptCacheMetrics()
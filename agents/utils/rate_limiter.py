@@ -0,0 +1,451 @@
+"""
+Rate Limiter - LLM Trafiği için Global Token Bucket
+===================================================
+Endpoint'lerdeki async çağrılar ve crew'ların senkron çağrıları paylaşılan
+httpx havuzundan geçerken model başına istek (RPM) ve token (TPM) kovasından
+pay alır; kova boşsa çağrı hata vermek yerine sırada bekler
+
+- Limitler: LLM_RATE_LIMITS ("model=rpm/tpm,..."); isteğin token maliyeti
+  prompt token'ları + max_tokens (sağlayıcının da saydığı üst sınır)
+- Adil sıra: bekleyenler task bazında round-robin, task içinde FIFO sırayla
+  alınır (çok parçalı belge analizi kısa bir metin analizini aç bırakmaz)
+- 429: Retry-After (yoksa üstel) süre boyunca kova kapanır ve dolum hızı
+  yarıya iner; başarılı yanıtlarla kademeli olarak geri gelir. Sağlayıcının
+  `x-ratelimit-remaining-*` başlıkları kovayı aşağı doğru düzeltir
+- Paylaşılan modda (SHARED_STATE) kova durumu SQLite'ta tutulur, limit tüm
+  worker süreçleri için ortaktır; sıra adaleti worker içindedir. Async
+  çağrıların SQLite transaction'ları event loop dışında, store'un tek
+  thread'lik havuzunda çalışır
+"""
+
+import sys
+import os
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, astuple
+from typing import Any, Callable, Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_RATE_LIMIT_ENABLED,
+    LLM_RATE_LIMITS,
+    SHARED_STATE,
+    TASK_STORE_PATH
+)
+from utils.cancellation import current_cancel_token
+from utils.token_counter import match_model, token_counter
+
+# max_tokens verilmeyen isteklerde (crew'lar) yanıt için sayılan token
+DEFAULT_COMPLETION_TOKENS = 1024
+# 429 sonrası bekleme ve dolum hızı ayarı
+INITIAL_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+MIN_RATE_FACTOR = 0.1
+RECOVERY_STEP = 0.05
+# Sırada öndeki beklerken uyanma aralığı (kaçırılan uyandırmalara karşı)
+MAX_WAIT_SECONDS = 1.0
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """'gpt-4o-mini=5000/2000000,gpt-4o=5000/450000' -> {model: (rpm, tpm)}"""
+    limits = {}
+    for item in (spec or "").split(","):
+        name, _, values = item.partition("=")
+        rpm, _, tpm = values.partition("/")
+        if name.strip() and rpm.strip() and tpm.strip():
+            limits[name.strip()] = (int(rpm), int(tpm))
+    return limits
+
+
+@dataclass
+class BucketState:
+    requests: float
+    tokens: float
+    updated: float
+    blocked_until: float = 0.0
+    rate_factor: float = 1.0
+    backoff: float = 0.0
+
+
+class MemoryBucketStore:
+    """Süreç içi kova durumu"""
+
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, BucketState] = {}
+
+    def transact(self, bucket: str, init: Callable[[], BucketState], fn: Callable[[BucketState], Any]):
+        with self._lock:
+            state = self._states.get(bucket)
+            if state is None:
+                state = self._states[bucket] = init()
+            return fn(state)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Bellek içi kova bloklamaz: doğrudan çalıştır"""
+        return fn(*args)
+
+
+class SQLiteBucketStore:
+    """Worker süreçleri arasında paylaşılan kova durumu (BEGIN IMMEDIATE ile atomik)"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        # BEGIN IMMEDIATE busy_timeout kadar bekleyebilir: async çağrılar bu thread'de çalışır
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-buckets")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                bucket TEXT PRIMARY KEY,
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                blocked_until REAL NOT NULL,
+                rate_factor REAL NOT NULL,
+                backoff REAL NOT NULL
+            )
+        """)
+
+    def transact(self, bucket: str, init: Callable[[], BucketState], fn: Callable[[BucketState], Any]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT requests, tokens, updated, blocked_until, rate_factor, backoff FROM rate_buckets WHERE bucket = ?",
+                    (bucket,)
+                ).fetchone()
+                state = BucketState(*row) if row else init()
+                result = fn(state)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?, ?, ?, ?, ?)", (bucket, *astuple(state))
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Kova transaction'ı içeren fonksiyonu event loop'u bloklamadan çalıştır"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+
+class _Ticket:
+    """Sıradaki bir çağrı; senkron (thread) veya async bekleyen"""
+
+    def __init__(self, owner: str, tokens: int, loop: Optional[asyncio.AbstractEventLoop]):
+        self.owner = owner
+        self.tokens = tokens
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class RateLimiter:
+    """Model başına RPM / TPM token bucket ve adil bekleme sırası"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]], store, enabled: bool = True):
+        self.limits = limits
+        self.store = store
+        self.enabled = enabled and bool(limits)
+        self._lock = threading.Lock()
+        # bucket -> owner -> bekleyen ticket'lar (owner sırası round-robin)
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    def bucket_for(self, model: Optional[str]) -> Optional[str]:
+        if not self.enabled or not model:
+            return None
+        return match_model(model, self.limits)
+
+    def _init(self, bucket: str) -> Callable[[], BucketState]:
+        rpm, tpm = self.limits[bucket]
+        return lambda: BucketState(float(rpm), float(tpm), time.time())
+
+    def _refill(self, bucket: str, state: BucketState, now: float):
+        rpm, tpm = self.limits[bucket]
+        elapsed = max(0.0, now - state.updated)
+        state.requests = min(float(rpm), state.requests + elapsed * rpm * state.rate_factor / 60)
+        state.tokens = min(float(tpm), state.tokens + elapsed * tpm * state.rate_factor / 60)
+        state.updated = now
+
+    def _try_take(self, bucket: str, tokens: int) -> float:
+        """Kovadan pay almayı dene; alındıysa 0, alınamadıysa tahmini bekleme (sn)"""
+        rpm, tpm = self.limits[bucket]
+        # Kova kapasitesinden büyük istek sonsuza kadar beklemesin
+        tokens = min(tokens, tpm)
+
+        def _take(state: BucketState) -> float:
+            now = time.time()
+            self._refill(bucket, state, now)
+            if state.blocked_until > now:
+                return state.blocked_until - now
+            if state.requests >= 1 and state.tokens >= tokens:
+                state.requests -= 1
+                state.tokens -= tokens
+                return 0.0
+            per_second = state.rate_factor / 60
+            return max(
+                max(0.0, 1 - state.requests) / (rpm * per_second),
+                max(0.0, tokens - state.tokens) / (tpm * per_second)
+            )
+
+        return self.store.transact(bucket, self._init(bucket), _take)
+
+    # --- Adil sıra --------------------------------------------------------
+
+    def _enqueue(self, bucket: str, ticket: _Ticket):
+        with self._lock:
+            queue = self._queues.setdefault(bucket, OrderedDict())
+            queue.setdefault(ticket.owner, deque()).append(ticket)
+
+    def _is_next(self, bucket: str, ticket: _Ticket) -> bool:
+        with self._lock:
+            queue = self._queues.get(bucket)
+            if not queue:
+                return False
+            return queue[next(iter(queue))][0] is ticket
+
+    def _dequeue(self, bucket: str, ticket: _Ticket, granted: bool):
+        """Ticket'ı sıradan çıkar; pay aldıysa sahibini sona al ve yeni baştakini uyandır"""
+        with self._lock:
+            queue = self._queues.get(bucket)
+            tickets = queue.get(ticket.owner) if queue else None
+            if not tickets or ticket not in tickets:
+                return
+            tickets.remove(ticket)
+            if not tickets:
+                del queue[ticket.owner]
+            elif granted:
+                queue.move_to_end(ticket.owner)
+            head = queue[next(iter(queue))][0] if queue else None
+        if head is not None:
+            head.wake()
+
+    def _record_wait(self, bucket: str, tokens: int, waited_ms: float):
+        with self._lock:
+            counters = self._counters.setdefault(bucket, {
+                "granted": 0, "tokens": 0, "waited": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                "rate_limited": 0, "header_corrections": 0
+            })
+            counters["granted"] += 1
+            counters["tokens"] += tokens
+            if waited_ms >= 10:
+                counters["waited"] += 1
+                counters["wait_ms_total"] += waited_ms
+                counters["wait_ms_max"] = max(counters["wait_ms_max"], waited_ms)
+
+    def _owner(self) -> str:
+        token = current_cancel_token.get()
+        return token.task_id if token is not None else "-"
+
+    @staticmethod
+    def _check_cancelled():
+        token = current_cancel_token.get()
+        if token is not None:
+            token.raise_if_cancelled()
+
+    def acquire(self, model: Optional[str], tokens: int) -> float:
+        """Senkron çağrılar (crew thread'leri) için: pay alınana kadar bekle; beklenen süre (ms)"""
+        bucket = self.bucket_for(model)
+        if bucket is None:
+            return 0.0
+        started = time.monotonic()
+        ticket = _Ticket(self._owner(), tokens, None)
+        self._enqueue(bucket, ticket)
+        granted = False
+        try:
+            while True:
+                self._check_cancelled()
+                wait = self._try_take(bucket, tokens) if self._is_next(bucket, ticket) else MAX_WAIT_SECONDS
+                if wait <= 0:
+                    granted = True
+                    break
+                ticket.event.wait(min(wait, MAX_WAIT_SECONDS))
+                ticket.event.clear()
+        finally:
+            self._dequeue(bucket, ticket, granted)
+        waited_ms = (time.monotonic() - started) * 1000
+        self._record_wait(bucket, tokens, waited_ms)
+        return waited_ms
+
+    async def acquire_async(self, model: Optional[str], tokens: int) -> float:
+        """Async çağrılar için: pay alınana kadar event loop'u bloklamadan bekle; beklenen süre (ms)"""
+        bucket = self.bucket_for(model)
+        if bucket is None:
+            return 0.0
+        started = time.monotonic()
+        ticket = _Ticket(self._owner(), tokens, asyncio.get_running_loop())
+        self._enqueue(bucket, ticket)
+        granted = False
+        try:
+            while True:
+                self._check_cancelled()
+                if self._is_next(bucket, ticket):
+                    wait = await self.store.run(self._try_take, bucket, tokens)
+                else:
+                    wait = MAX_WAIT_SECONDS
+                if wait <= 0:
+                    granted = True
+                    break
+                try:
+                    await asyncio.wait_for(ticket.event.wait(), min(wait, MAX_WAIT_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                ticket.event.clear()
+        finally:
+            self._dequeue(bucket, ticket, granted)
+        waited_ms = (time.monotonic() - started) * 1000
+        self._record_wait(bucket, tokens, waited_ms)
+        return waited_ms
+
+    # --- Sağlayıcı yanıtları ------------------------------------------------
+
+    def observe(self, model: Optional[str], status_code: int, headers):
+        """Yanıta göre kovayı ayarla: 429'da geri çekil, başarıda toparlan ve başlıklarla düzelt"""
+        bucket = self.bucket_for(model)
+        if bucket is None:
+            return
+        if status_code == 429:
+            retry_after = _retry_after_seconds(headers)
+
+            def _back_off(state: BucketState):
+                state.backoff = min(MAX_BACKOFF_SECONDS, retry_after or max(INITIAL_BACKOFF_SECONDS, state.backoff * 2))
+                state.blocked_until = max(state.blocked_until, time.time() + state.backoff)
+                state.rate_factor = max(MIN_RATE_FACTOR, state.rate_factor / 2)
+
+            self.store.transact(bucket, self._init(bucket), _back_off)
+            with self._lock:
+                self._counters.setdefault(bucket, {}).setdefault("rate_limited", 0)
+                self._counters[bucket]["rate_limited"] += 1
+            print(f"[RateLimiter] 429 for {bucket}, backing off")
+            return
+        if status_code >= 400:
+            return
+
+        remaining_requests = _header_number(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_number(headers, "x-ratelimit-remaining-tokens")
+
+        def _recover(state: BucketState) -> bool:
+            self._refill(bucket, state, time.time())
+            state.backoff = 0.0
+            state.rate_factor = min(1.0, state.rate_factor + RECOVERY_STEP)
+            corrected = False
+            if remaining_requests is not None and remaining_requests < state.requests:
+                state.requests, corrected = remaining_requests, True
+            if remaining_tokens is not None and remaining_tokens < state.tokens:
+                state.tokens, corrected = remaining_tokens, True
+            return corrected
+
+        if remaining_requests is None and remaining_tokens is None:
+            # Başlık yoksa sadece geri çekilme sonrası toparlanma yazılır
+            current = self.store.transact(bucket, self._init(bucket), lambda state: state.rate_factor)
+            if current >= 1.0:
+                return
+        if self.store.transact(bucket, self._init(bucket), _recover):
+            with self._lock:
+                self._counters.setdefault(bucket, {}).setdefault("header_corrections", 0)
+                self._counters[bucket]["header_corrections"] += 1
+
+    async def observe_async(self, model: Optional[str], status_code: int, headers):
+        """observe'un async çağrılar için hali (paylaşılan kovada event loop dışında)"""
+        if self.bucket_for(model) is not None:
+            await self.store.run(self.observe, model, status_code, headers)
+
+    async def stats_async(self) -> Dict[str, Any]:
+        """stats'ın async endpoint'ler için hali (paylaşılan kovada event loop dışında)"""
+        return await self.store.run(self.stats)
+
+    def stats(self) -> Dict[str, Any]:
+        buckets = {}
+        now = time.time()
+        for bucket, (rpm, tpm) in self.limits.items():
+            def _snapshot(state: BucketState) -> Dict[str, float]:
+                self._refill(bucket, state, now)
+                return {
+                    "requests": state.requests, "tokens": state.tokens, "rate_factor": state.rate_factor,
+                    "blocked_s": max(0.0, state.blocked_until - now)
+                }
+
+            snapshot = self.store.transact(bucket, self._init(bucket), _snapshot)
+            with self._lock:
+                queue = self._queues.get(bucket) or {}
+                waiting = {owner: len(tickets) for owner, tickets in queue.items()}
+                counters = dict(self._counters.get(bucket, {}))
+            waited = counters.get("waited", 0)
+            buckets[bucket] = {
+                "rpm": rpm,
+                "tpm": tpm,
+                "rate_factor": round(snapshot["rate_factor"], 3),
+                "blocked_s": round(snapshot["blocked_s"], 1),
+                "available_requests": int(snapshot["requests"]),
+                "available_tokens": int(snapshot["tokens"]),
+                "request_headroom_pct": round(100 * snapshot["requests"] / rpm, 1),
+                "token_headroom_pct": round(100 * snapshot["tokens"] / tpm, 1),
+                "queued": sum(waiting.values()),
+                "queued_by_task": waiting,
+                **{key: round(value, 1) if isinstance(value, float) else value for key, value in counters.items()},
+                "wait_ms_avg": round(counters.get("wait_ms_total", 0.0) / waited, 1) if waited else 0.0
+            }
+        return {"enabled": self.enabled, "shared": self.store.shared, "buckets": buckets}
+
+
+def request_cost(method: str, path: str, body: bytes) -> Tuple[Optional[str], int]:
+    """Chat completion isteğinin modeli ve token maliyeti (prompt + max_tokens); LLM çağrısı değilse (None, 0)"""
+    if method != "POST" or not path.endswith("/chat/completions"):
+        return None, 0
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return None, 0
+    model = payload.get("model")
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return model, token_counter.count_messages(payload.get("messages") or [], model) + int(completion)
+
+
+def _header_number(headers, name: str) -> Optional[float]:
+    try:
+        value = headers.get(name) if headers is not None else None
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after_seconds(headers) -> Optional[float]:
+    """Retry-After başlığı (retry-after-ms öncelikli)"""
+    milliseconds = _header_number(headers, "retry-after-ms")
+    if milliseconds is not None:
+        return milliseconds / 1000
+    return _header_number(headers, "retry-after")
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Paylaşılan durum modunda SQLite, aksi halde bellek içi kova"""
+    store = MemoryBucketStore()
+    if SHARED_STATE and LLM_RATE_LIMIT_ENABLED:
+        try:
+            store = SQLiteBucketStore(TASK_STORE_PATH)
+        except sqlite3.Error as e:
+            print(f"⚠️ Paylaşılan rate limit kovası açılamadı ({TASK_STORE_PATH}): {e}, süreç içi kova kullanılacak")
+    return RateLimiter(parse_rate_limits(LLM_RATE_LIMITS), store, enabled=LLM_RATE_LIMIT_ENABLED)
+
+
+# Singleton instance
+rate_limiter = create_rate_limiter()
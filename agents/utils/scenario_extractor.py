@@ -0,0 +1,364 @@
+"""
+Scenario Extractor - LLM Çıktısından Senaryo Çıkarma
+====================================================
+LLM / crew çıktısındaki senaryo listesini tek geçişte bulur, şemaya göre
+doğrular ve bozuk JSON'u hedefli olarak onarır
+
+- Structured output: destekleyen modellerde (`STRUCTURED_OUTPUT_MODELS`)
+  yanıt `{"scenarios": [...]}` JSON şemasıyla istenir
+- Tarama: metindeki kök JSON değerleri (dizi / nesne) string ve escape
+  durumu izlenerek parantez eşleştirmeyle bulunur; markdown code block ve
+  açıklama metni atlanır. Senaryo listesi olmayan değerler (örnek diziler vb.)
+  geçilir, ilk senaryo listesi alınır
+- Onarım (sadece parse edilemeyen aday üzerinde): string içindeki kontrol
+  karakterleri, sondaki virgüller, yarıda kesilmiş çıktıda tamamlanmış
+  senaryoların kurtarılması
+- Şema: başlığı olmayan öğeler atılır; adımlar {number, action} biçimine,
+  priority / automationType izinli değerlere getirilir
+- Kaynak başına parse başarısızlık oranı, onarımlar ve parse süresi tutulur
+"""
+
+import sys
+import os
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LLM_STRUCTURED_OUTPUT
+from utils.scenario_stream import IncrementalScenarioParser
+from utils.token_counter import match_model
+
+PRIORITIES = ("HIGH", "MEDIUM", "LOW")
+AUTOMATION_TYPES = ("UI", "API", "INTEGRATION")
+
+# Prompt'lardaki senaryo alanlarıyla birebir aynı (strict şema ek alan kabul etmez)
+SCENARIO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "scenarios": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "steps": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "number": {"type": "integer"},
+                                "action": {"type": "string"}
+                            },
+                            "required": ["number", "action"],
+                            "additionalProperties": False
+                        }
+                    },
+                    "expectedResult": {"type": "string"},
+                    "priority": {"type": "string", "enum": list(PRIORITIES)},
+                    "automationType": {"type": "string", "enum": list(AUTOMATION_TYPES)}
+                },
+                "required": ["title", "description", "steps", "expectedResult", "priority", "automationType"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["scenarios"],
+    "additionalProperties": False
+}
+
+# JSON şeması (structured outputs) destekleyen modeller; diğerlerinde çıktı taranır
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4o-mini")
+
+# Kapanmayan parantez nedeniyle taramanın yeniden başlatılabileceği en fazla sayı
+MAX_RESCANS = 8
+PARSE_TIME_WINDOW = 500
+
+_STRUCTURAL = re.compile(r'[\[\]{}"\\]')
+_PAIRS = {"]": "[", "}": "{"}
+
+
+class ScenarioParseError(ValueError):
+    """Çıktıda senaryo listesi bulunamadı"""
+
+
+def response_format_for(model: Optional[str]) -> Dict[str, Any]:
+    """Model structured output destekliyorsa çağrıya eklenecek `response_format`"""
+    if not LLM_STRUCTURED_OUTPUT or not match_model(model, STRUCTURED_OUTPUT_MODELS):
+        return {}
+    return {"response_format": {
+        "type": "json_schema",
+        "json_schema": {"name": "test_scenarios", "strict": True, "schema": SCENARIO_SCHEMA}
+    }}
+
+
+def _spans(text: str, start: int = 0) -> Iterator[Tuple[int, int, bool]]:
+    """
+    `start`'tan itibaren kök JSON dizi / nesnelerinin aralıkları: (başlangıç, bitiş, kapandı mı)
+
+    Sadece yapısal karakterler gezilir; metin sonunda açık kalan değer
+    kapanmamış olarak döner.
+    """
+    stack: List[str] = []
+    in_string = False
+    skip = -1
+    opened = start
+    for match in _STRUCTURAL.finditer(text, start):
+        position = match.start()
+        char = match.group()
+        if position == skip:
+            continue
+        if in_string:
+            if char == "\\":
+                skip = position + 1
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = bool(stack)
+        elif char in "[{":
+            if not stack:
+                opened = position
+            stack.append(char)
+        elif char in "]}":
+            if not stack:
+                continue
+            if stack[-1] != _PAIRS[char]:
+                # Eşleşmeyen kapanış: aday JSON değil
+                stack.clear()
+                continue
+            stack.pop()
+            if not stack:
+                yield opened, position + 1, True
+    if stack:
+        yield opened, len(text), False
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """String dışındaki `,]` / `,}` virgüllerini kaldır"""
+    result: List[str] = []
+    in_string = escape = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ",":
+            following = text[index + 1:index + 64].lstrip()
+            if following[:1] in ("]", "}"):
+                continue
+        result.append(char)
+    return "".join(result)
+
+
+def _loads(span: str) -> Tuple[Any, Optional[str]]:
+    """Adayı parse et; olmazsa hedefli onarımları sırayla dene (değer, onarım adı)"""
+    try:
+        return json.loads(span), None
+    except ValueError:
+        pass
+    try:
+        # String içindeki ham satır sonu / tab
+        return json.loads(span, strict=False), "control_chars"
+    except ValueError:
+        pass
+    return json.loads(_strip_trailing_commas(span), strict=False), "trailing_commas"
+
+
+def _scenario_items(value: Any) -> Optional[List[Any]]:
+    """Senaryo listesi biçimindeki değerin öğeleri (değilse None)"""
+    if isinstance(value, dict):
+        if isinstance(value.get("scenarios"), list):
+            value = value["scenarios"]
+        elif "title" in value:
+            return [value]
+        else:
+            return None
+    if not isinstance(value, list):
+        return None
+    if value and not any(isinstance(item, dict) for item in value):
+        return None
+    return value
+
+
+def validate_scenario(item: Any) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Senaryoyu şemaya göre doğrula / düzelt
+
+    Returns:
+        (senaryo, düzeltilen alan sayısı); başlığı yoksa (None, 0)
+    """
+    if not isinstance(item, dict) or not isinstance(item.get("title"), str) or not item["title"].strip():
+        return None, 0
+    fixed = 0
+    scenario = dict(item)
+
+    steps = []
+    raw_steps = scenario.get("steps")
+    if not isinstance(raw_steps, list):
+        fixed += 1
+        raw_steps = []
+    for number, step in enumerate(raw_steps, 1):
+        if isinstance(step, dict) and step.get("action"):
+            if "number" not in step:
+                step = {**step, "number": number}
+                fixed += 1
+            steps.append(step)
+        elif isinstance(step, str) and step.strip():
+            steps.append({"number": number, "action": step.strip()})
+            fixed += 1
+        else:
+            fixed += 1
+    scenario["steps"] = steps
+
+    for field, allowed, default in (("priority", PRIORITIES, "MEDIUM"), ("automationType", AUTOMATION_TYPES, "UI")):
+        value = scenario.get(field)
+        normalized = value.strip().upper() if isinstance(value, str) else None
+        if normalized not in allowed:
+            normalized = default
+        if normalized != value:
+            fixed += 1
+        scenario[field] = normalized
+    return scenario, fixed
+
+
+class ParseMetrics:
+    """Kaynak (text_analysis, document_analysis, crew ...) başına parse sayaçları ve süreleri"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, source: str, mode: str, duration_ms: float, failed: bool = False, empty: bool = False,
+               repair: Optional[str] = None, dropped: int = 0, fixed: int = 0, structured: bool = False):
+        with self._lock:
+            entry = self._sources.get(source)
+            if entry is None:
+                entry = self._sources[source] = {
+                    "calls": 0, "failures": 0, "empty": 0, "structured": 0,
+                    "modes": {}, "repairs": {}, "dropped_items": 0, "fixed_fields": 0,
+                    "times": deque(maxlen=PARSE_TIME_WINDOW), "max_ms": 0.0
+                }
+            entry["calls"] += 1
+            entry["failures"] += failed
+            entry["empty"] += empty
+            entry["structured"] += structured
+            entry["modes"][mode] = entry["modes"].get(mode, 0) + 1
+            if repair:
+                entry["repairs"][repair] = entry["repairs"].get(repair, 0) + 1
+            entry["dropped_items"] += dropped
+            entry["fixed_fields"] += fixed
+            entry["times"].append(duration_ms)
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for source, entry in self._sources.items():
+                times = sorted(entry["times"])
+                result[source] = {
+                    **{key: value for key, value in entry.items() if key not in ("times", "max_ms")},
+                    "failure_rate": round(entry["failures"] / entry["calls"], 3) if entry["calls"] else 0.0,
+                    "parse_ms_avg": round(sum(times) / len(times), 3) if times else 0.0,
+                    "parse_ms_p95": round(times[min(len(times) - 1, int(len(times) * 0.95))], 3) if times else 0.0,
+                    "parse_ms_max": round(entry["max_ms"], 3)
+                }
+            return {"structured_output": LLM_STRUCTURED_OUTPUT, "sources": result}
+
+
+def _validated(items: List[Any]) -> Tuple[List[Dict[str, Any]], int, int]:
+    scenarios, dropped, fixed = [], 0, 0
+    for item in items:
+        scenario, item_fixed = validate_scenario(item)
+        if scenario is None:
+            dropped += 1
+            continue
+        scenarios.append(scenario)
+        fixed += item_fixed
+    return scenarios, dropped, fixed
+
+
+def _search(text: str) -> Tuple[Optional[List[Any]], Optional[str]]:
+    """İlk senaryo listesini (boş olmayanı tercih ederek) ve uygulanan onarımı bul"""
+    fallback: Tuple[Optional[List[Any]], Optional[str]] = (None, None)
+    position, rescans = 0, 0
+    while position < len(text) and rescans <= MAX_RESCANS:
+        next_position = len(text)
+        for start, end, closed in _spans(text, position):
+            span = text[start:end]
+            if not closed:
+                # Yarıda kesilmiş çıktı: tamamlanmış senaryoları kurtar
+                parser = IncrementalScenarioParser()
+                parser.feed(span)
+                if any(validate_scenario(item)[0] is not None for item in parser.scenarios):
+                    return parser.scenarios, "truncated"
+                # Metin içindeki kapanmayan parantez olabilir: sonrasından yeniden tara
+                next_position = start + 1
+                rescans += 1
+                break
+            try:
+                value, repair = _loads(span)
+            except ValueError:
+                continue
+            items = _scenario_items(value)
+            if items is None:
+                continue
+            if any(validate_scenario(item)[0] is not None for item in items):
+                return items, repair
+            if fallback[0] is None:
+                fallback = (items, repair)
+        position = next_position
+    return fallback
+
+
+def extract_scenarios(text: Optional[str], source: str, strict: bool = True,
+                      streamed: Optional[IncrementalScenarioParser] = None,
+                      structured: bool = False) -> List[Dict[str, Any]]:
+    """
+    LLM çıktısından doğrulanmış senaryo listesini çıkar
+
+    Args:
+        text: Ham çıktı
+        source: Metrik anahtarı (örn. "text_analysis")
+        strict: Senaryo listesi bulunamazsa ScenarioParseError fırlat (False ise [] döner)
+        streamed: Çıktıyı stream sırasında okumuş ayrıştırıcı; diziyi hatasız
+            kapatmışsa senaryoları yeniden parse edilmez
+        structured: Yanıt structured output ile istendi (metrik için)
+    """
+    started = time.perf_counter()
+    text = text or ""
+    mode, repair = "scan", None
+    if (streamed is not None and streamed.scenarios and streamed.complete
+            and not streamed.errors and len(streamed.text) == len(text)):
+        mode, items = "stream", streamed.scenarios
+    else:
+        items, repair = _search(text)
+
+    if items is None:
+        parse_metrics.record(source, mode, (time.perf_counter() - started) * 1000, failed=True, structured=structured)
+        if strict:
+            raise ScenarioParseError(f"No scenario list found in LLM output ({len(text)} chars): {text[:200]!r}")
+        print(f"⚠️ Senaryo listesi bulunamadı ({source}): {text[:200]!r}")
+        return []
+
+    scenarios, dropped, fixed = _validated(items)
+    parse_metrics.record(
+        source, mode, (time.perf_counter() - started) * 1000,
+        empty=not scenarios, repair=repair, dropped=dropped, fixed=fixed, structured=structured
+    )
+    if repair:
+        print(f"[ScenarioExtractor] {source}: output repaired ({repair}), {len(scenarios)} scenarios")
+    return scenarios
+
+
+# Singleton instance
+parse_metrics = ParseMetrics()
@@ -0,0 +1,121 @@
+"""
+Scenario Stream Parser - Artımlı Senaryo Ayrıştırıcı
+====================================================
+Stream edilen LLM çıktısındaki JSON senaryo dizisini parça parça okur ve
+her senaryo nesnesini kapanır kapanmaz döndürür
+
+Desteklenen biçimler:
+- Kök dizi: `[{...}, {...}]` (metin analizi)
+- `scenarios` anahtarlı nesne: `{"scenarios": [{...}]}` (belge analizi)
+- Markdown code block içindeki JSON (```json ... ```)
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IncrementalScenarioParser:
+    """
+    JSON token akışını karakter karakter izleyen ayrıştırıcı
+
+    String / escape durumu ve parantez derinliği tutulur; senaryo dizisinin
+    doğrudan elemanı olan bir nesne kapandığında o aralık json.loads ile
+    parse edilir. Tüm çıktı tekrar taranmaz (her karakter bir kez işlenir).
+    """
+
+    def __init__(self, array_key: str = "scenarios"):
+        self.array_key = array_key
+        self.text_parts: List[str] = []
+        self._buffer = ""
+        self._offset = 0            # _buffer'ın tüm metindeki başlangıcı
+        self._pos = 0               # Sıradaki işlenecek karakter (mutlak)
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None  # Senaryo dizisinin stack derinliği
+        self._object_start: Optional[int] = None
+        self.scenarios: List[Dict[str, Any]] = []
+        self.errors = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.text_parts)
+
+    @property
+    def complete(self) -> bool:
+        """Senaryo dizisi kapandı mı"""
+        return self._array_depth == -1
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Yeni metin parçasını işle, bu parçada tamamlanan senaryoları döndür"""
+        if not chunk:
+            return []
+        self.text_parts.append(chunk)
+        self._buffer += chunk
+        completed = []
+
+        buffer = self._buffer
+        offset = self._offset
+        for index in range(self._pos - offset, len(buffer)):
+            char = buffer[index]
+            position = offset + index
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._stack[0] == "{":
+                        # Kök nesnede olası anahtar
+                        self._last_key = buffer[self._string_start - offset + 1:index]
+                continue
+
+            if char == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = position
+            elif char in "{[":
+                if not self._stack and char == "[" and self._array_depth is None:
+                    self._array_depth = 1
+                elif (char == "[" and self._array_depth is None and len(self._stack) == 1
+                      and self._stack[0] == "{" and self._last_key == self.array_key):
+                    self._array_depth = 2
+                self._stack.append(char)
+                if char == "{" and self._array_depth is not None and len(self._stack) == self._array_depth + 1:
+                    self._object_start = position
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                if (char == "}" and self._object_start is not None
+                        and len(self._stack) == self._array_depth + 1):
+                    scenario = self._parse(buffer[self._object_start - offset:index + 1])
+                    if scenario is not None:
+                        completed.append(scenario)
+                    self._object_start = None
+                self._stack.pop()
+                if self._array_depth is not None and len(self._stack) < self._array_depth:
+                    # Senaryo dizisi kapandı; sonraki dizileri yok say
+                    self._array_depth = -1
+
+        self._pos = offset + len(buffer)
+        # Açık nesne yoksa işlenmiş metin atılır (bellek sadece açık senaryo kadar)
+        keep_from = self._object_start if self._object_start is not None else self._pos
+        if self._in_string and self._string_start is not None:
+            keep_from = min(keep_from, self._string_start)
+        self._buffer = buffer[keep_from - offset:]
+        self._offset = keep_from
+
+        self.scenarios.extend(completed)
+        return completed
+
+    def _parse(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self.errors += 1
+            return None
+        return value if isinstance(value, dict) else None
@@ -0,0 +1,698 @@
+"""
+Task Scheduler - Öncelikli Kuyruk ve Kabul Kontrolü
+==================================================
+Endpoint'lerden gelen task'ları crew tipine göre eşzamanlılık sınırı ve
+öncelik sınıfıyla başlatır
+
+- Crew tipi başına en fazla N çalışan task (örn. document_analysis=2)
+- Toplam çalışan task sınırı; boşalan slot en yüksek öncelikli task'a verilir
+- Crew tipi başına sınırlı kuyruk; doluysa `AdmissionRejected` (429 + Retry-After)
+- Bekleyen task'ların kuyruk sırası ve tahmini başlama zamanı
+- Uzun bekleyen düşük öncelikli task'lar zamanla yükselir (aging)
+- Paylaşılan durum modunda (--workers N) kuyruk SQLite `work_queue`
+  tablosundadır; sınırlar tüm worker süreçleri için geçerlidir
+"""
+
+import sys
+import os
+import asyncio
+import itertools
+import json
+import math
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_MAX_RUNNING,
+    SCHEDULER_MAX_QUEUE,
+    SCHEDULER_AGING_SECONDS,
+    SHARED_STATE,
+    SHARED_STATE_POLL_SECONDS,
+    SHARED_STATE_LEASE_SECONDS,
+    TASK_STORE_PATH
+)
+
+# Küçük değer önce çalışır
+PRIORITY_CLASSES: Dict[str, int] = {"high": 0, "normal": 1, "low": 2}
+
+# Crew tipi -> (max eşzamanlı task, varsayılan öncelik)
+DEFAULT_CREW_LIMITS: Dict[str, int] = {
+    "agent": 4,
+    "text_analysis": 4,
+    "document_analysis": 2,
+    "automation_generation": 2,
+    "test": 2,
+    "security": 2,
+    "batch": 2,
+}
+
+DEFAULT_PRIORITIES: Dict[str, str] = {
+    "agent": "high",
+    "text_analysis": "normal",
+    "automation_generation": "normal",
+    "test": "normal",
+    "security": "low",
+    "document_analysis": "low",
+    "batch": "low",
+}
+
+# Henüz ölçüm yokken kullanılan ortalama task süresi (saniye)
+DEFAULT_DURATION_SECONDS = 30.0
+
+
+class AdmissionRejected(Exception):
+    """Kuyruk dolu; istemci `retry_after` saniye sonra tekrar denemeli"""
+
+    def __init__(self, crew_type: str, retry_after: int):
+        super().__init__(f"Queue for {crew_type} is full, retry after {retry_after}s")
+        self.crew_type = crew_type
+        self.retry_after = retry_after
+
+
+def parse_concurrency_config(spec: str) -> Dict[str, int]:
+    """
+    SCHEDULER_CONCURRENCY env değerini parse et
+
+    Format: "document_analysis=2,text_analysis=6"
+    """
+    limits = dict(DEFAULT_CREW_LIMITS)
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            print(f"⚠️ Geçersiz eşzamanlılık değeri: {item}, atlanıyor")
+    return limits
+
+
+class _Entry:
+    __slots__ = ("task_id", "crew_type", "priority", "seq", "job", "args", "enqueued_at", "reported")
+
+    def __init__(self, task_id: str, crew_type: str, priority: int, seq: int, job: str, args: list):
+        self.task_id = task_id
+        self.crew_type = crew_type
+        self.priority = priority
+        self.seq = seq
+        self.job = job
+        self.args = args
+        self.enqueued_at = time.monotonic()
+        self.reported: Optional[tuple] = None
+
+
+class TaskScheduler:
+    """
+    Crew tipine göre sınırlı, öncelikli task zamanlayıcı
+
+    Tüm metodlar event loop thread'inden çağrılır. İşler isim + argüman
+    olarak kuyruğa alınır ve `runner(task_id, job, args)` ile çalıştırılır.
+    """
+
+    def __init__(self, limits: Dict[str, int], max_running: int, max_queue: int, aging_seconds: float,
+                 on_queue_change: Callable[[str, Dict[str, Any]], None] = None):
+        self.limits = limits
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.aging_seconds = aging_seconds
+        self.on_queue_change = on_queue_change
+        # Endpoint katmanında bağlanır
+        self.runner: Optional[Callable[[str, str, list], Awaitable]] = None
+        self.on_cancel_requested: Optional[Callable[[str], None]] = None
+        self.on_task_lost: Optional[Callable[[str], None]] = None
+        self._queues: Dict[str, List[_Entry]] = {}
+        self._running: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._durations: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._counters = {"admitted": 0, "rejected": 0, "dequeued": 0, "completed": 0}
+        self._wait_total = 0.0
+        self._started_total = 0
+
+    def _limit(self, crew_type: str) -> int:
+        return self.limits.get(crew_type, 1)
+
+    def _avg_duration(self, crew_type: str) -> float:
+        return self._durations.get(crew_type, DEFAULT_DURATION_SECONDS)
+
+    def _effective_priority(self, entry: _Entry, now: float) -> tuple:
+        boost = int((now - entry.enqueued_at) / self.aging_seconds) if self.aging_seconds > 0 else 0
+        return (entry.priority - boost, entry.seq)
+
+    def resolve_priority(self, crew_type: str, priority: Optional[str]) -> int:
+        """Öncelik adını sayıya çevir; geçersiz/boş ise crew tipinin varsayılanı"""
+        name = (priority or DEFAULT_PRIORITIES.get(crew_type, "normal")).lower()
+        if name not in PRIORITY_CLASSES:
+            raise ValueError(f"Invalid priority: {priority} (expected one of {', '.join(PRIORITY_CLASSES)})")
+        return PRIORITY_CLASSES[name]
+
+    def retry_after(self, crew_type: str) -> int:
+        """Kuyruktan bir task çıkana kadar tahmini süre (saniye)"""
+        return max(1, math.ceil(self._avg_duration(crew_type) / self._limit(crew_type)))
+
+    def start(self):
+        """Arka plan döngüsünü başlat (app startup); bellek modunda gerekmez"""
+
+    def submit(self, task_id: str, crew_type: str, job: str, args: list,
+               priority: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Task'ı kuyruğa al ve slot varsa hemen başlat
+
+        Args:
+            task_id: Task ID
+            crew_type: Crew tipi (eşzamanlılık sınıfı)
+            job: `runner`'ın çalıştıracağı iş adı
+            args: İş argümanları (paylaşılan modda JSON'a uygun olmalı)
+            priority: "high" | "normal" | "low" (boşsa crew varsayılanı)
+
+        Returns:
+            Kuyruk bilgisi (queue_position, estimated_start_at)
+
+        Raises:
+            AdmissionRejected: Crew kuyruğu dolu
+            ValueError: Geçersiz öncelik
+        """
+        priority_value = self.resolve_priority(crew_type, priority)
+        queue = self._queues.setdefault(crew_type, [])
+        if len(queue) >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise AdmissionRejected(crew_type, self.retry_after(crew_type))
+
+        entry = _Entry(task_id, crew_type, priority_value, next(self._seq), job, list(args))
+        queue.append(entry)
+        self._counters["admitted"] += 1
+
+        self._dispatch()
+        return self.queue_info(task_id)
+
+    def free_slots(self, crew_type: str) -> int:
+        """Crew'un boşta çalışma slotu (sınır - çalışan - kuyruktaki); kuyruk doluysa 0"""
+        running = self._running.get(crew_type, 0) + len(self._queues.get(crew_type, []))
+        return max(0, min(self._limit(crew_type) - running, self.max_running - sum(self._running.values())))
+
+    def cancel(self, task_id: str) -> bool:
+        """Henüz başlamamış task'ı kuyruktan çıkar; çalışıyorsa False"""
+        for queue in self._queues.values():
+            for entry in queue:
+                if entry.task_id == task_id:
+                    queue.remove(entry)
+                    self._counters["dequeued"] += 1
+                    self._report_positions()
+                    return True
+        return False
+
+    def _ordered(self, crew_type: str, now: float) -> List[_Entry]:
+        return sorted(self._queues.get(crew_type, []), key=lambda e: self._effective_priority(e, now))
+
+    def _dispatch(self):
+        """Boş slotları en yüksek öncelikli, sınırı dolmamış crew kuyruklarından doldur"""
+        now = time.monotonic()
+        while sum(self._running.values()) < self.max_running:
+            best = None
+            for crew_type, queue in self._queues.items():
+                if not queue or self._running.get(crew_type, 0) >= self._limit(crew_type):
+                    continue
+                candidate = min(queue, key=lambda e: self._effective_priority(e, now))
+                if best is None or self._effective_priority(candidate, now) < self._effective_priority(best, now):
+                    best = candidate
+            if best is None:
+                break
+            self._queues[best.crew_type].remove(best)
+            self._start(best, now)
+
+        self._report_positions()
+
+    def _start(self, entry: _Entry, now: float):
+        self._running[entry.crew_type] = self._running.get(entry.crew_type, 0) + 1
+        waited = now - entry.enqueued_at
+        self._wait_total += waited
+        self._started_total += 1
+
+        if self.on_queue_change:
+            self.on_queue_change(entry.task_id, {
+                "queue_position": None,
+                "estimated_start_at": None,
+                "queue_wait_ms": round(waited * 1000, 1)
+            })
+
+        task = asyncio.create_task(self._run(entry))
+        self._tasks[entry.task_id] = task
+
+    async def _run(self, entry: _Entry):
+        started = time.monotonic()
+        try:
+            await self.runner(entry.task_id, entry.job, entry.args)
+        finally:
+            duration = time.monotonic() - started
+            previous = self._durations.get(entry.crew_type)
+            # Üstel hareketli ortalama: son task'lara daha çok ağırlık
+            self._durations[entry.crew_type] = duration if previous is None else previous * 0.8 + duration * 0.2
+            self._running[entry.crew_type] -= 1
+            self._counters["completed"] += 1
+            self._tasks.pop(entry.task_id, None)
+            self._dispatch()
+
+    def queue_info(self, task_id: str) -> Dict[str, Any]:
+        """Task'ın kuyruk sırası ve tahmini başlama zamanı (başladıysa position=None)"""
+        now = time.monotonic()
+        for crew_type in self._queues:
+            ordered = self._ordered(crew_type, now)
+            for position, entry in enumerate(ordered):
+                if entry.task_id == task_id:
+                    return self._estimate(crew_type, position)
+        return {"queue_position": None, "estimated_start_at": None}
+
+    def _estimate(self, crew_type: str, position: int) -> Dict[str, Any]:
+        # Crew sınırı kadar task paralel biter; her dalga ortalama süre kadar sürer
+        limit = self._limit(crew_type)
+        free_slots = max(0, limit - self._running.get(crew_type, 0))
+        waves = 0 if position < free_slots else (position - free_slots) // limit + 1
+        wait_seconds = waves * self._avg_duration(crew_type)
+        return {
+            "queue_position": position + 1,
+            "estimated_start_at": (datetime.now() + timedelta(seconds=wait_seconds)).isoformat()
+        }
+
+    def _report_positions(self):
+        """Sırası değişen bekleyen task'ları bildir"""
+        if not self.on_queue_change:
+            return
+        now = time.monotonic()
+        for crew_type in self._queues:
+            for position, entry in enumerate(self._ordered(crew_type, now)):
+                info = self._estimate(crew_type, position)
+                key = (info["queue_position"], info["estimated_start_at"][:19])
+                if entry.reported == key:
+                    continue
+                entry.reported = key
+                self.on_queue_change(entry.task_id, info)
+
+    def stats(self) -> Dict[str, Any]:
+        crews = {}
+        for crew_type in set(self.limits) | set(self._queues):
+            crews[crew_type] = {
+                "max_concurrency": self._limit(crew_type),
+                "running": self._running.get(crew_type, 0),
+                "queued": len(self._queues.get(crew_type, [])),
+                "avg_duration_s": round(self._avg_duration(crew_type), 2)
+            }
+        return {
+            "mode": "memory",
+            "max_running": self.max_running,
+            "max_queue_per_crew": self.max_queue,
+            "running": sum(self._running.values()),
+            "queued": sum(len(q) for q in self._queues.values()),
+            "avg_queue_wait_ms": round(self._wait_total / self._started_total * 1000, 1) if self._started_total else 0.0,
+            **self._counters,
+            "crews": crews
+        }
+
+    def shutdown(self):
+        """Bekleyen task'ları düşür, çalışanları iptal et"""
+        self._queues.clear()
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+class SharedTaskScheduler(TaskScheduler):
+    """
+    Worker süreçleri arasında paylaşılan SQLite iş kuyruğu
+
+    - Endpoint'e gelen task `work_queue` tablosuna yazılır; her worker'ın
+      döngüsü boş slot oldukça sıradaki işi atomik olarak sahiplenir
+    - Crew ve toplam eşzamanlılık sınırları tablodaki `running` satırlarından
+      hesaplanır, yani tüm worker'lar için ortaktır
+    - Çalışan işler heartbeat günceller; süresi dolan (çöken worker) işler
+      `on_task_lost` ile bildirilir
+    - Başka worker'daki işin iptali `cancel_requested` bayrağıyla iletilir
+    """
+
+    def __init__(self, path: str, limits: Dict[str, int], max_running: int, max_queue: int, aging_seconds: float,
+                 poll_interval: float = 0.25, lease_seconds: float = 30.0):
+        super().__init__(limits, max_running, max_queue, aging_seconds)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.RLock()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._reported: Dict[str, tuple] = {}
+        self._last_report = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS work_queue (
+                    task_id TEXT PRIMARY KEY,
+                    crew_type TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    job TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_work_queue_status ON work_queue(status, crew_type, enqueued_at);
+                CREATE TABLE IF NOT EXISTS work_queue_durations (
+                    crew_type TEXT PRIMARY KEY,
+                    avg_seconds REAL NOT NULL
+                );
+            """)
+
+    # --- Yardımcılar ----------------------------------------------------------
+
+    def _transaction(self, fn: Callable, *args):
+        """fn'i BEGIN IMMEDIATE içinde çalıştır (süreçler arası yazma kilidi)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _running_counts(self) -> Dict[str, int]:
+        rows = self._conn.execute(
+            "SELECT crew_type, COUNT(*) AS n FROM work_queue WHERE status = 'running' GROUP BY crew_type"
+        ).fetchall()
+        return {row["crew_type"]: row["n"] for row in rows}
+
+    def _load_durations(self):
+        rows = self._conn.execute("SELECT crew_type, avg_seconds FROM work_queue_durations").fetchall()
+        self._durations = {row["crew_type"]: row["avg_seconds"] for row in rows}
+
+    def _ordered_rows(self, crew_type: str = None) -> List[sqlite3.Row]:
+        """Bekleyen işler çalışma sırasıyla (öncelik - aging, sonra geliş zamanı)"""
+        aging = self.aging_seconds if self.aging_seconds > 0 else 1e18
+        query = (
+            "SELECT * FROM work_queue WHERE status = 'queued'"
+            + (" AND crew_type = ?" if crew_type else "")
+            + " ORDER BY priority - CAST((? - enqueued_at) / ? AS INTEGER), enqueued_at"
+        )
+        params = ([crew_type] if crew_type else []) + [time.time(), aging]
+        return self._conn.execute(query, params).fetchall()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # --- Kuyruk API -------------------------------------------------------------
+
+    def start(self):
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._dispatch_loop())
+
+    def submit(self, task_id: str, crew_type: str, job: str, args: list,
+               priority: Optional[str] = None) -> Dict[str, Any]:
+        priority_value = self.resolve_priority(crew_type, priority)
+        payload = json.dumps(list(args), ensure_ascii=False)
+
+        def _insert():
+            queued = self._conn.execute(
+                "SELECT COUNT(*) FROM work_queue WHERE status = 'queued' AND crew_type = ?", (crew_type,)
+            ).fetchone()[0]
+            if queued >= self.max_queue:
+                return False
+            self._conn.execute(
+                "INSERT INTO work_queue (task_id, crew_type, priority, job, args, status, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (task_id, crew_type, priority_value, job, payload, time.time())
+            )
+            return True
+
+        if not self._transaction(_insert):
+            self._counters["rejected"] += 1
+            with self._lock:
+                self._load_durations()
+            raise AdmissionRejected(crew_type, self.retry_after(crew_type))
+
+        self._counters["admitted"] += 1
+        self._claim_available()
+        self._report_positions(force=True)
+        self._wake()
+        return self.queue_info(task_id)
+
+    def free_slots(self, crew_type: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), SUM(crew_type = ?) FROM work_queue WHERE status = 'running' "
+                "UNION ALL SELECT COUNT(*), COUNT(*) FROM work_queue WHERE status = 'queued' AND crew_type = ?",
+                (crew_type, crew_type)
+            ).fetchall()
+        (total_running, crew_running), (_, crew_queued) = row
+        return max(0, min(self._limit(crew_type) - (crew_running or 0) - crew_queued, self.max_running - total_running))
+
+    def cancel(self, task_id: str) -> bool:
+        def _cancel():
+            deleted = self._conn.execute(
+                "DELETE FROM work_queue WHERE task_id = ? AND status = 'queued'", (task_id,)
+            ).rowcount
+            if not deleted:
+                # Başka bir worker'da çalışıyor olabilir: o worker bayrağı görüp iptal eder
+                self._conn.execute(
+                    "UPDATE work_queue SET cancel_requested = 1 WHERE task_id = ? AND status = 'running'", (task_id,)
+                )
+            return bool(deleted)
+
+        dequeued = self._transaction(_cancel)
+        if dequeued:
+            self._counters["dequeued"] += 1
+            self._report_positions(force=True)
+        return dequeued
+
+    def queue_info(self, task_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT crew_type, status FROM work_queue WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row is None or row["status"] != "queued":
+                return {"queue_position": None, "estimated_start_at": None}
+            self._running = self._running_counts()
+            self._load_durations()
+            ordered = [r["task_id"] for r in self._ordered_rows(row["crew_type"])]
+        return self._estimate(row["crew_type"], ordered.index(task_id))
+
+    # --- Worker döngüsü ---------------------------------------------------------
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"Scheduler tick error: {e}")
+
+    def _tick(self):
+        now = time.time()
+
+        def _maintain():
+            # Bu worker'daki işler hâlâ canlı
+            self._conn.execute(
+                "UPDATE work_queue SET heartbeat_at = ? WHERE worker = ? AND status = 'running'",
+                (now, self.worker_id)
+            )
+            # Heartbeat'i kesilmiş işler: sahibi olan worker çökmüş
+            lost = [row["task_id"] for row in self._conn.execute(
+                "SELECT task_id FROM work_queue WHERE status = 'running' AND heartbeat_at < ?",
+                (now - self.lease_seconds,)
+            ).fetchall()]
+            if lost:
+                self._conn.execute(
+                    f"DELETE FROM work_queue WHERE task_id IN ({','.join('?' * len(lost))})", lost
+                )
+            # Başka worker'a gelen iptal istekleri
+            cancelled = [row["task_id"] for row in self._conn.execute(
+                "SELECT task_id FROM work_queue WHERE worker = ? AND status = 'running' AND cancel_requested = 1",
+                (self.worker_id,)
+            ).fetchall()]
+            if cancelled:
+                self._conn.execute(
+                    f"UPDATE work_queue SET cancel_requested = 2 WHERE task_id IN ({','.join('?' * len(cancelled))})",
+                    cancelled
+                )
+            return lost, cancelled
+
+        lost, cancelled = self._transaction(_maintain)
+        for task_id in lost:
+            print(f"⚠️ Task {task_id} sahibi worker yanıt vermiyor, hata olarak işaretleniyor")
+            if self.on_task_lost:
+                self.on_task_lost(task_id)
+        for task_id in cancelled:
+            if self.on_cancel_requested:
+                self.on_cancel_requested(task_id)
+
+        claimed = self._claim_available()
+        # Diğer worker'ların değişikliklerini de yansıtmak için sıralar periyodik güncellenir
+        self._report_positions(force=bool(claimed or lost))
+
+    def _claim_available(self) -> int:
+        """Bu worker'ın boş kapasitesi kadar iş sahiplen"""
+        claimed = 0
+        while len(self._tasks) < self.max_running:
+            row = self._transaction(self._claim_one)
+            if row is None:
+                break
+            self._start(row)
+            claimed += 1
+        return claimed
+
+    def _claim_one(self) -> Optional[sqlite3.Row]:
+        running = self._running_counts()
+        if sum(running.values()) >= self.max_running:
+            return None
+        for row in self._ordered_rows():
+            if running.get(row["crew_type"], 0) < self._limit(row["crew_type"]):
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE work_queue SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? "
+                    "WHERE task_id = ?",
+                    (self.worker_id, now, now, row["task_id"])
+                )
+                return row
+        return None
+
+    def _start(self, row: sqlite3.Row, now: float = None):
+        waited = time.time() - row["enqueued_at"]
+        self._wait_total += waited
+        self._started_total += 1
+
+        if self.on_queue_change:
+            self.on_queue_change(row["task_id"], {
+                "queue_position": None,
+                "estimated_start_at": None,
+                "queue_wait_ms": round(waited * 1000, 1),
+                "worker": self.worker_id
+            })
+        self._reported.pop(row["task_id"], None)
+
+        task = asyncio.create_task(self._run(row))
+        self._tasks[row["task_id"]] = task
+
+    async def _run(self, row: sqlite3.Row):
+        started = time.monotonic()
+        try:
+            await self.runner(row["task_id"], row["job"], json.loads(row["args"]))
+        finally:
+            duration = time.monotonic() - started
+
+            def _finish():
+                self._conn.execute("DELETE FROM work_queue WHERE task_id = ?", (row["task_id"],))
+                previous = self._conn.execute(
+                    "SELECT avg_seconds FROM work_queue_durations WHERE crew_type = ?", (row["crew_type"],)
+                ).fetchone()
+                average = duration if previous is None else previous[0] * 0.8 + duration * 0.2
+                self._conn.execute(
+                    "INSERT INTO work_queue_durations (crew_type, avg_seconds) VALUES (?, ?) "
+                    "ON CONFLICT(crew_type) DO UPDATE SET avg_seconds = excluded.avg_seconds",
+                    (row["crew_type"], average)
+                )
+
+            try:
+                self._transaction(_finish)
+            except Exception as e:
+                print(f"Scheduler finish error: {e}")
+            self._counters["completed"] += 1
+            self._tasks.pop(row["task_id"], None)
+            self._wake()
+
+    def _report_positions(self, force: bool = False):
+        if not self.on_queue_change:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_report < 2.0:
+            return
+        self._last_report = now
+
+        with self._lock:
+            self._running = self._running_counts()
+            self._load_durations()
+            rows = self._ordered_rows()
+
+        positions: Dict[str, int] = {}
+        for row in rows:
+            crew_type = row["crew_type"]
+            position = positions.get(crew_type, 0)
+            positions[crew_type] = position + 1
+            info = self._estimate(crew_type, position)
+            key = (info["queue_position"], info["estimated_start_at"][:19])
+            if self._reported.get(row["task_id"]) == key:
+                continue
+            self._reported[row["task_id"]] = key
+            self.on_queue_change(row["task_id"], info)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = self._running_counts()
+            queued = {
+                row["crew_type"]: row["n"] for row in self._conn.execute(
+                    "SELECT crew_type, COUNT(*) AS n FROM work_queue WHERE status = 'queued' GROUP BY crew_type"
+                ).fetchall()
+            }
+            self._load_durations()
+
+        crews = {}
+        for crew_type in set(self.limits) | set(queued):
+            crews[crew_type] = {
+                "max_concurrency": self._limit(crew_type),
+                "running": running.get(crew_type, 0),
+                "queued": queued.get(crew_type, 0),
+                "avg_duration_s": round(self._avg_duration(crew_type), 2)
+            }
+        return {
+            "mode": "shared",
+            "worker": self.worker_id,
+            "worker_running": len(self._tasks),
+            "max_running": self.max_running,
+            "max_queue_per_crew": self.max_queue,
+            "running": sum(running.values()),
+            "queued": sum(queued.values()),
+            "avg_queue_wait_ms": round(self._wait_total / self._started_total * 1000, 1) if self._started_total else 0.0,
+            **self._counters,
+            "crews": crews
+        }
+
+    def shutdown(self):
+        """Döngüyü durdur; bu worker'daki işler sahipsiz kalır ve lease sonunda düşer"""
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+def create_task_scheduler() -> TaskScheduler:
+    """Paylaşılan durum modunda SQLite, aksi halde bellek içi zamanlayıcı"""
+    limits = parse_concurrency_config(SCHEDULER_CONCURRENCY)
+    if SHARED_STATE:
+        return SharedTaskScheduler(
+            TASK_STORE_PATH, limits, SCHEDULER_MAX_RUNNING, SCHEDULER_MAX_QUEUE, SCHEDULER_AGING_SECONDS,
+            SHARED_STATE_POLL_SECONDS, SHARED_STATE_LEASE_SECONDS
+        )
+    return TaskScheduler(limits, SCHEDULER_MAX_RUNNING, SCHEDULER_MAX_QUEUE, SCHEDULER_AGING_SECONDS)
+
+
+# Singleton instance (runner ve callback'ler endpoint katmanında bağlanır)
+task_scheduler = create_task_scheduler()
@@ -0,0 +1,383 @@
+"""
+Similarity Index - Benzer Gereksinim Cache'i (MinHash / LSH)
+============================================================
+Daha önce analiz edilmiş gereksinim metinlerine çok benzeyen (boşluk, büyük/küçük
+harf veya birkaç kelime farkı) yeni metinler için LLM'e gitmeden kayıtlı
+senaryoları döndürür
+
+- Metin normalize edilir (küçük harf, aksan / Türkçe karakter katlama,
+  noktalama ve boşluk temizliği) ve karakter 4-gram'larına bölünür
+- MinHash imzası (NUM_PERM permütasyon) Jaccard benzerliğini tahmin eder
+- LSH (BANDS x ROWS) adayları bulur; aday imzaları numpy ile karşılaştırılır
+- Kelime değişikliği varsa eski → yeni kelimeler senaryo metinlerine uygulanır
+  (kelimeler de normalize edilerek karşılaştırılır; sadece harf farkı değişiklik sayılmaz)
+- Eklenen / silinen kelime (örn. olumsuzlama) veya senaryolara uygulanamayan
+  değişim benzerlik eşiği aşılsa da cache miss sayılır
+- Kayıtlar SQLite'ta saklanır ve açılışta indekse yüklenir
+"""
+
+import sys
+import os
+import difflib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    LLM_CACHE_PATH,
+    SIMILAR_CACHE_ENABLED,
+    SIMILAR_CACHE_THRESHOLD,
+    SIMILAR_CACHE_MAX_ENTRIES
+)
+from utils.cost_calculator import calculate_cost
+
+# 160 karakterlik metinde tek kelime değişimi ~0.85 Jaccard verir; 128 permütasyonla tahmin
+# hatası ~±0.03 kalır ve varsayılan 0.8 eşiği bu durumu yakalar
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+# Bu kadardan fazla kelime değişmişse senaryolar uyarlanmaz (olduğu gibi döner)
+MAX_ADAPT_REPLACEMENTS = 5
+
+_rng = np.random.default_rng(20240611)
+_PERM_A = _rng.integers(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_MASK = np.uint64(0xFFFFFFFF)
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Küçük harf, aksanları at (ş→s, ı→i), noktalama ve fazla boşlukları temizle"""
+    text = (text or "").replace("İ", "i").replace("I", "ı").lower().replace("ı", "i")
+    text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    text = _NON_WORD.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Normalize metnin karakter 4-gram'larının MinHash imzası (uint32[NUM_PERM])"""
+    normalized = normalize_text(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * h + b) mod 2^32: her permütasyon için tüm shingle'ların minimumu
+    permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) & _MASK
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def adapt_scenarios(old_text: str, new_text: str,
+                    scenarios: List[Dict[str, Any]]) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, str]]]:
+    """
+    Eski metinden yeni metne değişen kelimeleri senaryo metinlerine uygula
+
+    Sadece bire bir kelime değişimleri (örn. "Chrome" → "Firefox") uygulanır.
+    Eklenen / silinen kelime (örn. "must" → "must not"), farklı uzunlukta
+    değişim ya da senaryolarda hiç geçmeyen bir değişim varsa senaryolar yeni
+    metne güvenle uyarlanamaz: None döner ve çağıran cache miss sayar.
+
+    Returns:
+        (uyarlanmış senaryolar, eski → yeni kelime eşlemesi) veya None
+    """
+    old_words = _WORD.findall(old_text or "")
+    new_words = _WORD.findall(new_text or "")
+    replacements: Dict[str, str] = {}
+    matcher = difflib.SequenceMatcher(
+        a=[normalize_text(w) for w in old_words], b=[normalize_text(w) for w in new_words], autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag != "replace" or i2 - i1 != j2 - j1:
+            return None
+        for old, new in zip(old_words[i1:i2], new_words[j1:j2]):
+            if replacements.setdefault(old, new) != new:
+                return None
+    if not replacements:
+        return scenarios, {}
+    if len(replacements) > MAX_ADAPT_REPLACEMENTS:
+        return None
+
+    pattern = re.compile(r"\b(" + "|".join(re.escape(word) for word in sorted(replacements, key=len, reverse=True)) + r")\b")
+    applied = set()
+
+    def _replace(match) -> str:
+        applied.add(match.group(0))
+        return replacements[match.group(0)]
+
+    def _adapt(value):
+        if isinstance(value, str):
+            return pattern.sub(_replace, value)
+        if isinstance(value, list):
+            return [_adapt(item) for item in value]
+        if isinstance(value, dict):
+            return {key: _adapt(item) for key, item in value.items()}
+        return value
+
+    adapted = _adapt(scenarios)
+    if len(applied) < len(replacements):
+        return None
+    return adapted, replacements
+
+
+class MinHashLSHIndex:
+    """
+    Sabit kapasiteli LSH indeksi
+
+    İmzalar tek bir numpy dizisinde (slot başına bir satır), band kovaları
+    dict'lerde tutulur. Kapasite dolunca en eski slot üzerine yazılır.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.signatures = np.zeros((capacity, NUM_PERM), dtype=np.uint32)
+        self.ids: List[Optional[int]] = [None] * capacity
+        self.namespaces: List[Optional[str]] = [None] * capacity
+        self.buckets: List[Dict[bytes, set]] = [dict() for _ in range(BANDS)]
+        self._next = 0
+        self.size = 0
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray, namespace: str) -> List[bytes]:
+        prefix = namespace.encode("utf-8") + b"\0"
+        return [prefix + signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+    def add(self, entry_id: int, namespace: str, signature: np.ndarray) -> Optional[int]:
+        """İmzayı ekle; üzerine yazılan eski kaydın id'sini döndür"""
+        slot = self._next
+        evicted = self.ids[slot]
+        if evicted is not None:
+            for band, key in enumerate(self._band_keys(self.signatures[slot], self.namespaces[slot])):
+                bucket = self.buckets[band].get(key)
+                if bucket is not None:
+                    bucket.discard(slot)
+                    if not bucket:
+                        del self.buckets[band][key]
+        else:
+            self.size += 1
+
+        self.signatures[slot] = signature
+        self.ids[slot] = entry_id
+        self.namespaces[slot] = namespace
+        for band, key in enumerate(self._band_keys(signature, namespace)):
+            self.buckets[band].setdefault(key, set()).add(slot)
+        self._next = (slot + 1) % self.capacity
+        return evicted
+
+    def query(self, namespace: str, signature: np.ndarray) -> Optional[Tuple[int, float]]:
+        """En benzer kaydın (id, tahmini Jaccard benzerliği); aday yoksa None"""
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature, namespace)):
+            bucket = self.buckets[band].get(key)
+            if bucket:
+                candidates.update(bucket)
+        if not candidates:
+            return None
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self.signatures[slots] == signature).mean(axis=1)
+        best = int(similarities.argmax())
+        return self.ids[int(slots[best])], float(similarities[best])
+
+
+@dataclass
+class SimilarMatch:
+    entry_id: int
+    similarity: float
+    task_id: Optional[str]
+    scenarios: List[Dict[str, Any]]
+    replacements: Dict[str, str]
+    model: Optional[str]
+
+
+class RequirementSimilarityCache:
+    """
+    Analiz edilmiş gereksinim metinleri için benzerlik cache'i
+
+    Bellekte sadece imzalar tutulur; metin ve senaryolar eşleşme olunca
+    SQLite'tan okunur.
+    """
+
+    def __init__(self, path: Optional[str], threshold: float = 0.9, max_entries: int = 100000, enabled: bool = True):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.index = MinHashLSHIndex(max_entries if enabled else 1)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory_rows: Dict[int, Dict[str, Any]] = {}
+        self._ids = 0
+        self.counters = {"hits": 0, "misses": 0, "adapted": 0, "unadaptable": 0, "added": 0, "tokens_saved": 0,
+                         "dollars_saved": 0.0}
+        self._lookup_us: List[float] = []
+        if enabled and path:
+            self._open(path)
+
+    def _open(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS requirement_index (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    namespace TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    requirement_text TEXT NOT NULL,
+                    scenarios TEXT NOT NULL,
+                    task_id TEXT,
+                    model TEXT,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    created_at REAL NOT NULL
+                );
+            """)
+            rows = self._conn.execute(
+                "SELECT id, namespace, signature, requirement_text FROM requirement_index ORDER BY id DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            stale = []
+            for entry_id, namespace, signature, requirement_text in reversed(rows):
+                signature = np.frombuffer(signature, dtype=np.uint32)
+                if len(signature) != NUM_PERM:
+                    # Farklı NUM_PERM / shingle ayarıyla kaydedilmiş imza: metinden yeniden hesapla
+                    signature = minhash_signature(requirement_text)
+                    stale.append((signature.tobytes(), entry_id))
+                self.index.add(entry_id, namespace, signature)
+            if stale:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("UPDATE requirement_index SET signature = ? WHERE id = ?", stale)
+                self._conn.execute("COMMIT")
+            if len(rows) == self.max_entries:
+                # Kapasiteye sığmayan eski kayıtlar
+                self._conn.execute("DELETE FROM requirement_index WHERE id < ?", (rows[-1][0],))
+        except sqlite3.Error as e:
+            print(f"⚠️ Benzerlik indeksi diski açılamadı ({path}): {e}, sadece bellek kullanılacak")
+            self._conn = None
+
+    def _load(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return self._memory_rows.get(entry_id)
+        row = self._conn.execute(
+            "SELECT requirement_text, scenarios, task_id, model, input_tokens, output_tokens "
+            "FROM requirement_index WHERE id = ?", (entry_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "requirement_text": row[0],
+            "scenarios": json.loads(row[1]),
+            "task_id": row[2],
+            "model": row[3],
+            "input_tokens": row[4] or 0,
+            "output_tokens": row[5] or 0
+        }
+
+    def lookup(self, requirement_text: str, namespace: str = "text_analysis") -> Optional[SimilarMatch]:
+        """Eşik üstünde benzer kayıt varsa (uyarlanmış) senaryolarını döndür"""
+        if not self.enabled or not requirement_text:
+            return None
+        started = time.perf_counter()
+        signature = minhash_signature(requirement_text)
+        with self._lock:
+            found = self.index.query(namespace, signature)
+            self._lookup_us.append((time.perf_counter() - started) * 1_000_000)
+            del self._lookup_us[:-1000]
+            if found is None or found[1] < self.threshold:
+                self.counters["misses"] += 1
+                return None
+            row = self._load(found[0])
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+
+            adapted = adapt_scenarios(row["requirement_text"], requirement_text, row["scenarios"])
+            if adapted is None:
+                self.counters["misses"] += 1
+                self.counters["unadaptable"] += 1
+                return None
+            scenarios, replacements = adapted
+            self.counters["hits"] += 1
+            if replacements:
+                self.counters["adapted"] += 1
+            self.counters["tokens_saved"] += row["input_tokens"] + row["output_tokens"]
+            if row["model"]:
+                self.counters["dollars_saved"] += calculate_cost(row["model"], row["input_tokens"], row["output_tokens"])
+        return SimilarMatch(found[0], round(found[1], 4), row["task_id"], scenarios, replacements, row["model"])
+
+    def add(self, requirement_text: str, scenarios: List[Dict[str, Any]], task_id: str = None,
+            usage: Dict[str, Any] = None, namespace: str = "text_analysis"):
+        """Başarılı analizi indekse ekle"""
+        if not self.enabled or not requirement_text or not scenarios:
+            return
+        usage = usage or {}
+        signature = minhash_signature(requirement_text)
+        row = {
+            "requirement_text": requirement_text,
+            "scenarios": scenarios,
+            "task_id": task_id,
+            "model": usage.get("model"),
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0)
+        }
+        with self._lock:
+            if self._conn is not None:
+                entry_id = self._conn.execute(
+                    "INSERT INTO requirement_index (namespace, signature, requirement_text, scenarios, task_id, model, "
+                    "input_tokens, output_tokens, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (namespace, signature.tobytes(), requirement_text, json.dumps(scenarios, ensure_ascii=False),
+                     task_id, row["model"], row["input_tokens"], row["output_tokens"], time.time())
+                ).lastrowid
+            else:
+                self._ids += 1
+                entry_id = self._ids
+                self._memory_rows[entry_id] = row
+
+            evicted = self.index.add(entry_id, namespace, signature)
+            if evicted is not None:
+                if self._conn is not None:
+                    self._conn.execute("DELETE FROM requirement_index WHERE id = ?", (evicted,))
+                else:
+                    self._memory_rows.pop(evicted, None)
+            self.counters["added"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            lookup_us = sorted(self._lookup_us)
+            size = self.index.size
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": size,
+            "max_entries": self.max_entries,
+            **counters,
+            "dollars_saved": round(counters["dollars_saved"], 6),
+            "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "lookup_p50_us": round(lookup_us[len(lookup_us) // 2], 1) if lookup_us else 0.0,
+            "lookup_p99_us": round(lookup_us[min(len(lookup_us) - 1, int(len(lookup_us) * 0.99))], 1) if lookup_us else 0.0
+        }
+
+
+# Singleton instance
+requirement_cache = RequirementSimilarityCache(
+    LLM_CACHE_PATH,
+    threshold=SIMILAR_CACHE_THRESHOLD,
+    max_entries=SIMILAR_CACHE_MAX_ENTRIES,
+    enabled=SIMILAR_CACHE_ENABLED
+)
@@ -0,0 +1,706 @@
+"""
+Task Store - Görev Kayıt Deposu
+===============================
+Task kayıtları için sınırlı ve kalıcı depolama katmanı
+
+Katmanlar:
+- MemoryTaskStore: LRU + TTL ile sınırlı in-memory depo
+- SQLiteTaskStore: WAL modunda yerel SQLite, büyük sonuçlar ayrı tabloda
+- TieredTaskStore: Sıcak kayıtlar bellekte, her şey diskte (write-through)
+"""
+
+import sys
+import os
+import json
+import base64
+import bisect
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    TASK_STORE_BACKEND,
+    TASK_STORE_PATH,
+    TASK_MEMORY_MAX_ENTRIES,
+    TASK_MEMORY_TTL_SECONDS,
+    TASK_RESULT_INLINE_BYTES,
+    TASK_RETENTION_HOURS,
+    TASK_STORE_MAX_TASKS,
+    SHARED_STATE
+)
+
+# Bu durumlardaki task'lar artık değişmez, tahliye/silme için uygundur
+FINISHED_STATUSES = ("completed", "error", "cancelled")
+
+# Ayrı kolon olarak tutulan (indekslenen) alanlar
+INDEXED_FIELDS = ("id", "crew_type", "agent_type", "status", "created_at", "updated_at")
+
+
+# Sayfalama limitleri
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat()
+
+
+def encode_cursor(created_at: str, task_id: str) -> str:
+    """Sayfalama cursor'ı: son kaydın (created_at, id) anahtarı"""
+    raw = json.dumps([created_at, task_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Cursor'ı çöz; geçersizse ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(created_at), str(task_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _page_response(items: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"]) if has_more and items else None
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+class TaskStore:
+    """Task deposu arayüzü"""
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, task_id: str) -> bool:
+        raise NotImplementedError
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def list_page(self, status: str = None, crew_type: str = None, since: str = None, until: str = None,
+                  cursor: str = None, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        Task özetlerini (result olmadan) yeniden eskiye sayfalı listele
+
+        Args:
+            status: Durum filtresi
+            crew_type: Crew tipi filtresi
+            since: created_at >= since (ISO)
+            until: created_at < until (ISO)
+            cursor: Önceki sayfanın next_cursor değeri
+            limit: Sayfa boyutu
+
+        Returns:
+            {"items": [...], "next_cursor": str | None, "has_more": bool}
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Retention politikasına göre eski task'ları sil, silinen sayısını döndür"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "tasks": self.count()}
+
+    def close(self):
+        pass
+
+    def exists(self, task_id: str) -> bool:
+        return self.get(task_id) is not None
+
+    def get_result(self, task_id: str) -> Any:
+        task = self.get(task_id)
+        return task.get("result") if task else None
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    LRU + TTL sınırlı in-memory depo
+
+    - Kapasite aşılınca en eski erişilen *bitmiş* task tahliye edilir
+      (pending/running task'lar asla tahliye edilmez)
+    - Bitmiş task'lar TTL dolunca silinir
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+        # İkincil indeksler: (created_at, id) anahtarlarının sıralı listeleri
+        self._by_created: List[Tuple[str, str]] = []
+        self._by_status: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_crew_type: Dict[str, List[Tuple[str, str]]] = {}
+
+    @staticmethod
+    def _key(task: Dict[str, Any]) -> Tuple[str, str]:
+        return (task.get("created_at") or "", task["id"])
+
+    @staticmethod
+    def _sorted_remove(keys: List[Tuple[str, str]], key: Tuple[str, str]):
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            keys.pop(index)
+
+    def _index_add(self, task: Dict[str, Any]):
+        key = self._key(task)
+        bisect.insort(self._by_created, key)
+        bisect.insort(self._by_status.setdefault(task.get("status"), []), key)
+        bisect.insort(self._by_crew_type.setdefault(task.get("crew_type"), []), key)
+
+    def _index_remove(self, task: Dict[str, Any]):
+        key = self._key(task)
+        self._sorted_remove(self._by_created, key)
+        self._sorted_remove(self._by_status.get(task.get("status"), []), key)
+        self._sorted_remove(self._by_crew_type.get(task.get("crew_type"), []), key)
+
+    def _is_expired(self, task_id: str) -> bool:
+        expires_at = self._expires.get(task_id)
+        return expires_at is not None and expires_at <= time.monotonic()
+
+    def _touch_expiry(self, task_id: str, status: Optional[str]):
+        if status in FINISHED_STATUSES and self.ttl_seconds > 0:
+            self._expires[task_id] = time.monotonic() + self.ttl_seconds
+        else:
+            self._expires.pop(task_id, None)
+
+    def _evict(self):
+        # Kapasite aşımında en eski bitmiş task'tan başla
+        if len(self._tasks) <= self.max_entries:
+            return
+        for task_id in list(self._tasks.keys()):
+            if len(self._tasks) <= self.max_entries:
+                break
+            if self._tasks[task_id].get("status") in FINISHED_STATUSES:
+                self._remove(task_id)
+                self.evictions += 1
+
+    def _remove(self, task_id: str) -> bool:
+        self._expires.pop(task_id, None)
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return False
+        self._index_remove(task)
+        return True
+
+    def put(self, task: Dict[str, Any]):
+        """Kaydı olduğu gibi yerleştir (tiered store önbelleği için)"""
+        with self._lock:
+            previous = self._tasks.get(task["id"])
+            if previous is not None:
+                self._index_remove(previous)
+            self._tasks[task["id"]] = task
+            self._index_add(task)
+            self._tasks.move_to_end(task["id"])
+            self._touch_expiry(task["id"], task.get("status"))
+            self._evict()
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        task = dict(task)
+        task.setdefault("created_at", _now_iso())
+        task.setdefault("updated_at", task["created_at"])
+        self.put(task)
+        return dict(task)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if task_id not in self._tasks:
+                return None
+            if self._is_expired(task_id):
+                self._remove(task_id)
+                return None
+            self._tasks.move_to_end(task_id)
+            return dict(self._tasks[task_id])
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            self._index_remove(task)
+            task.update(fields)
+            task["updated_at"] = _now_iso()
+            self._index_add(task)
+            self._tasks.move_to_end(task_id)
+            self._touch_expiry(task_id, task.get("status"))
+            self._evict()
+            return dict(task)
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            return self._remove(task_id)
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        self.purge_expired()
+        with self._lock:
+            return [dict(task) for task in self._tasks.values()]
+
+    def list_page(self, status: str = None, crew_type: str = None, since: str = None, until: str = None,
+                  cursor: str = None, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        upper = decode_cursor(cursor) if cursor else None
+
+        with self._lock:
+            # En seçici indeksi seç, diğer filtreleri satır bazında uygula
+            candidates = [self._by_created]
+            if status is not None:
+                candidates.append(self._by_status.get(status, []))
+            if crew_type is not None:
+                candidates.append(self._by_crew_type.get(crew_type, []))
+            keys = min(candidates, key=len)
+
+            # Üst sınır: cursor (hariç) ve until (hariç)
+            end = len(keys)
+            if upper is not None:
+                end = bisect.bisect_left(keys, upper, 0, end)
+            if until:
+                end = bisect.bisect_left(keys, (until, ""), 0, end)
+            start = bisect.bisect_left(keys, (since, "")) if since else 0
+
+            now = time.monotonic()
+            items = []
+            for index in range(end - 1, start - 1, -1):
+                task = self._tasks.get(keys[index][1])
+                if task is None:
+                    continue
+                if self._expires.get(task["id"], now + 1) <= now:
+                    continue
+                if status is not None and task.get("status") != status:
+                    continue
+                if crew_type is not None and task.get("crew_type") != crew_type:
+                    continue
+                items.append({k: v for k, v in task.items() if k != "result"})
+                if len(items) > limit:
+                    break
+
+        return _page_response(items, limit)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            expired = [task_id for task_id, expires_at in self._expires.items() if expires_at <= now]
+            for task_id in expired:
+                self._remove(task_id)
+            return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "tasks": len(self._tasks),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions
+            }
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Yerel SQLite (WAL) task deposu
+
+    - Task meta verisi `tasks` tablosunda, status/crew_type/created_at indeksli
+    - Büyük sonuçlar (`result`) ayrı `task_results` tablosunda tutulur
+    - Retention: bitmiş task'lar `retention_hours` sonra, toplam kayıt
+      `max_tasks` üzerine çıkınca en eskileri silinir
+    """
+
+    def __init__(self, path: str, retention_hours: float = 72, max_tasks: int = 100000):
+        self.path = path
+        self.retention_hours = retention_hours
+        self.max_tasks = max_tasks
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    crew_type TEXT,
+                    agent_type TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    data TEXT NOT NULL DEFAULT '{}'
+                );
+                CREATE TABLE IF NOT EXISTS task_results (
+                    task_id TEXT PRIMARY KEY,
+                    result TEXT,
+                    size INTEGER NOT NULL DEFAULT 0
+                );
+                DROP INDEX IF EXISTS idx_tasks_status;
+                DROP INDEX IF EXISTS idx_tasks_crew_type;
+                DROP INDEX IF EXISTS idx_tasks_created_at;
+                CREATE INDEX IF NOT EXISTS idx_tasks_status_page ON tasks(status, created_at, id);
+                CREATE INDEX IF NOT EXISTS idx_tasks_crew_type_page ON tasks(crew_type, created_at, id);
+                CREATE INDEX IF NOT EXISTS idx_tasks_crew_status_page ON tasks(crew_type, status, created_at, id);
+                CREATE INDEX IF NOT EXISTS idx_tasks_created_page ON tasks(created_at, id);
+            """)
+
+    @staticmethod
+    def _split(task: Dict[str, Any]):
+        """Task'ı kolonlar, ekstra alanlar ve sonuç olarak ayır"""
+        columns = {field: task.get(field) for field in INDEXED_FIELDS}
+        extra = {k: v for k, v in task.items() if k not in INDEXED_FIELDS and k != "result"}
+        return columns, extra
+
+    def _row_to_task(self, row: sqlite3.Row, result: Any = None, with_result: bool = True) -> Dict[str, Any]:
+        task = json.loads(row["data"] or "{}")
+        for field in INDEXED_FIELDS:
+            if row[field] is not None:
+                task[field] = row[field]
+        if with_result:
+            task["result"] = result
+        return task
+
+    def _load_result(self, task_id: str) -> Any:
+        row = self._conn.execute("SELECT result FROM task_results WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None or row["result"] is None:
+            return None
+        return json.loads(row["result"])
+
+    def _write_result(self, task_id: str, result: Any) -> int:
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        self._conn.execute(
+            "INSERT INTO task_results (task_id, result, size) VALUES (?, ?, ?) "
+            "ON CONFLICT(task_id) DO UPDATE SET result = excluded.result, size = excluded.size",
+            (task_id, payload, len(payload))
+        )
+        return len(payload)
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        task = dict(task)
+        task.setdefault("created_at", _now_iso())
+        task.setdefault("updated_at", task["created_at"])
+        columns, extra = self._split(task)
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tasks (id, crew_type, agent_type, status, created_at, updated_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (columns["id"], columns["crew_type"], columns["agent_type"], columns["status"],
+                     columns["created_at"], columns["updated_at"], json.dumps(extra, ensure_ascii=False, default=str))
+                )
+                if task.get("result") is not None:
+                    self._write_result(task["id"], task["result"])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return task
+
+    def get(self, task_id: str, with_result: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            result = self._load_result(task_id) if with_result else None
+            return self._row_to_task(row, result, with_result)
+
+    def get_result(self, task_id: str) -> Any:
+        with self._lock:
+            return self._load_result(task_id)
+
+    def result_size(self, task_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM task_results WHERE task_id = ?", (task_id,)).fetchone()
+            return row["size"] if row else 0
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            # IMMEDIATE: oku-değiştir-yaz diğer worker süreçlerine karşı da atomik
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+
+                task = self._row_to_task(row, with_result=False)
+                result_changed = "result" in fields
+                result = fields.pop("result", None)
+                task.update(fields)
+                task["updated_at"] = _now_iso()
+                columns, extra = self._split(task)
+
+                self._conn.execute(
+                    "UPDATE tasks SET crew_type = ?, agent_type = ?, status = ?, updated_at = ?, data = ? WHERE id = ?",
+                    (columns["crew_type"], columns["agent_type"], columns["status"], columns["updated_at"],
+                     json.dumps(extra, ensure_ascii=False, default=str), task_id)
+                )
+                if result_changed:
+                    self._write_result(task_id, result)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            task["result"] = result if result_changed else self._load_result(task_id)
+            return task
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            self._conn.execute("DELETE FROM task_results WHERE task_id = ?", (task_id,))
+            cursor = self._conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            return cursor.rowcount > 0
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks ORDER BY created_at").fetchall()
+            return [self._row_to_task(row, self._load_result(row["id"])) for row in rows]
+
+    def list_page(self, status: str = None, crew_type: str = None, since: str = None, until: str = None,
+                  cursor: str = None, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses, params = [], []
+
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if crew_type is not None:
+            clauses.append("crew_type = ?")
+            params.append(crew_type)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            created_at, task_id = decode_cursor(cursor)
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend([created_at, task_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT * FROM tasks {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit + 1)).fetchall()
+
+        items = [self._row_to_task(row, with_result=False) for row in rows]
+        return _page_response(items, limit)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def purge_expired(self) -> int:
+        return len(self.purge_expired_ids())
+
+    def purge_expired_ids(self) -> List[str]:
+        """Retention politikasına göre eski task'ları sil, silinen id'leri döndür"""
+        placeholders = ",".join("?" for _ in FINISHED_STATUSES)
+        expired: List[str] = []
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if self.retention_hours > 0:
+                    cutoff = (datetime.now() - timedelta(hours=self.retention_hours)).isoformat()
+                    expired += [row[0] for row in self._conn.execute(
+                        f"SELECT id FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+                        (*FINISHED_STATUSES, cutoff)
+                    )]
+
+                overflow = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - len(expired) - self.max_tasks
+                if self.max_tasks > 0 and overflow > 0:
+                    skip = set(expired)
+                    candidates = self._conn.execute(
+                        f"SELECT id FROM tasks WHERE status IN ({placeholders}) ORDER BY created_at",
+                        FINISHED_STATUSES
+                    )
+                    for (task_id,) in candidates:
+                        if overflow <= 0:
+                            break
+                        if task_id not in skip:
+                            expired.append(task_id)
+                            overflow -= 1
+
+                self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in expired])
+                # Sahipsiz sonuçları temizle
+                self._conn.execute("DELETE FROM task_results WHERE task_id NOT IN (SELECT id FROM tasks)")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status = {
+                row["status"]: row["n"]
+                for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status")
+            }
+            result_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM task_results").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "tasks": sum(by_status.values()),
+            "by_status": by_status,
+            "result_bytes": result_bytes,
+            "retention_hours": self.retention_hours,
+            "max_tasks": self.max_tasks
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredTaskStore(TaskStore):
+    """
+    Bellek + SQLite katmanlı depo
+
+    Tüm yazmalar diske gider (write-through). Bellekte yalnızca sıcak
+    kayıtlar tutulur; `inline_limit` byte'tan büyük sonuçlar bellekte
+    tutulmaz, istendiğinde diskten okunur.
+    """
+
+    def __init__(self, memory: MemoryTaskStore, disk: SQLiteTaskStore, inline_limit: int = 64 * 1024):
+        self.memory = memory
+        self.disk = disk
+        self.inline_limit = inline_limit
+        self.hits = 0
+        self.misses = 0
+
+    def _cache(self, task: Dict[str, Any]):
+        task = dict(task)
+        result = task.get("result")
+        if result is not None:
+            size = len(json.dumps(result, ensure_ascii=False, default=str))
+            if size > self.inline_limit:
+                # Büyük sonuç sadece diskte kalsın
+                task["result"] = None
+                task["_result_on_disk"] = True
+        self.memory.put(task)
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        task = self.disk.create(task)
+        self._cache(task)
+        return task
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task = self.memory.get(task_id)
+        if task is not None:
+            self.hits += 1
+            if task.pop("_result_on_disk", False):
+                task["result"] = self.disk.get_result(task_id)
+            return task
+
+        self.misses += 1
+        task = self.disk.get(task_id)
+        if task is not None:
+            self._cache(task)
+        return task
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        task = self.disk.update(task_id, **fields)
+        if task is not None:
+            self._cache(task)
+        return task
+
+    def delete(self, task_id: str) -> bool:
+        self.memory.delete(task_id)
+        return self.disk.delete(task_id)
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        return self.disk.list_all()
+
+    def list_page(self, **filters) -> Dict[str, Any]:
+        # Listeleme her zaman indeksli disk katmanından
+        return self.disk.list_page(**filters)
+
+    def count(self) -> int:
+        return self.disk.count()
+
+    def purge_expired(self) -> int:
+        self.memory.purge_expired()
+        # Diskten silinenler bellek katmanından da çıkar (aksi halde get() döndürmeye devam eder)
+        expired = self.disk.purge_expired_ids()
+        for task_id in expired:
+            self.memory.delete(task_id)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "tiered",
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats(),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "inline_limit": self.inline_limit
+        }
+
+    def close(self):
+        self.disk.close()
+
+
+def create_task_store(backend: str = TASK_STORE_BACKEND) -> TaskStore:
+    """
+    Konfigürasyona göre task deposu oluştur
+
+    Args:
+        backend: "memory", "sqlite" veya "tiered"
+
+    Returns:
+        TaskStore instance
+    """
+    backend = (backend or "tiered").lower()
+
+    if SHARED_STATE and backend != "sqlite":
+        # Bellek katmanı süreçler arası tutarsız olur: tüm worker'lar doğrudan diske yazar/okur
+        print(f"ℹ️ Paylaşılan durum modu: TASK_STORE_BACKEND={backend} yerine 'sqlite' kullanılıyor")
+        backend = "sqlite"
+
+    if backend == "memory":
+        return MemoryTaskStore(TASK_MEMORY_MAX_ENTRIES, TASK_MEMORY_TTL_SECONDS)
+
+    disk = SQLiteTaskStore(TASK_STORE_PATH, TASK_RETENTION_HOURS, TASK_STORE_MAX_TASKS)
+    if backend == "sqlite":
+        return disk
+
+    if backend != "tiered":
+        print(f"⚠️ Bilinmeyen TASK_STORE_BACKEND: {backend}, 'tiered' kullanılıyor")
+
+    # Bellek katmanı disk önbelleği: TTL sadece bellekten çıkarır, kayıt diskte kalır
+    memory = MemoryTaskStore(TASK_MEMORY_MAX_ENTRIES, TASK_MEMORY_TTL_SECONDS)
+    return TieredTaskStore(memory, disk, TASK_RESULT_INLINE_BYTES)
+
+
+# Singleton instance
+task_store = create_task_store()
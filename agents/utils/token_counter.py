@@ -0,0 +1,218 @@
+"""
+Token Counter - Prompt Token Sayımı
+===================================
+MODEL_PRICING'deki her model için prompt token sayısı ve bağlam penceresi
+
+- OpenAI modelleri: tiktoken (o200k_base / cl100k_base). Encoding dosyaları
+  TOKENIZER_CACHE_DIR'dan okunur; dosya orada yoksa tiktoken ilk kullanımda
+  indirmeyi dener (ağ erişimi). Çevrimdışı ortamda indirme hatası
+  (ConnectionError) sonrası o encoding için bir daha denenmez
+- tiktoken yoksa, encoding yüklenemediyse (ve Gemini modelleri için):
+  kelime parçası sayan yaklaşık sayaç. Türkçe gibi eklemeli dillerde
+  "4 karakter = 1 token" varsayımından çok daha isabetlidir
+- MB boyutlu metinler parçalara bölünüp tiktoken'ın çok thread'li batch
+  encode'u ile sayılır; aynı metnin tekrar sayımı cache'ten döner
+- fit_to_context: bağlam penceresine sığmayan metni token sınırından kırpar
+"""
+
+import sys
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TOKENIZER_CACHE_DIR
+
+# tiktoken encoding dosyalarını bu dizinden okur (yoksa indirmeye çalışır)
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", TOKENIZER_CACHE_DIR)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Model -> (tiktoken encoding, bağlam penceresi). Encoding None ise yaklaşık sayaç kullanılır.
+MODEL_TOKENIZERS: Dict[str, Tuple[Optional[str], int]] = {
+    "gpt-4o": ("o200k_base", 128000),
+    "gpt-4o-mini": ("o200k_base", 128000),
+    "gpt-4-turbo": ("cl100k_base", 128000),
+    "gpt-4": ("cl100k_base", 8192),
+    "gpt-3.5-turbo": ("cl100k_base", 16385),
+    "gemini-pro": (None, 32760),
+    "gemini-1.5-pro": (None, 2097152),
+    "gemini-1.5-flash": (None, 1048576),
+}
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Chat formatının mesaj başına ve yanıt başlangıcı için eklediği token'lar
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Bu boyuttan büyük metinler parçalanıp paralel encode edilir
+PARALLEL_THRESHOLD_CHARS = 256 * 1024
+SEGMENT_CHARS = 64 * 1024
+COUNT_CACHE_ENTRIES = 256
+
+# Yaklaşık sayaç: ASCII kelimeler ~6 harfte, ASCII dışı harf içeren (Türkçe)
+# kelimeler ~3 harfte bir token; sayılar 3 hanede bir; her noktalama ve satır sonu bir token
+_APPROX_PIECE = re.compile(r"[A-Za-z]{1,6}|[^\W\d_]{1,3}|\d{1,3}|[^\w\s]|\n")
+_SEGMENT_BREAK = re.compile(r"\s")
+
+
+def match_model(model_name: str, names) -> Optional[str]:
+    """Model adına uyan en uzun anahtar ("gpt-4o-mini-2024-07-18" -> "gpt-4o-mini", "gpt-4o" değil)"""
+    normalized = (model_name or "").lower()
+    matches = [name for name in names if name in normalized]
+    return max(matches, key=len) if matches else None
+
+
+def _model_entry(model_name: Optional[str]) -> Tuple[Optional[str], int]:
+    return MODEL_TOKENIZERS[match_model(model_name or DEFAULT_MODEL, MODEL_TOKENIZERS) or DEFAULT_MODEL]
+
+
+def context_window(model_name: Optional[str]) -> int:
+    """Modelin toplam (girdi + çıktı) bağlam penceresi"""
+    return _model_entry(model_name)[1]
+
+
+def approximate_tokens(text: str) -> int:
+    """Tokenizer olmadan kelime parçası sayarak yaklaşık token sayısı"""
+    if not text:
+        return 0
+    return len(_APPROX_PIECE.findall(text))
+
+
+def _segments(text: str) -> List[str]:
+    """Metni boşluk sınırından SEGMENT_CHARS büyüklüğünde parçalara böl"""
+    segments, start = [], 0
+    while start < len(text):
+        end = min(start + SEGMENT_CHARS, len(text))
+        if end < len(text):
+            match = _SEGMENT_BREAK.search(text, end)
+            end = match.start() if match and match.start() - end < 1024 else end
+        segments.append(text[start:end])
+        start = end
+    return segments
+
+
+class TokenCounter:
+    """Encoding'leri bir kez yükleyen, sonuçları cache'leyen thread-safe sayaç"""
+
+    def __init__(self, cache_entries: int = COUNT_CACHE_ENTRIES):
+        self._lock = threading.Lock()
+        self._encodings: Dict[str, Any] = {}
+        self._failed: set = set()
+        self._cache: "OrderedDict[Tuple[Optional[str], int, int], int]" = OrderedDict()
+        self._cache_entries = cache_entries
+        self.counters = {"exact": 0, "approximate": 0, "cache_hits": 0, "chars": 0}
+
+    def encoding(self, name: Optional[str]):
+        """tiktoken encoding'i (yüklenemezse None)"""
+        if name is None or not TIKTOKEN_AVAILABLE or name in self._failed:
+            return None
+        with self._lock:
+            if name not in self._encodings and name not in self._failed:
+                try:
+                    self._encodings[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    self._failed.add(name)
+                    print(f"⚠️ Tokenizer '{name}' yüklenemedi ({type(e).__name__}), yaklaşık token sayımı kullanılacak. "
+                          f"Encoding dosyalarını {TOKENIZER_CACHE_DIR} dizinine koyun.")
+            return self._encodings.get(name)
+
+    def exact(self, model_name: Optional[str]) -> bool:
+        """Model için gerçek tokenizer kullanılıyor mu"""
+        return self.encoding(_model_entry(model_name)[0]) is not None
+
+    def count(self, text: str, model_name: Optional[str] = None) -> int:
+        """Metnin model tokenizer'ına göre token sayısı"""
+        if not text:
+            return 0
+        encoding_name = _model_entry(model_name)[0]
+        key = (encoding_name, hash(text), len(text))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                return cached
+
+        encoding = self.encoding(encoding_name)
+        if encoding is None:
+            tokens = approximate_tokens(text)
+        elif len(text) > PARALLEL_THRESHOLD_CHARS:
+            # tiktoken batch encode'u GIL'i bırakır: segmentler paralel sayılır
+            tokens = sum(len(ids) for ids in encoding.encode_ordinary_batch(_segments(text)))
+        else:
+            tokens = len(encoding.encode_ordinary(text))
+
+        with self._lock:
+            self.counters["exact" if encoding is not None else "approximate"] += 1
+            self.counters["chars"] += len(text)
+            self._cache[key] = tokens
+            if len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict[str, Any]], model_name: Optional[str] = None) -> int:
+        """Chat mesajlarının prompt token sayısı (mesaj formatı ek token'ları dahil)"""
+        total = TOKENS_PER_REPLY
+        for message in messages or []:
+            total += TOKENS_PER_MESSAGE
+            for value in message.values():
+                if isinstance(value, str):
+                    total += self.count(value, model_name)
+        return total
+
+    def truncate(self, text: str, max_tokens: int, model_name: Optional[str] = None) -> str:
+        """Metni baştan en fazla `max_tokens` token kalacak şekilde kırp"""
+        if max_tokens <= 0:
+            return ""
+        encoding = self.encoding(_model_entry(model_name)[0])
+        if encoding is not None:
+            ids = encoding.encode_ordinary(text)
+            return text if len(ids) <= max_tokens else encoding.decode(ids[:max_tokens])
+        pieces = 0
+        for match in _APPROX_PIECE.finditer(text):
+            pieces += 1
+            if pieces > max_tokens:
+                return text[:match.start()]
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tiktoken": TIKTOKEN_AVAILABLE,
+                "cache_dir": os.environ.get("TIKTOKEN_CACHE_DIR"),
+                "models": {
+                    name: {
+                        "encoding": encoding_name,
+                        "context_window": window,
+                        "exact": encoding_name in self._encodings
+                    }
+                    for name, (encoding_name, window) in MODEL_TOKENIZERS.items()
+                },
+                **self.counters
+            }
+
+
+def fit_to_context(text: str, model_name: Optional[str], reserved_tokens: int) -> Tuple[str, int]:
+    """
+    Metni, `reserved_tokens` (prompt'un geri kalanı + yanıt) ile birlikte
+    modelin bağlam penceresine sığacak şekilde kırp
+
+    Returns:
+        (sığan metin, kırpılan token sayısı)
+    """
+    budget = context_window(model_name) - reserved_tokens
+    tokens = token_counter.count(text, model_name)
+    if tokens <= budget:
+        return text, 0
+    return token_counter.truncate(text, budget, model_name), tokens - max(budget, 0)
+
+
+# Singleton instance
+token_counter = TokenCounter()
@@ -0,0 +1,475 @@
+"""
+Usage Ledger - LLM Kullanım Defteri
+===================================
+Her LLM çağrısı (task, agent, model, token'lar, gecikme, maliyet) yalnızca
+eklenen bir SQLite tablosuna yazılır; aynı işlemde saatlik ve task bazlı
+özet tablolar güncellenir
+
+- record() sadece kuyruğa ekler (event loop'u ve crew thread'lerini bloklamaz);
+  arka plandaki yazıcı thread kuyruğu FLUSH_INTERVAL_SECONDS aralıklarla tek
+  transaction'da yazar, özet satırlarını yazmadan önce toplar
+
+- Endpoint çağrıları create / stream_chat_completion'da, crew çağrıları
+  paylaşılan senkron havuzda (UsageTransport) kaydedilir; cache'ten dönen
+  yanıtlar çağrı sayılmaz
+- Sorgular ham satırlara değil özet tablolara gider, süre ham satır sayısından
+  bağımsızdır: saat kovası saatlik, gün / hafta / ay kovaları günlük özetten
+  (yerel tarih) okunur
+- Dosya (USAGE_LEDGER_PATH) worker süreçleri arasında paylaşılır
+"""
+
+import sys
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import USAGE_LEDGER_ENABLED, USAGE_LEDGER_PATH
+from utils.cost_calculator import calculate_cost
+from utils.cancellation import current_cancel_token, current_agent
+
+# Kova -> epoch zaman sütunundan yerel zaman etiketi (hafta: pazartesi)
+BUCKETS = {
+    "hour": "strftime('%Y-%m-%dT%H:00', {column}, 'unixepoch', 'localtime')",
+    "day": "date({column}, 'unixepoch', 'localtime')",
+    "week": "date({column}, 'unixepoch', 'localtime', 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m', {column}, 'unixepoch', 'localtime')",
+    "total": "'total'"
+}
+# Günlük özette (day: yerel 'YYYY-MM-DD') kova etiketleri
+DAY_BUCKETS = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "substr(day, 1, 7)",
+    "total": "'total'"
+}
+GROUPS = ("agent", "model", "task")
+MAX_ROWS = 1000
+# Yazıcı thread'in kuyruğu boşaltma aralığı ve bir transaction'daki en fazla çağrı
+FLUSH_INTERVAL_SECONDS = 0.5
+FLUSH_BATCH_SIZE = 5000
+# Disk yazılamazken bellekte birikebilecek en fazla çağrı (fazlası atılır)
+MAX_PENDING = 100000
+# Yazılamayan batch kuyruğa geri konur; bu kadar ardışık denemeden sonra atılır
+MAX_WRITE_ATTEMPTS = 5
+
+_ROLLUP_COLUMNS = ("calls", "errors", "input_tokens", "output_tokens", "cached_tokens", "latency_ms", "cost")
+_ROLLUP_UPDATE = ", ".join(f"{column} = {column} + excluded.{column}" for column in _ROLLUP_COLUMNS)
+
+
+def _epoch(value: Optional[str]) -> Optional[float]:
+    """ISO tarih / saat (yerel) veya epoch saniye"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class UsageLedger:
+    """Yalnızca eklenen çağrı defteri ve özet tablolar (thread-safe, süreçler arası paylaşılabilir)"""
+
+    def __init__(self, path: str, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: deque = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._writer: Optional[threading.Thread] = None
+        self._failed_attempts = 0
+        self.write_errors = 0
+        self.dropped = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS usage_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    task_id TEXT,
+                    agent TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    cached_tokens INTEGER NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    cost REAL NOT NULL
+                )
+            """)
+            rollup = """
+                calls INTEGER NOT NULL, errors INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, cached_tokens INTEGER NOT NULL,
+                latency_ms REAL NOT NULL, cost REAL NOT NULL
+            """
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS usage_hourly (
+                    hour INTEGER NOT NULL, agent TEXT NOT NULL, model TEXT NOT NULL, {rollup},
+                    PRIMARY KEY (hour, agent, model)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS usage_daily (
+                    day TEXT NOT NULL, agent TEXT NOT NULL, model TEXT NOT NULL, {rollup},
+                    PRIMARY KEY (day, agent, model)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS usage_tasks (
+                    task_id TEXT NOT NULL, agent TEXT NOT NULL, model TEXT NOT NULL, {rollup},
+                    first_ts REAL NOT NULL, last_ts REAL NOT NULL,
+                    PRIMARY KEY (task_id, agent, model)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_tasks_last ON usage_tasks(last_ts)")
+            self._conn = conn
+        return self._conn
+
+    def record(self, task_id: Optional[str], agent: str, model: Optional[str], input_tokens: int = 0,
+               output_tokens: int = 0, cached_tokens: int = 0, latency_ms: float = 0.0,
+               cost: Optional[float] = None, status: str = "ok", source: str = "endpoint"):
+        """Bir LLM çağrısını yazılmak üzere kuyruğa ekle (maliyet verilmezse token'lardan hesaplanır)"""
+        if not self.enabled:
+            return
+        model = model or "-"
+        if cost is None:
+            cost = calculate_cost(model, input_tokens, output_tokens, cached_tokens)
+        if len(self._pending) >= MAX_PENDING:
+            self.dropped += 1
+            return
+        self._pending.append((time.time(), task_id, agent, model, source, status, input_tokens, output_tokens,
+                              cached_tokens, latency_ms, cost))
+        if self._writer is None:
+            self._start_writer()
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None and not self._stopping:
+                self._writer = threading.Thread(target=self._write_loop, name="usage-ledger", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while not self._stopping:
+            self._wake.wait(FLUSH_INTERVAL_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Kuyruktaki çağrıları FLUSH_BATCH_SIZE'lık transaction'larla deftere ve özetlere yaz"""
+        while self._pending:
+            batch = []
+            while self._pending and len(batch) < FLUSH_BATCH_SIZE:
+                batch.append(self._pending.popleft())
+            try:
+                with self._lock:
+                    self._write(self._connect(), batch)
+                self._failed_attempts = 0
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                self._failed_attempts += 1
+                if self._failed_attempts >= MAX_WRITE_ATTEMPTS:
+                    self._failed_attempts = 0
+                    self.dropped += len(batch)
+                    print(f"⚠️ Usage ledger yazılamadı, {len(batch)} çağrı atıldı: {e}")
+                else:
+                    # Geçici hata (örn. database is locked): sırası bozulmadan sonraki flush'ta tekrar denenir
+                    self._pending.extendleft(reversed(batch))
+                    print(f"⚠️ Usage ledger yazılamadı ({len(batch)} çağrı, tekrar denenecek): {e}")
+                return
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, batch: List[tuple]):
+        # Özet satırları anahtar bazında toplanır: her anahtar transaction'da bir kez güncellenir
+        hourly: Dict[tuple, list] = {}
+        daily: Dict[tuple, list] = {}
+        tasks: Dict[tuple, list] = {}
+        for ts, task_id, agent, model, _, status, input_tokens, output_tokens, cached_tokens, latency_ms, cost in batch:
+            error = int(status == "error" or status.startswith("http_"))
+            values = (1, error, input_tokens, output_tokens, cached_tokens, latency_ms, cost)
+            keys = [
+                (hourly, (int(ts // 3600 * 3600), agent, model)),
+                (daily, (datetime.fromtimestamp(ts).strftime("%Y-%m-%d"), agent, model))
+            ]
+            if task_id:
+                keys.append((tasks, (task_id, agent, model)))
+            for rollup, key in keys:
+                sums = rollup.get(key)
+                if sums is None:
+                    rollup[key] = [*values, ts, ts]
+                else:
+                    for index, value in enumerate(values):
+                        sums[index] += value
+                    sums[-2], sums[-1] = min(sums[-2], ts), max(sums[-1], ts)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO usage_calls (ts, task_id, agent, model, source, status, input_tokens, output_tokens, "
+                "cached_tokens, latency_ms, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            conn.executemany(
+                f"INSERT INTO usage_hourly VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (hour, agent, model) DO UPDATE SET {_ROLLUP_UPDATE}",
+                [(*key, *sums[:-2]) for key, sums in hourly.items()]
+            )
+            conn.executemany(
+                f"INSERT INTO usage_daily VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (day, agent, model) DO UPDATE SET {_ROLLUP_UPDATE}",
+                [(*key, *sums[:-2]) for key, sums in daily.items()]
+            )
+            conn.executemany(
+                f"INSERT INTO usage_tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (task_id, agent, model) DO UPDATE SET {_ROLLUP_UPDATE}, last_ts = excluded.last_ts",
+                [(*key, *sums) for key, sums in tasks.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def query(self, bucket: str = "day", group_by: str = "model", since: Optional[str] = None,
+              until: Optional[str] = None, task_id: Optional[str] = None, agent: Optional[str] = None,
+              model: Optional[str] = None, limit: int = MAX_ROWS) -> Dict[str, Any]:
+        """
+        Zaman kovası ve grup bazında kullanım
+
+        `group_by`: agent, model, task veya virgülle birleşimi. `task` grubunda
+        ya da `task_id` filtresinde task özet tablosu kullanılır; zaman kovası
+        task'ın son çağrısına göre belirlenir. Diğer sorgularda `since` / `until`
+        saat kovasında saate, gün / hafta / ay kovalarında güne yuvarlanır.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+        groups = [group.strip() for group in (group_by or "").split(",") if group.strip()]
+        unknown = [group for group in groups if group not in GROUPS]
+        if unknown:
+            raise ValueError(f"Unknown group_by: {', '.join(unknown)} (allowed: {', '.join(GROUPS)})")
+        started, until_ts = _epoch(since), _epoch(until)
+
+        by_task = "task" in groups or task_id is not None
+        where, params = [], []
+        if by_task or bucket == "hour":
+            # Saatlik özette since'in içinde olduğu saat dahildir
+            table, time_column = ("usage_tasks", "last_ts") if by_task else ("usage_hourly", "hour")
+            bucket_expr = BUCKETS[bucket].format(column=time_column)
+            if started is not None:
+                where.append(f"{time_column} >= ?")
+                params.append(started if by_task else started // 3600 * 3600)
+            if until_ts is not None:
+                where.append(f"{time_column} < ?")
+                params.append(until_ts)
+        else:
+            # Günlük özette since / until'in içinde olduğu günler dahildir
+            table, bucket_expr = "usage_daily", DAY_BUCKETS[bucket]
+            if started is not None:
+                where.append("day >= ?")
+                params.append(datetime.fromtimestamp(started).strftime("%Y-%m-%d"))
+            if until_ts is not None:
+                where.append("day <= ?")
+                params.append(datetime.fromtimestamp(until_ts - 0.001).strftime("%Y-%m-%d"))
+        columns = {"agent": "agent", "model": "model", "task": "task_id"}
+        selected = [columns[group] for group in groups]
+
+        for column, value in (("task_id", task_id), ("agent", agent), ("model", model)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+
+        keys = ", ".join([f"{bucket_expr} AS bucket"] + selected)
+        sql = (
+            f"SELECT {keys}, SUM(calls), SUM(errors), SUM(input_tokens), SUM(output_tokens), SUM(cached_tokens), "
+            f"SUM(latency_ms), SUM(cost) FROM {table}"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" GROUP BY {', '.join(['bucket'] + selected)} ORDER BY bucket DESC, SUM(cost) DESC LIMIT ?"
+        )
+        query_started = time.perf_counter()
+        with self._lock:
+            rows = self._connect().execute(sql, (*params, min(limit, MAX_ROWS))).fetchall()
+        query_ms = (time.perf_counter() - query_started) * 1000
+
+        result_rows = [self._row(row[0], dict(zip(groups, row[1:1 + len(groups)])), row[1 + len(groups):])
+                       for row in rows]
+        totals = self._row(None, {}, [sum(row[index] or 0 for row in rows) for index in range(1 + len(groups), len(groups) + 8)])
+        totals.pop("bucket")
+        return {
+            "bucket": bucket,
+            "group_by": groups,
+            "since": since,
+            "until": until,
+            "rows": result_rows,
+            "totals": totals,
+            "truncated": len(rows) >= min(limit, MAX_ROWS),
+            "query_ms": round(query_ms, 3)
+        }
+
+    @staticmethod
+    def _row(bucket: Optional[str], keys: Dict[str, Any], sums) -> Dict[str, Any]:
+        calls, errors, input_tokens, output_tokens, cached_tokens, latency_ms, cost = [value or 0 for value in sums]
+        return {
+            "bucket": bucket,
+            **keys,
+            "calls": calls,
+            "errors": errors,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost": round(cost, 6),
+            "avg_latency_ms": round(latency_ms / calls, 1) if calls else 0.0
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            conn = self._connect()
+            # MAX(id): yalnızca eklenen tabloda satır sayısı (COUNT(*) tam tarama yapar)
+            calls = conn.execute("SELECT MAX(id) FROM usage_calls").fetchone()[0] or 0
+            hourly = conn.execute("SELECT COUNT(*) FROM usage_hourly").fetchone()[0]
+            daily = conn.execute("SELECT COUNT(*) FROM usage_daily").fetchone()[0]
+            tasks = conn.execute("SELECT COUNT(*) FROM usage_tasks").fetchone()[0]
+        return {
+            "enabled": True,
+            "path": self.path,
+            "calls": calls,
+            "hourly_rollups": hourly,
+            "daily_rollups": daily,
+            "task_rollups": tasks,
+            "pending": len(self._pending),
+            "write_errors": self.write_errors,
+            "dropped": self.dropped
+        }
+
+    def close(self):
+        """Yazıcı thread'i durdur, kuyrukta kalanları yaz ve bağlantıyı kapat"""
+        with self._lock:
+            self._stopping = True
+            writer = self._writer
+        self._wake.set()
+        if writer is not None:
+            writer.join(timeout=5)
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _response_usage(body: bytes) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Chat completion yanıt gövdesinden (JSON veya SSE) model ve usage"""
+    try:
+        data = json.loads(body)
+        return data.get("model"), data.get("usage") or {}
+    except ValueError:
+        pass
+    model, usage = None, {}
+    for line in body.split(b"\n"):
+        payload = line[len(b"data:"):].strip() if line.startswith(b"data:") else b""
+        if not payload or payload == b"[DONE]":
+            continue
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            continue
+        model = event.get("model") or model
+        usage = event.get("usage") or usage
+    return model, usage
+
+
+class _UsageSyncStream(httpx.SyncByteStream):
+    """Yanıt gövdesi okunup kapanınca çağrıyı deftere yaz"""
+
+    def __init__(self, stream: httpx.SyncByteStream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._chunks: List[bytes] = []
+        self._done = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._chunks.append(chunk)
+            yield chunk
+        self._finish()
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._on_complete(b"".join(self._chunks))
+
+    def close(self):
+        self._finish()
+        self._stream.close()
+
+
+class UsageTransport(httpx.BaseTransport):
+    """Senkron OpenAI client'ı (crew'lar) için deftere yazan katman (cache katmanının altında)"""
+
+    def __init__(self, transport: httpx.BaseTransport, ledger: UsageLedger, source: str = "crew"):
+        self._transport = transport
+        self._ledger = ledger
+        self.source = source
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return self._transport.handle_request(request)
+
+        token = current_cancel_token.get()
+        task_id = token.task_id if token is not None else None
+        agent = current_agent.get() or self.source
+        try:
+            requested_model = json.loads(request.read()).get("model")
+        except ValueError:
+            requested_model = None
+        started = time.monotonic()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            self._ledger.record(task_id, agent, requested_model, latency_ms=(time.monotonic() - started) * 1000,
+                                status="error", source=self.source)
+            raise
+        if response.status_code != 200:
+            self._ledger.record(task_id, agent, requested_model, latency_ms=(time.monotonic() - started) * 1000,
+                                status=f"http_{response.status_code}", source=self.source)
+            return response
+
+        def _complete(raw: bytes):
+            # Sıkıştırılmış gövde açılarak okunur
+            body = httpx.Response(200, headers=response.headers, content=raw).read()
+            model, usage = _response_usage(body)
+            details = usage.get("prompt_tokens_details") or {}
+            self._ledger.record(
+                task_id, agent, model or requested_model,
+                input_tokens=usage.get("prompt_tokens", 0),
+                output_tokens=usage.get("completion_tokens", 0),
+                cached_tokens=details.get("cached_tokens", 0) or 0,
+                latency_ms=(time.monotonic() - started) * 1000,
+                status="ok" if usage else "no_usage",
+                source=self.source
+            )
+
+        response.stream = _UsageSyncStream(response.stream, _complete)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+# Singleton instance
+usage_ledger = UsageLedger(USAGE_LEDGER_PATH, enabled=USAGE_LEDGER_ENABLED)
@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "logs" ADD COLUMN "idempotency_key" TEXT;
+
+-- CreateIndex
+CREATE UNIQUE INDEX "logs_idempotency_key_key" ON "logs"("idempotency_key");
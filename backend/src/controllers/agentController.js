@@ -102,6 +102,41 @@ export const updateAgentStatus = asyncHandler(async (req, res) => {
   });
 });
 
+// Add aggregated cost deltas to many agents (agents service flushes these in batches)
+export const addAgentCosts = asyncHandler(async (req, res) => {
+  const { costs } = req.body;
+
+  if (!Array.isArray(costs) || costs.length === 0) {
+    return res.status(400).json({ error: 'costs array is required' });
+  }
+
+  const results = await prisma.$transaction(
+    costs.map(({ agentId, cost }) =>
+      prisma.agent.updateMany({
+        where: { id: parseInt(agentId) },
+        data: { totalCost: { increment: parseFloat(cost) || 0 } }
+      })
+    )
+  );
+
+  const updated = [];
+  const missing = [];
+  results.forEach((result, index) => {
+    (result.count > 0 ? updated : missing).push(parseInt(costs[index].agentId));
+  });
+
+  if (updated.length > 0) {
+    const agents = await prisma.agent.findMany({ where: { id: { in: updated } } });
+    agents.forEach(emitAgentStatus);
+  }
+
+  res.json({
+    success: true,
+    updated,
+    missing
+  });
+});
+
 // Start agent
 export const startAgent = asyncHandler(async (req, res) => {
   const { id } = req.params;
@@ -356,6 +391,7 @@ export default {
   getAgent,
   getAgentStatus,
   updateAgentStatus,
+  addAgentCosts,
   startAgent,
   stopAgent,
   resetAllAgents,
@@ -427,7 +427,15 @@ export const getAllLogs = asyncHandler(async (req, res) => {
 
 // Create log (internal use / webhook)
 export const createLog = asyncHandler(async (req, res) => {
-  const { runId, agentId, level, message, metadata } = req.body;
+  const { runId, agentId, level, message, metadata, idempotencyKey } = req.body;
+
+  // Retried webhook: the log was already stored
+  if (idempotencyKey) {
+    const existing = await prisma.log.findUnique({ where: { idempotencyKey } });
+    if (existing) {
+      return res.json({ success: true, data: existing, duplicate: true });
+    }
+  }
 
   const log = await prisma.log.create({
     data: {
@@ -435,7 +443,8 @@ export const createLog = asyncHandler(async (req, res) => {
       agentId: agentId ? parseInt(agentId) : null,
       level: level?.toUpperCase() || 'INFO',
       message,
-      metadata
+      metadata,
+      idempotencyKey: idempotencyKey || null
     }
   });
 
@@ -447,6 +456,60 @@ export const createLog = asyncHandler(async (req, res) => {
   });
 });
 
+// POST /api/tests/logs/batch - Create many logs in one request (agents webhook batching)
+const MAX_LOG_BATCH = 500;
+
+export const createLogsBatch = asyncHandler(async (req, res) => {
+  const { logs } = req.body;
+
+  if (!Array.isArray(logs) || logs.length === 0) {
+    return res.status(400).json({ error: 'logs array is required' });
+  }
+  if (logs.length > MAX_LOG_BATCH) {
+    return res.status(400).json({ error: `At most ${MAX_LOG_BATCH} logs per batch` });
+  }
+
+  // Logs whose idempotencyKey is already stored (a retried batch) are skipped
+  const keys = logs.map((log) => log.idempotencyKey).filter(Boolean);
+  const seen = new Set(
+    keys.length
+      ? (await prisma.log.findMany({
+          where: { idempotencyKey: { in: keys } },
+          select: { idempotencyKey: true }
+        })).map((log) => log.idempotencyKey)
+      : []
+  );
+  const fresh = logs.filter(({ idempotencyKey }) => {
+    if (!idempotencyKey) return true;
+    if (seen.has(idempotencyKey)) return false;
+    seen.add(idempotencyKey);
+    return true;
+  });
+
+  const created = await prisma.$transaction(
+    fresh.map(({ runId, agentId, level, message, metadata, idempotencyKey }) =>
+      prisma.log.create({
+        data: {
+          runId: runId ? parseInt(runId) : null,
+          agentId: agentId ? parseInt(agentId) : null,
+          level: level?.toUpperCase() || 'INFO',
+          message,
+          metadata,
+          idempotencyKey: idempotencyKey || null
+        }
+      })
+    )
+  );
+
+  created.forEach(emitNewLog);
+
+  res.status(201).json({
+    success: true,
+    count: created.length,
+    duplicates: logs.length - fresh.length
+  });
+});
+
 // ==================== DASHBOARD STATS ====================
 
 export const getDashboardStats = asyncHandler(async (req, res) => {
@@ -517,6 +580,7 @@ export default {
   // Logs
   getAllLogs,
   createLog,
+  createLogsBatch,
   // Dashboard
   getDashboardStats
 };
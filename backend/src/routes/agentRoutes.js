@@ -4,6 +4,7 @@ import {
   getAgent,
   getAgentStatus,
   updateAgentStatus,
+  addAgentCosts,
   startAgent,
   stopAgent,
   resetAllAgents,
@@ -19,6 +20,9 @@ router.get('/', getAllAgents);
 // POST /api/agents/reset - Reset all agents to idle
 router.post('/reset', resetAllAgents);
 
+// POST /api/agents/costs - Add batched cost deltas ({ costs: [{ agentId, cost }] })
+router.post('/costs', addAgentCosts);
+
 // GET /api/agents/:id - Get single agent
 router.get('/:id', getAgent);
 
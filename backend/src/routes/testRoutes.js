@@ -20,6 +20,7 @@ import {
   // Logs
   getAllLogs,
   createLog,
+  createLogsBatch,
   // Dashboard
   getDashboardStats
 } from '../controllers/testController.js';
@@ -37,6 +38,9 @@ router.get('/logs', getAllLogs);
 // POST /api/tests/logs - Create log (webhook)
 router.post('/logs', createLog);
 
+// POST /api/tests/logs/batch - Create logs in bulk (webhook batching)
+router.post('/logs/batch', createLogsBatch);
+
 // ==================== TEST RUNS ====================
 // GET /api/tests/runs - Get all test runs
 router.get('/runs', getAllTestRuns);